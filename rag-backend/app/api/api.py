@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import ingest, query
+from app.api.endpoints import health, ingest, metrics, query
 
 router = APIRouter()
+router.include_router(health.router)
 router.include_router(ingest.router)
+router.include_router(metrics.router)
 router.include_router(query.router)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.config.ingest import STARTUP_RETRY_AFTER_SECONDS
+from app.services.startup_service import StartupService
+
+router = APIRouter(
+    prefix="/health",
+    tags=["Health"]
+)
+
+
+@router.get("/live", status_code=200)
+async def liveness():
+    """
+    Liveness probe: o processo está de pé e o event loop responde.
+    Não depende do índice, para que o orquestrador não reinicie o worker durante a ingestão inicial.
+    """
+    return {"status": "alive"}
+
+
+@router.get("/ready", status_code=200)
+async def readiness():
+    """
+    Readiness probe: 200 quando o índice está carregado e o processo aquecido; 503 (com
+    Retry-After) enquanto a inicialização está em andamento ou se ela falhou. O corpo traz a
+    fase atual e, durante a ingestão inicial, o andamento (arquivos e chunks indexados).
+    """
+    state = StartupService.status()
+    if StartupService.is_ready():
+        return state
+    return JSONResponse(
+        status_code=503,
+        content=state,
+        headers={"Retry-After": str(STARTUP_RETRY_AFTER_SECONDS)}
+    )
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 import os
+import shutil
 import tempfile
-from app.schemas.rag import FileUploadResponse
+from app.schemas.rag import FileUploadResponse, IngestJobResponse, IngestResponse
 from app.services.ingest_service import IngestService
+from app.services.ingest_worker import INGEST_WORKER, IngestQueueFullError
+from app.core.config.ingest import INGEST_RETRY_AFTER_SECONDS, STARTUP_DATA_DIR
 from app.core.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -13,14 +17,16 @@ router = APIRouter(
 )
 
 @router.post("/upload", response_model=FileUploadResponse, status_code=202)
-async def upload_file(file: UploadFile = File(...), background_tasks: BackgroundTasks = None):
+async def upload_file(file: UploadFile = File(...)):
     """
     Endpoint para adicionar um único arquivo à vectorstore de forma assíncrona.
 
-    Este endpoint recebe um arquivo via upload, salva-o temporariamente,
-    e inicia o processamento assíncrono para adicioná-lo à vectorstore existente.
+    Este endpoint recebe um arquivo via upload, salva-o temporariamente
+    e o coloca na fila do worker de ingestão. O andamento pode ser acompanhado
+    em GET /ingest/jobs/{job_id}. Se a fila estiver cheia, responde 429.
     Os formatos suportados incluem PDF, DOCX, DOC, TXT, MD e XLS/XLSX.
     """
+    temp_dir = None
     try:
         temp_dir = tempfile.mkdtemp()
         temp_file_path = os.path.join(temp_dir, file.filename)
@@ -30,45 +36,51 @@ async def upload_file(file: UploadFile = File(...), background_tasks: Background
 
         logger.info(f"Arquivo temporário salvo em: {temp_file_path}")
 
-        background_tasks.add_task(
-            process_file_in_background,
-            temp_file_path,
-            temp_dir
-        )
+        job = INGEST_WORKER.submit(temp_file_path, temp_dir, file.filename)
 
         return {
             "status": "accepted",
-            "message": f"Arquivo '{file.filename}' recebido e está sendo processado em background."
+            "message": f"Arquivo '{file.filename}' recebido e está sendo processado em background.",
+            "job_id": job["job_id"]
         }
+    except IngestQueueFullError as e:
+        logger.warning(str(e))
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(INGEST_RETRY_AFTER_SECONDS)}
+        )
     except Exception as e:
         error_msg = f"Erro durante o upload do arquivo: {e}"
         logger.error(error_msg)
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=error_msg)
 
 
-async def process_file_in_background(file_path: str, temp_dir: str):
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse, status_code=200)
+async def get_ingest_job(job_id: str):
     """
-    Processa um arquivo em background, adicionando-o à vectorstore.
+    Endpoint para consultar a situação de um job de ingestão.
+    """
+    job = INGEST_WORKER.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job de ingestão não encontrado: {job_id}")
+    return job
+
 
-    Args:
-        file_path: Caminho para o arquivo temporário
-        temp_dir: Diretório temporário que deve ser limpo após o processamento
+@router.post("/sync", response_model=IngestResponse, status_code=200)
+async def sync_data_directory():
     """
-    try:
-        logger.info(f"Iniciando processamento em background do arquivo: {file_path}")
-        result = IngestService.add_file_to_vectorstore(file_path)
+    Endpoint para sincronizar o índice com o diretório de dados do servidor (STARTUP_DATA_DIR).
 
-        if result["status"] == "success":
-            logger.info(f"Processamento em background concluído com sucesso: {result['message']}")
-        else:
-            logger.error(f"Falha no processamento em background: {result['message']}")
-    except Exception as e:
-        logger.error(f"Erro durante o processamento em background: {e}")
-    finally:
-        try:
-            if os.path.exists(temp_dir):
-                import shutil
-                shutil.rmtree(temp_dir)
-                logger.info(f"Diretório temporário removido: {temp_dir}")
-        except Exception as e:
-            logger.error(f"Erro ao limpar diretório temporário: {e}")
+    Apenas arquivos novos ou alterados (pelo hash do conteúdo) são processados, e os
+    chunks de arquivos removidos do diretório são retirados do índice. O diretório não
+    é escolhido pelo cliente, e a reconstrução do zero não é exposta: a API não tem
+    autenticação.
+    """
+    result = await run_in_threadpool(IngestService.ingest_documents, STARTUP_DATA_DIR, False)
+    if result["status"] == "error":
+        raise HTTPException(status_code=500, detail=result["message"])
+    return result
@@ -0,0 +1,118 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.config.embeddings import EMBEDDING_MODEL
+from app.core.config.llm import LLM_POOL
+from app.core.utils.logger import LOG_PIPELINE
+from app.core.utils.metrics import METRICS
+from app.services.answer_cache import ANSWER_CACHE
+from app.services.ingest_worker import INGEST_WORKER
+from app.services.reranker import RERANKER
+from app.services.startup_service import StartupService
+from app.services.vectorstore_service import VectorstoreService
+
+router = APIRouter(
+    tags=["Metrics"]
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _answer_cache_lookups():
+    stats = ANSWER_CACHE.stats()
+    return (("exact_hit",), stats["exact_hits"]), (("semantic_hit",), stats["semantic_hits"]), (("miss",), stats["misses"])
+
+
+def _answer_cache_removals():
+    stats = ANSWER_CACHE.stats()
+    return (("expired",), stats["expirations"]), (("evicted",), stats["evictions"]), (("invalidated",), stats["invalidations"])
+
+
+def _query_embedding_cache_lookups():
+    stats = EMBEDDING_MODEL.stats()
+    return (("hit",), stats["hits"]), (("miss",), stats["misses"])
+
+
+def _reranks():
+    stats = RERANKER.stats()
+    return (("reranked",), stats["reranked"]), (("fallback",), stats["fallbacks"])
+
+
+def _rerank_pairs():
+    stats = RERANKER.stats()
+    return (("scored",), stats["pairs_scored"]), (("cache_hit",), stats["cache_hits"])
+
+
+def _llm_pool_lookups():
+    stats = LLM_POOL.stats()
+    return (("hit",), stats["hits"]), (("miss",), stats["misses"])
+
+
+def _index_vectors():
+    stats = VectorstoreService.index_stats()
+    return (("total",), stats["vectors"]), (("deleted",), stats["deleted"])
+
+
+# Métricas lidas na coleta, a partir dos contadores que os caches, o índice e a fila já mantêm
+METRICS.callback(
+    "rag_answer_cache_lookups_total", "Consultas ao cache de respostas, por resultado",
+    "counter", ("result",), _answer_cache_lookups,
+)
+METRICS.callback(
+    "rag_answer_cache_removals_total", "Respostas removidas do cache, por motivo",
+    "counter", ("reason",), _answer_cache_removals,
+)
+METRICS.callback(
+    "rag_answer_cache_entries", "Respostas no cache",
+    "gauge", (), lambda: (((), ANSWER_CACHE.stats()["size"]),),
+)
+METRICS.callback(
+    "rag_query_embedding_cache_lookups_total", "Consultas ao cache de embeddings de consultas, por resultado",
+    "counter", ("result",), _query_embedding_cache_lookups,
+)
+METRICS.callback(
+    "rag_rerank_total", "Re-rankings, por resultado (fallback: orçamento de tempo excedido)",
+    "counter", ("outcome",), _reranks,
+)
+METRICS.callback(
+    "rag_rerank_pairs_total", "Pares (consulta, chunk) do re-ranking, por origem da pontuação",
+    "counter", ("result",), _rerank_pairs,
+)
+METRICS.callback(
+    "rag_llm_pool_lookups_total", "Consultas ao pool de clientes de LLM, por resultado",
+    "counter", ("result",), _llm_pool_lookups,
+)
+METRICS.callback(
+    "rag_index_vectors", "Vetores no índice corrente, por estado (deleted: removidos logicamente, até a reconstrução)",
+    "gauge", ("state",), _index_vectors,
+)
+METRICS.callback(
+    "rag_index_version", "Versão do índice publicada",
+    "gauge", (), lambda: (((), VectorstoreService.index_stats()["version"]),),
+)
+METRICS.callback(
+    "rag_ingest_queue_depth", "Arquivos enviados aguardando na fila de ingestão",
+    "gauge", (), lambda: (((), INGEST_WORKER.queue_depth()),),
+)
+METRICS.callback(
+    "rag_log_queue_depth", "Registros de log aguardando a escrita pela thread de logs",
+    "gauge", (), lambda: (((), LOG_PIPELINE.stats()["queued"]),),
+)
+METRICS.callback(
+    "rag_log_records_dropped_total", "Registros de log descartados com a fila de logs cheia",
+    "counter", (), lambda: (((), LOG_PIPELINE.stats()["dropped"]),),
+)
+METRICS.callback(
+    "rag_ready", "1 quando o índice está carregado e o processo aquecido",
+    "gauge", (), lambda: (((), 1 if StartupService.is_ready() else 0),),
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Métricas do processo no formato texto do Prometheus: histogramas por etapa das consultas
+    (por provedor/modelo) e da ingestão (por tipo de arquivo), contadores de consultas, erros,
+    documentos recuperados e caches, e gauges do índice e da fila de ingestão.
+    """
+    return PlainTextResponse(METRICS.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,7 +1,14 @@
 # /home/pedro/Documents/Programming/CEFET/TCC - Guilherme/rag/rag-backend/app/api/endpoints/query.py
-from fastapi import APIRouter, HTTPException
-from app.schemas.rag import QueryRequest, QueryResponse # Seus schemas
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.schemas.rag import BatchQueryRequest, BatchQueryResponse, QueryRequest, QueryResponse # Seus schemas
 from app.services.query_service import QueryService    # Seu serviço
+from app.services.answer_cache import ANSWER_CACHE
+from app.services.reranker import RERANKER
+from app.services.startup_service import StartupService
+from app.core.config.embeddings import EMBEDDING_MODEL
+from app.core.config.llm import BATCH_LLM_CONCURRENCY
 from app.core.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -11,14 +18,18 @@ router = APIRouter(
     tags=["Query"]
 )
 
-@router.post("", response_model=QueryResponse, status_code=200)
+# Enquanto o índice inicial é carregado/construído, as consultas recebem 503 com Retry-After
+_require_ready = [Depends(StartupService.ensure_ready)]
+
+
+@router.post("", response_model=QueryResponse, status_code=200, dependencies=_require_ready)
 async def query_documents(request: QueryRequest):
     """
     Endpoint para realizar consultas nos documentos indexados.
     """
     try:
         # A verificação explícita de QueryService.vectorstore não é mais necessária aqui,
-        # pois QueryService.process_query (via load_vectorstore) agora lida com isso
+        # pois QueryService.process_query (via load_snapshot) agora lida com isso
         # e levantará HTTPException se o vectorstore não estiver pronto.
 
         logger.info(f"Recebida consulta no endpoint: '{request.query}' com search_type='{request.search_type}' e k={request.search_k}")
@@ -27,8 +38,13 @@ async def query_documents(request: QueryRequest):
         response_data = await QueryService.process_query(
             query=request.query,
             search_type=request.search_type, # Passa o search_type
-            search_k=request.search_k         # Passa o search_k
-            # provider, model, temperature, etc., podem continuar com defaults ou serem adicionados aqui
+            search_k=request.search_k,        # Passa o search_k
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            rerank=request.rerank,
+            max_context_tokens=request.max_context_tokens,
+            filters=request.filters.to_search_filters() if request.filters else None,
+            **request.to_llm_params()
         )
         
         # Mapeia a resposta do QueryService para o QueryResponse do endpoint
@@ -44,7 +60,10 @@ async def query_documents(request: QueryRequest):
         return QueryResponse(
             query=request.query,
             answer=response_data.get("answer", "Não foi possível obter uma resposta."), # Use a chave "answer"
-            sources=response_data.get("sources", []) # Use a chave "sources"
+            sources=response_data.get("sources", []), # Use a chave "sources"
+            cache=response_data.get("cache"),
+            timings=response_data.get("timings"),
+            prompt_tokens=response_data.get("prompt_tokens")
         )
 
     except HTTPException as http_exc:
@@ -55,4 +74,95 @@ async def query_documents(request: QueryRequest):
     except Exception as e:
         # Captura qualquer outro erro inesperado do QueryService.process_query
         logger.error(f"Erro inesperado no endpoint /query: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Ocorreu um erro interno inesperado: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Ocorreu um erro interno inesperado: {str(e)}")
+
+
+@router.post("/batch", response_model=BatchQueryResponse, status_code=200, dependencies=_require_ready)
+async def query_documents_batch(request: BatchQueryRequest):
+    """
+    Endpoint para consultas em lote (avaliações, pré-carregamento do front-end).
+
+    Os embeddings das consultas são gerados juntos e a busca no FAISS é feita em uma única
+    chamada por grupo de consultas com os mesmos filtros; as respostas são geradas
+    concorrentemente. Os resultados vêm na ordem das consultas, com erros por consulta.
+    """
+    logger.info(f"Recebido lote de {len(request.queries)} consulta(s) no endpoint /query/batch")
+
+    items = [
+        {
+            "query": item.query,
+            "search_type": item.search_type,
+            "search_k": item.search_k,
+            "nprobe": item.nprobe,
+            "ef_search": item.ef_search,
+            "rerank": item.rerank,
+            "max_context_tokens": item.max_context_tokens,
+            "filters": item.filters.to_search_filters() if item.filters else None,
+            **item.to_llm_params(),
+        }
+        for item in request.queries
+    ]
+    response_data = await QueryService.process_batch(items, concurrency=request.concurrency or BATCH_LLM_CONCURRENCY)
+    return BatchQueryResponse(**response_data)
+
+
+def _format_sse(event: str, data: dict) -> str:
+    """
+    Formata um evento no padrão Server-Sent Events.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream", status_code=200, dependencies=_require_ready)
+async def stream_query_documents(request: QueryRequest, http_request: Request):
+    """
+    Endpoint para consultas com resposta em streaming (Server-Sent Events).
+
+    Envia primeiro o evento "sources" com as fontes recuperadas, depois um evento "token"
+    para cada trecho gerado pelo LLM e, por fim, "done" com os tempos por etapa.
+    Se o cliente desconectar, a geração é cancelada.
+    """
+    logger.info(f"Recebida consulta em streaming: '{request.query}' com search_type='{request.search_type}' e k={request.search_k}")
+
+    # Erros de recuperação viram HTTPException aqui, antes do início do streaming
+    events = await QueryService.stream_query(
+        query=request.query,
+        search_type=request.search_type,
+        search_k=request.search_k,
+        nprobe=request.nprobe,
+        ef_search=request.ef_search,
+        rerank=request.rerank,
+        max_context_tokens=request.max_context_tokens,
+        filters=request.filters.to_search_filters() if request.filters else None,
+        **request.to_llm_params()
+    )
+
+    async def event_generator():
+        try:
+            async for event, data in events:
+                if await http_request.is_disconnected():
+                    logger.info("Cliente desconectado. Cancelando a geração da resposta.")
+                    break
+                yield _format_sse(event, data)
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/cache/stats", status_code=200)
+async def answer_cache_stats():
+    """
+    Retorna as métricas dos caches de consulta: respostas (acertos exatos/semânticos, misses,
+    evicções e tamanho), embeddings de consultas (acertos, misses e taxa de acerto) e
+    pontuações do re-ranking (re-rankings, fallbacks por orçamento, pares avaliados e em cache).
+    """
+    return {
+        "answers": ANSWER_CACHE.stats(),
+        "query_embeddings": EMBEDDING_MODEL.stats(),
+        "rerank": RERANKER.stats()
+    }
@@ -1,16 +1,230 @@
-from langchain_huggingface import HuggingFaceEmbeddings
-from torch import cuda
+import asyncio
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
 from app.core.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-device = "cuda" if cuda.is_available() else "cpu"
-# logger.info(f"Using device: {device} for embeddings")
+EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-base"
+# Prefixos (consulta, passagem) exigidos por cada modelo de embeddings
+EMBEDDING_PREFIXES: Dict[str, Tuple[str, str]] = {
+    "intfloat/multilingual-e5-base": ("query: ", "passage: "),
+}
+# Número máximo de embeddings de consultas mantidos em memória (LRU)
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+
+# Motor de embeddings da ingestão (ver app/services/embedding_engine.py)
+# Backend: "torch" (fp32), "int8" (quantização dinâmica das camadas lineares) ou "onnx" (ONNX Runtime,
+# requer optimum[onnxruntime]). As consultas usam o mesmo backend, para que consultas e passagens
+# sejam projetadas no mesmo espaço de embeddings.
+EMBEDDING_BACKEND = "torch"
+# Chunks por lote enviado ao modelo (os chunks são ordenados por tamanho antes de formar os lotes)
+EMBEDDING_BATCH_SIZE = 64
+# Processos de embedding; com 1, os lotes rodam no próprio processo reaproveitando o modelo das consultas
+EMBEDDING_WORKERS = 1
+# Threads do torch por processo de embedding (None: núcleos disponíveis / EMBEDDING_WORKERS)
+EMBEDDING_THREADS_PER_WORKER = None
+
+
+def normalize_embedding_text(text: str) -> str:
+    """
+    Normaliza o texto antes do embedding: forma Unicode NFKC e espaços colapsados.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class LazyHuggingFaceEmbeddings(Embeddings):
+    """
+    HuggingFaceEmbeddings instanciado apenas no primeiro uso: importar este módulo não carrega
+    o torch nem o modelo. O WarmupService (app/services/warmup.py) faz esse primeiro uso na
+    inicialização, antes da primeira consulta.
+
+    Com backend "int8" ou "onnx" (ver EMBEDDING_BACKEND), o modelo roda em CPU no mesmo backend
+    usado pela ingestão.
+    """
+
+    def __init__(self, model_name: str, encode_kwargs: Optional[Dict[str, Any]] = None, backend: str = "torch"):
+        self.model_name = model_name
+        self.encode_kwargs = encode_kwargs or {}
+        self.backend = backend
+        self._model: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def get_model(self) -> Embeddings:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import torch
+                    from langchain_huggingface import HuggingFaceEmbeddings
+
+                    device = "cuda" if self.backend == "torch" and torch.cuda.is_available() else "cpu"
+                    model_kwargs = {"device": device}
+                    if self.backend == "onnx":
+                        model_kwargs["backend"] = "onnx"
+                    logger.info(f"Carregando modelo de embeddings {self.model_name} ({device}, {self.backend})")
+                    model = HuggingFaceEmbeddings(
+                        model_name=self.model_name,
+                        model_kwargs=model_kwargs,
+                        encode_kwargs=self.encode_kwargs,
+                    )
+                    if self.backend == "int8":
+                        torch.quantization.quantize_dynamic(
+                            model._client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+                        )
+                    self._model = model
+        return self._model
+
+    @property
+    def client(self) -> Any:
+        """
+        SentenceTransformer do modelo, para quem precisa controlar o tamanho dos lotes.
+        """
+        return self.get_model()._client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.get_model().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.get_model().embed_query(text)
+
+
+class PrefixedCachedEmbeddings(Embeddings):
+    """
+    Envolve um modelo de embeddings aplicando os prefixos de consulta/passagem do modelo
+    (ex: "query: " e "passage: " do E5) e mantendo um cache LRU dos embeddings de consultas.
+
+    Todo o código do sistema deve gerar embeddings por esta classe, para que os prefixos
+    sejam aplicados em um único lugar.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        query_prefix: str = "",
+        passage_prefix: str = "",
+        cache_size: int = QUERY_EMBEDDING_CACHE_SIZE,
+    ):
+        self.embeddings = embeddings
+        self.query_prefix = query_prefix
+        self.passage_prefix = passage_prefix
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _with_passage_prefix(self, text: str) -> str:
+        # Chunks indexados antes desta classe já trazem o prefixo no próprio conteúdo
+        if self.passage_prefix and text.startswith(self.passage_prefix):
+            return text
+        return f"{self.passage_prefix}{text}"
+
+    def _get_cached(self, key: str):
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return vector
+
+    def _put_cached(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def prepare_passages(self, texts: List[str]) -> List[str]:
+        """
+        Aplica o prefixo de passagem; usado também pelo motor de embeddings da ingestão.
+        """
+        return [self._with_passage_prefix(text) for text in texts]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(self.prepare_passages(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_embedding_text(text)
+        vector = self._get_cached(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(f"{self.query_prefix}{key}")
+            self._put_cached(key, vector)
+        return list(vector)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = normalize_embedding_text(text)
+        vector = self._get_cached(key)
+        if vector is None:
+            loop = asyncio.get_running_loop()
+            vector = await loop.run_in_executor(
+                None, self.embeddings.embed_query, f"{self.query_prefix}{key}"
+            )
+            self._put_cached(key, vector)
+        return list(vector)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Gera os embeddings de várias consultas: as que não estão em cache são enviadas
+        ao modelo juntas, em uma única chamada (lotes do próprio modelo).
+        """
+        keys = [normalize_embedding_text(text) for text in texts]
+        vectors = [self._get_cached(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self.embeddings.embed_documents(
+                [f"{self.query_prefix}{key}" for key in missing]
+            )))
+            for key, vector in computed.items():
+                self._put_cached(key, vector)
+            vectors = [vector if vector is not None else computed[key] for key, vector in zip(keys, vectors)]
+        return [list(vector) for vector in vectors]
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.embed_queries, texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.embed_documents, texts)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "max_size": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_query_prefix, _passage_prefix = EMBEDDING_PREFIXES.get(EMBEDDING_MODEL_NAME, ("", ""))
 
-EMBEDDING_MODEL = HuggingFaceEmbeddings(
-    model_name="intfloat/multilingual-e5-base",
-    model_kwargs={"device": device},
-    encode_kwargs={"normalize_embeddings": True},
+EMBEDDING_MODEL = PrefixedCachedEmbeddings(
+    LazyHuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        encode_kwargs={"normalize_embeddings": True},
+        backend=EMBEDDING_BACKEND,
+    ),
+    query_prefix=_query_prefix,
+    passage_prefix=_passage_prefix,
 )
 CHUNK_SIZE = 2000
 CHUNK_OVERLAP = 200
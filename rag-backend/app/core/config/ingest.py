@@ -0,0 +1,65 @@
+"""
+Configurações do pipeline de ingestão de documentos
+"""
+
+# Número máximo de arquivos aguardando processamento; acima disso o upload recebe 429
+INGEST_QUEUE_MAX_SIZE = 32
+# Processos dedicados ao parsing/OCR/chunking dos arquivos enviados
+INGEST_PROCESS_POOL_SIZE = 2
+# Jobs processados em paralelo (apenas o parsing; a escrita no índice é serializada)
+INGEST_WORKER_CONCURRENCY = 2
+# Quantos jobs finalizados são mantidos para consulta em GET /ingest/jobs/{id}
+INGEST_JOB_HISTORY_SIZE = 1000
+# Sugestão de espera (segundos) enviada no cabeçalho Retry-After quando a fila está cheia
+INGEST_RETRY_AFTER_SECONDS = 30
+# Sugestão de espera (segundos) enviada no Retry-After das consultas enquanto o índice inicial
+# é carregado/construído em background
+STARTUP_RETRY_AFTER_SECONDS = 10
+# Diretório ingerido na inicialização quando ainda não existe índice
+STARTUP_DATA_DIR = "data/"
+# Intervalo (segundos) de atualização do andamento do job (páginas de OCR) em GET /ingest/jobs/{id}
+INGEST_PROGRESS_POLL_SECONDS = 1.0
+
+# Ingestão em streaming do diretório de dados (carregar -> dividir -> embeddar -> indexar em lotes)
+# Arquivos sendo carregados/divididos ao mesmo tempo; limita os chunks pendentes em memória
+INGEST_MAX_IN_FLIGHT_FILES = 4
+# Chunks acumulados antes de gerar os embeddings e adicioná-los ao índice
+INGEST_BATCH_MAX_CHUNKS = 512
+
+# Compacta o índice (base + segmentos -> nova base) a partir deste número de segmentos
+INDEX_COMPACTION_MAX_SEGMENTS = 16
+# ... ou quando os segmentos somarem esta fração dos vetores da base
+INDEX_COMPACTION_MAX_SEGMENT_RATIO = 0.25
+
+# Tipo do índice FAISS criado na ingestão completa:
+# "flat" (exato), "hnsw", "ivf_flat", "ivf_pq", "sq8", "hnsw_sq8" ou "ivf_sq8"
+VECTOR_INDEX_TYPE = "flat"
+# Parâmetros do índice (ver DEFAULT_INDEX_PARAMS em app/services/vector_index.py)
+VECTOR_INDEX_PARAMS = {}
+# Máximo de vetores usados no treino de índices IVF/PQ/SQ
+INDEX_TRAINING_SAMPLE_SIZE = 100_000
+# Buscas filtradas em índices HNSW/IVF: abaixo desta fração de posições permitidas por parte
+# a busca é exata sobre as posições permitidas; acima, efSearch/nprobe crescem com 1/fração
+FILTER_EXACT_SEARCH_SELECTIVITY = 0.05
+# Vetores reconstruídos por vez na busca exata filtrada
+FILTER_EXACT_SEARCH_BATCH_SIZE = 16_384
+
+# Abre a base do índice com mmap, compartilhando as páginas entre os workers pelo page cache
+INDEX_USE_MMAP = True
+# Intervalo (segundos) entre as verificações da geração do manifest, para carregar os segmentos
+# e bases gravados por outros workers
+INDEX_REFRESH_INTERVAL_SECONDS = 2.0
+
+# OCR de PDFs digitalizados: páginas rasterizadas com pdf2image e reconhecidas em paralelo
+# Resolução usada na rasterização das páginas
+OCR_DPI = 200
+# Estratégia do unstructured para cada página ("hi_res" usa detecção de layout; "ocr_only" é mais rápido)
+OCR_STRATEGY = "hi_res"
+# Idiomas do Tesseract
+OCR_LANGUAGES = ["por"]
+# Processos de OCR por processo de ingestão (cada um roda o Tesseract com uma thread)
+OCR_PROCESS_POOL_SIZE = 4
+# Páginas rasterizadas por chamada ao pdftoppm (limita o espaço temporário em disco)
+OCR_RASTER_BATCH_SIZE = 16
+# Cache do texto reconhecido, indexado pelo hash da imagem da página e pelas configurações acima
+OCR_CACHE_DIR = "cache/ocr"
@@ -1,39 +1,91 @@
-from langchain_openai import OpenAI
-from langchain_google_genai import GoogleGenerativeAI
-from langchain_ollama import OllamaLLM
-from typing import Literal, Optional, Union
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Literal, Optional, Tuple, Union
+import importlib
+import os
+import threading
+import httpx
 import logging
 logger = logging.getLogger(__name__)
 
-LLMProvider = Literal["openai", "google", "ollama"]
+LLMProvider = Literal["openai", "google", "ollama", "stub"]
 
 DEFAULT_PROVIDER: LLMProvider = "openai"
 
+# Tamanho máximo do pool de clientes LLM prontos (LRU)
+LLM_POOL_MAX_SIZE = 8
+# Limites das conexões HTTP keep-alive compartilhadas entre os clientes do pool
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+# Consultas em lote (POST /query/batch): número máximo de perguntas por requisição e de
+# chamadas ao LLM em andamento ao mesmo tempo por lote
+BATCH_MAX_QUERIES = 256
+BATCH_LLM_CONCURRENCY = 8
+
+# Provedor "stub" (app/services/stub_llm.py): LLM local e determinístico usado nos testes de
+# carga (benchmarks/load_benchmark.py). Latência até o primeiro token, tokens por segundo e
+# tokens por resposta; podem ser ajustados por variáveis de ambiente ao subir o servidor
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "200"))
+STUB_LLM_TOKENS_PER_SECOND = float(os.getenv("STUB_LLM_TOKENS_PER_SECOND", "50"))
+STUB_LLM_ANSWER_TOKENS = int(os.getenv("STUB_LLM_ANSWER_TOKENS", "64"))
+
+# "class" é o caminho "módulo:classe" do cliente; o módulo do provedor só é importado no
+# primeiro uso (ver load_llm_class), então uma implantação que usa um único provedor não
+# paga a importação dos demais
 LLM_CONFIGS = {
     "openai": {
-        "class": OpenAI,
+        "class": "langchain_openai:OpenAI",
         "default_model": "gpt-4o-mini",
         "required_params": ["model"],
         "optional_params": ["temperature", "max_tokens"],
+        "shared_http_clients": True,
+        # Contagem de tokens do contexto (ver app/services/context_builder.py); sem tokenizador, é estimada
+        "tokenizer": "tiktoken",
+        # Limite de chamadas por minuto nas consultas em lote (ver app/services/rate_limiter.py); None: sem limite
+        "requests_per_minute": 500,
     },
     "google": {
-        "class": GoogleGenerativeAI,
+        "class": "langchain_google_genai:GoogleGenerativeAI",
         "default_model": "gemini-2.0-flash",
         "required_params": ["model"],
         "optional_params": ["temperature", "max_tokens"],
+        "requests_per_minute": 60,
     },
     "ollama": {
-        "class": OllamaLLM,
+        "class": "langchain_ollama:OllamaLLM",
         "default_model": "deepseek-r1:8b",
         "required_params": ["model"],
         "optional_params": ["temperature", "max_tokens"],
+        "requests_per_minute": None,
+    },
+    "stub": {
+        "class": "app.services.stub_llm:StubLLM",
+        "default_model": "stub-echo",
+        "required_params": ["model"],
+        "optional_params": ["temperature", "max_tokens"],
+        "requests_per_minute": None,
     },
 }
 
 
+_llm_classes: Dict[str, type] = {}
+
+
+def load_llm_class(provider: str) -> type:
+    """
+    Importa (uma única vez) e retorna a classe do cliente LLM do provedor.
+    """
+    llm_class = _llm_classes.get(provider)
+    if llm_class is None:
+        module_name, class_name = LLM_CONFIGS[provider]["class"].split(":")
+        llm_class = getattr(importlib.import_module(module_name), class_name)
+        _llm_classes[provider] = llm_class
+    return llm_class
+
+
 def get_llm(
     provider: LLMProvider = DEFAULT_PROVIDER, model: Optional[str] = None, **kwargs
-) -> Union[OpenAI, GoogleGenerativeAI, OllamaLLM]:
+) -> Any:
     """
     Inicializa e retorna um modelo de linguagem baseado no provedor especificado.
     # ... (resto da sua docstring)
@@ -43,7 +95,7 @@ def get_llm(
         raise ValueError(f"Provedor de LLM não suportado: {provider}")
 
     config = LLM_CONFIGS[provider]
-    llm_class = config["class"]
+    llm_class = load_llm_class(provider)
     
     # Determina o nome/ID do modelo a ser usado
     model_id_to_use = model or config["default_model"]
@@ -88,6 +140,11 @@ def get_llm(
     # Ou, se a classe LLM lida com as variáveis de ambiente automaticamente, isso não é necessário.
 
 
+    if config.get("shared_http_clients"):
+        http_client, http_async_client = get_shared_http_clients()
+        final_llm_params.setdefault("http_client", http_client)
+        final_llm_params.setdefault("http_async_client", http_async_client)
+
     logger.debug(f"Instanciando {llm_class.__name__} com os parâmetros: {final_llm_params}")
     try:
         return llm_class(**final_llm_params)
@@ -99,3 +156,120 @@ def get_llm(
         logger.error(f"Erro genérico ao instanciar LLM {llm_class.__name__}: {e}")
         raise
 
+
+_http_clients: Dict[str, Union[httpx.Client, httpx.AsyncClient]] = {}
+_http_clients_lock = threading.Lock()
+
+
+def get_shared_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Retorna o par (síncrono, assíncrono) de clientes HTTP keep-alive compartilhados
+    pelos provedores que aceitam um cliente httpx externo.
+    """
+    with _http_clients_lock:
+        if not _http_clients:
+            _http_clients["sync"] = httpx.Client(limits=HTTP_POOL_LIMITS, timeout=HTTP_TIMEOUT)
+            _http_clients["async"] = httpx.AsyncClient(limits=HTTP_POOL_LIMITS, timeout=HTTP_TIMEOUT)
+        return _http_clients["sync"], _http_clients["async"]
+
+
+class LLMPool:
+    """
+    Registro limitado (LRU) e thread-safe de clientes LLM prontos e de suas cadeias compiladas.
+
+    As entradas são indexadas por (provider, model, temperature, max_tokens), de modo que
+    requisições com os mesmos parâmetros reutilizam o mesmo cliente (e suas conexões HTTP)
+    em vez de instanciar um novo a cada consulta.
+    """
+
+    def __init__(self, max_size: int = LLM_POOL_MAX_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _make_key(provider: str, model: Optional[str], temperature: float, max_tokens: int, extra: Dict[str, Any]) -> Tuple:
+        model_id = model or LLM_CONFIGS.get(provider, {}).get("default_model")
+        return (provider, model_id, temperature, max_tokens) + tuple(sorted(extra.items()))
+
+    def get_chain(
+        self,
+        provider: LLMProvider = DEFAULT_PROVIDER,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        chain_factory: Optional[Callable[[Any], Any]] = None,
+        **kwargs,
+    ) -> Tuple[Any, Any]:
+        """
+        Retorna o LLM e a cadeia associada para os parâmetros informados, criando-os se necessário.
+
+        Args:
+            provider: Provedor do LLM
+            model: Nome do modelo (usa o padrão do provedor se None)
+            temperature: Temperatura de geração
+            max_tokens: Número máximo de tokens na resposta
+            chain_factory: Função que recebe o LLM e devolve a cadeia compilada
+            **kwargs: Parâmetros adicionais repassados a get_llm
+
+        Returns:
+            Tupla (llm, chain); chain é None se nenhuma chain_factory for informada
+        """
+        key = self._make_key(provider, model, temperature, max_tokens, kwargs)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if entry is None:
+            llm = get_llm(provider=provider, model=model, temperature=temperature, max_tokens=max_tokens, **kwargs)
+            entry = {"llm": llm, "chain": chain_factory(llm) if chain_factory else None}
+
+            with self._lock:
+                # Outra thread pode ter criado a mesma entrada enquanto o LLM era instanciado
+                existing = self._entries.get(key)
+                if existing is not None:
+                    entry = existing
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    self._entries[key] = entry
+                    while len(self._entries) > self.max_size:
+                        evicted_key, _ = self._entries.popitem(last=False)
+                        self.evictions += 1
+                        logger.debug(f"Cliente LLM removido do pool (LRU): {evicted_key}")
+
+        if chain_factory is not None and entry["chain"] is None:
+            entry["chain"] = chain_factory(entry["llm"])
+
+        return entry["llm"], entry["chain"]
+
+    def get_llm(self, provider: LLMProvider = DEFAULT_PROVIDER, model: Optional[str] = None, **kwargs) -> Any:
+        """
+        Retorna apenas o cliente LLM do pool.
+        """
+        llm, _ = self.get_chain(provider=provider, model=model, **kwargs)
+        return llm
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+LLM_POOL = LLMPool()
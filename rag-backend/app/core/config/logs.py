@@ -0,0 +1,29 @@
+"""
+Configurações do pipeline de logs (app/core/utils/logger.py)
+"""
+import logging
+import os
+
+# Diretório do arquivo de log do dia; sem a variável de ambiente LOG_DIR, rag-backend/logs
+LOG_DIR = os.getenv("LOG_DIR")
+
+# Níveis dos destinos: arquivo do dia (logs/rag_AAAAMMDD.log) e console colorido. O arquivo é
+# compartilhado pelos workers e só recebe acréscimos; a rotação por tamanho, se necessária, é
+# feita fora da aplicação (ex: logrotate), e o arquivo novo é reaberto automaticamente
+LOG_FILE_LEVEL = logging.DEBUG
+LOG_CONSOLE_LEVEL = logging.DEBUG
+
+# Registros aguardando a escrita pela thread de logs; com a fila cheia, novos registros são
+# descartados (e contados) em vez de bloquear a requisição
+LOG_QUEUE_MAX_SIZE = 10_000
+
+# Tamanho máximo (caracteres) da mensagem de um registro; o excedente é cortado antes de entrar
+# na fila (ex: consultas, respostas e trechos de documentos muito longos). Tracebacks não são cortados
+LOG_MAX_MESSAGE_CHARS = 4000
+
+# Fração dos registros DEBUG mantidos por logger (o prefixo mais longo vale; os demais loggers
+# mantêm todos). Ex: 0.05 mantém 1 a cada 20 registros
+LOG_DEBUG_SAMPLE_RATES = {
+    "app.services.query_service": 0.05,
+    "app.services.rate_limiter": 0.1,
+}
@@ -2,6 +2,13 @@
 Templates de prompts para o sistema RAG
 """
 
+# Orçamento de tokens do contexto (trechos dos documentos) inserido no prompt
+CONTEXT_MAX_TOKENS = 3000
+# Fração dos trechos de uma passagem contida em outra mais relevante a partir da qual ela é descartada
+CONTEXT_DUPLICATE_THRESHOLD = 0.8
+# Sobreposição mínima (caracteres) para unir chunks vizinhos do mesmo documento
+CONTEXT_MIN_OVERLAP_CHARS = 40
+
 # Template padrão para consultas RAG
 TEMPLATE = """
 **Seu Papel:**
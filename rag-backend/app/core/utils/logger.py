@@ -1,7 +1,24 @@
+import atexit
+import itertools
 import logging
+import logging.handlers
+import multiprocessing.util
 import os
+import queue
 import sys
+import threading
 from datetime import datetime
+from typing import Any, Callable, Dict, IO, Optional, Tuple
+
+from app.core.config.logs import (
+    LOG_CONSOLE_LEVEL,
+    LOG_DEBUG_SAMPLE_RATES,
+    LOG_DIR,
+    LOG_FILE_LEVEL,
+    LOG_MAX_MESSAGE_CHARS,
+    LOG_QUEUE_MAX_SIZE,
+)
+
 
 class CustomFormatter(logging.Formatter):
     COLORS = {
@@ -20,39 +37,260 @@ class CustomFormatter(logging.Formatter):
         return log_message
 
 
-def setup_logger(name):
-    logger = logging.getLogger(name)
+class DebugSampler(logging.Filter):
+    """
+    Mantém apenas uma fração dos registros DEBUG de cada logger (1 a cada round(1 / taxa),
+    de forma determinística). Registros INFO ou acima sempre passam.
+    """
 
-    if not logger.handlers:
-        logger.setLevel(logging.DEBUG)
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._counters: Dict[str, Tuple[int, "itertools.count"]] = {}
+
+    def _rate(self, name: str) -> float:
+        # Vale a taxa do prefixo mais longo ("a.b" vale para "a.b" e "a.b.c")
+        matches = [prefix for prefix in self.rates if name == prefix or name.startswith(prefix + ".")]
+        return self.rates[max(matches, key=len)] if matches else 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        entry = self._counters.get(record.name)
+        if entry is None:
+            rate = self._rate(record.name)
+            entry = (max(1, round(1 / rate)) if rate > 0 else 0, itertools.count())
+            self._counters[record.name] = entry
+        interval, counter = entry
+        if interval <= 1:
+            return interval == 1
+        # next() em itertools.count é atômico no CPython: dispensa lock entre threads
+        return next(counter) % interval == 0
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Entrega os registros à fila da thread de logs sem nunca bloquear quem loga: a mensagem é
+    limitada a max_chars e, com a fila cheia, o registro é descartado (e contado).
+    """
 
-        log_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "logs"
-        )
-        os.makedirs(log_dir, exist_ok=True)
+    def __init__(self, log_queue: Any, max_chars: int = LOG_MAX_MESSAGE_CHARS):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.dropped = 0
 
-        timestamp = datetime.now().strftime("%Y%m%d")
-        log_file = os.path.join(log_dir, f"rag_{timestamp}.log")
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve a mensagem aqui, cortando o excedente antes de enfileirar (o traceback, se
+        # houver, é mantido inteiro). O registro é alterado no lugar, sem a cópia e o Formatter
+        # do QueueHandler padrão: é o único handler dos loggers da aplicação
+        message = record.getMessage()
+        if len(message) > self.max_chars:
+            message = f"{message[:self.max_chars]}... [+{len(message) - self.max_chars} caracteres omitidos]"
+        record.msg = message
+        record.args = None
+        if record.exc_info or record.stack_info:
+            message = self.format(record)
+        record.message = record.msg = message
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
 
-        file_handler = logging.FileHandler(log_file, encoding="utf-8")
-        file_handler.setLevel(logging.DEBUG)
-        file_formatter = logging.Formatter(
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """
+    Pipeline de logs do processo: os loggers da aplicação compartilham um QueueHandler, e uma
+    thread (QueueListener) faz a escrita no arquivo e no console. A requisição só paga a
+    criação do registro e a inserção na fila; o I/O acontece fora do event loop.
+
+    Os processos dos pools (ingestão, OCR, embeddings, carregamento de arquivos) não escrevem
+    no arquivo: criados com process_pool_logging, enviam os registros por uma fila do
+    multiprocessing ao processo que os criou, cuja thread faz a escrita. Processos independentes
+    que compartilham o arquivo do dia (ex: workers do uvicorn) apenas acrescentam linhas a ele
+    (WatchedFileHandler): nenhum processo renomeia o arquivo, e a rotação fica a cargo de uma
+    ferramenta externa (ex: logrotate), cujo arquivo novo é reaberto automaticamente.
+    """
+
+    def __init__(
+            self,
+            log_file: str,
+            stream: IO = sys.stdout,
+            queue_size: int = LOG_QUEUE_MAX_SIZE,
+            max_chars: int = LOG_MAX_MESSAGE_CHARS,
+            sample_rates: Optional[Dict[str, float]] = None
+    ):
+        self.log_file = log_file
+        self.stream = stream
+        self.queue_size = queue_size
+        self.handler = NonBlockingQueueHandler(queue.Queue(queue_size), max_chars)
+        self.handler.setLevel(min(LOG_FILE_LEVEL, LOG_CONSOLE_LEVEL))
+        self.handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATES if sample_rates is None else sample_rates))
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        # Fila que recebe os registros dos processos filhos (ou, em um filho, a fila do pai)
+        self._process_queue: Any = None
+        self._process_listener: Optional[logging.handlers.QueueListener] = None
+        self._handlers: Optional[Tuple[logging.Handler, logging.Handler]] = None
+        self._lock = threading.Lock()
+
+    def _make_handlers(self) -> Tuple[logging.Handler, logging.Handler]:
+        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+        # Somente acréscimos (O_APPEND), aberto no primeiro registro: seguro com vários processos
+        file_handler = logging.handlers.WatchedFileHandler(self.log_file, encoding="utf-8", delay=True)
+        file_handler.setLevel(LOG_FILE_LEVEL)
+        file_handler.setFormatter(logging.Formatter(
             "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
             datefmt="%Y-%m-%d %H:%M:%S",
-        )
-        file_handler.setFormatter(file_formatter)
+        ))
+
+        console_handler = logging.StreamHandler(self.stream)
+        console_handler.setLevel(LOG_CONSOLE_LEVEL)
+        console_handler.setFormatter(CustomFormatter("%(levelname)s - %(message)s"))
+        return file_handler, console_handler
+
+    def _get_handlers(self) -> Tuple[logging.Handler, logging.Handler]:
+        # Deve ser chamado com _lock adquirido; as duas threads de escrita usam os mesmos handlers
+        if self._handlers is None:
+            self._handlers = self._make_handlers()
+        return self._handlers
+
+    def start(self) -> None:
+        """
+        Inicia a thread de escrita (apenas uma vez por processo; nunca em um processo que
+        envia os registros ao processo pai).
+        """
+        with self._lock:
+            if self._listener is not None or self.handler.queue is self._process_queue:
+                return
+            self._listener = logging.handlers.QueueListener(
+                self.handler.queue, *self._get_handlers(), respect_handler_level=True
+            )
+            self._listener.start()
+
+    def process_queue(self) -> Any:
+        """
+        Fila do multiprocessing pela qual os processos filhos enviam os registros a este
+        processo. No processo principal, é criada no primeiro uso junto com a thread que a
+        esvazia; em um filho, é a própria fila do pai (repassada aos netos).
+        """
+        with self._lock:
+            if self._process_queue is None:
+                self._process_queue = multiprocessing.get_context("spawn").Queue(self.queue_size)
+                self._process_listener = logging.handlers.QueueListener(
+                    self._process_queue, *self._get_handlers(), respect_handler_level=True
+                )
+                self._process_listener.start()
+            return self._process_queue
 
-        console_handler = logging.StreamHandler(sys.stdout)
-        console_handler.setLevel(logging.DEBUG)
-        console_formatter = CustomFormatter("%(levelname)s - %(message)s")
-        console_handler.setFormatter(console_formatter)
+    def attach(self, log_queue: Any) -> None:
+        """
+        Passa a enviar os registros deste processo (filho) à fila do processo pai, encerrando
+        a thread de escrita local.
+        """
+        with self._lock:
+            listener, self._listener = self._listener, None
+            self._process_queue = log_queue
+            self.handler.queue = log_queue
+        self._stop_listeners(listener)
 
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+    def _stop_listeners(self, *listeners: Optional[logging.handlers.QueueListener]) -> None:
+        for listener in listeners:
+            if listener is None:
+                continue
+            try:
+                listener.stop()
+            except queue.Full:
+                # Fila cheia: o sentinela não coube; a thread continua até o fim do processo
+                return
+        with self._lock:
+            if self._listener is not None or self._process_listener is not None:
+                return
+            handlers, self._handlers = self._handlers, None
+        for handler in handlers or ():
+            handler.close()
+
+    def stop(self) -> None:
+        """
+        Escreve os registros pendentes e encerra as threads de escrita.
+        """
+        with self._lock:
+            listener, self._listener = self._listener, None
+            process_listener, self._process_listener = self._process_listener, None
+        self._stop_listeners(listener, process_listener)
+
+    def _after_fork(self) -> None:
+        # No filho, as threads de escrita não existem e a fila pode ter ficado com o lock tomado
+        running = self._listener is not None
+        parent_queue = self._process_queue
+        self._lock = threading.Lock()
+        self._listener = None
+        self._process_listener = None
+        self._handlers = None
+        if parent_queue is not None:
+            # Filho de um pool: os registros seguem para o processo pai
+            self._process_queue = parent_queue
+            self.handler.queue = parent_queue
+            return
+        self.handler.queue = queue.Queue(self.queue_size)
+        if running:
+            self.start()
+
+    def _after_process_start(self) -> None:
+        # Processos do multiprocessing terminam com os._exit, sem atexit: a fila é escrita
+        # pelos finalizadores dele
+        multiprocessing.util.Finalize(self, self.stop, exitpriority=0)
+
+    def stats(self) -> Dict[str, int]:
+        try:
+            queued = self.handler.queue.qsize()
+        except NotImplementedError:
+            # Queue do multiprocessing no macOS
+            queued = 0
+        return {"queued": queued, "dropped": self.handler.dropped}
+
+
+_log_dir = LOG_DIR or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "logs"
+)
+LOG_PIPELINE = LogPipeline(os.path.join(_log_dir, f"rag_{datetime.now().strftime('%Y%m%d')}.log"))
+atexit.register(LOG_PIPELINE.stop)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=LOG_PIPELINE._after_fork)
+multiprocessing.util.register_after_fork(LOG_PIPELINE, LogPipeline._after_process_start)
+
+
+def _init_process_logging(log_queue: Any, initializer: Optional[Callable[..., None]], *initargs: Any) -> None:
+    LOG_PIPELINE.attach(log_queue)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def process_pool_logging(initializer: Optional[Callable[..., None]] = None, initargs: Tuple = ()) -> Dict[str, Any]:
+    """
+    Argumentos initializer/initargs de um ProcessPoolExecutor cujos processos enviam os
+    registros de log a este processo (ver LogPipeline), executando depois o initializer do pool.
+    """
+    return {
+        "initializer": _init_process_logging,
+        "initargs": (LOG_PIPELINE.process_queue(), initializer, *initargs),
+    }
+
+
+def setup_logger(name):
+    logger = logging.getLogger(name)
+
+    if not logger.handlers:
+        logger.setLevel(logging.DEBUG)
+        LOG_PIPELINE.start()
+        logger.addHandler(LOG_PIPELINE.handler)
 
     return logger
 
 
 def get_logger(name):
     return setup_logger(name)
-
@@ -0,0 +1,355 @@
+import bisect
+import itertools
+import math
+import threading
+import weakref
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Limites (segundos) dos buckets dos histogramas de latência: de 1 ms a 2 min
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Shard:
+    __slots__ = ("values", "__weakref__")
+
+    def __init__(self, size: int):
+        self.values = [0.0] * size
+
+
+class _ThreadShards:
+    """
+    Valores de uma série particionados por thread: cada thread escreve apenas no seu próprio
+    array (sem locks nem operações atômicas) e a leitura soma os arrays de todas as threads.
+    O lock só é usado quando uma thread escreve pela primeira vez, quando ela termina e na leitura.
+
+    Quando uma thread termina (ex: threads recicladas do threadpool do anyio ou de executores),
+    o seu array é somado a um array base e descartado: a memória e o custo da leitura dependem
+    apenas das threads vivas.
+    """
+
+    __slots__ = ("size", "_local", "_shards", "_base", "_next_key", "_lock")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._shards: Dict[int, List[float]] = {}
+        self._base = [0.0] * size
+        self._next_key = itertools.count()
+        self._lock = threading.Lock()
+
+    def local(self) -> List[float]:
+        try:
+            return self._local.shard.values
+        except AttributeError:
+            shard = _Shard(self.size)
+            key = next(self._next_key)
+            with self._lock:
+                self._shards[key] = shard.values
+            # O threading.local libera o _Shard quando a thread termina
+            weakref.finalize(shard, self._retire, key)
+            self._local.shard = shard
+            return shard.values
+
+    def _retire(self, key: int) -> None:
+        with self._lock:
+            values = self._shards.pop(key)
+            for i, value in enumerate(values):
+                self._base[i] += value
+
+    def total(self) -> List[float]:
+        with self._lock:
+            return [sum(column) for column in zip(self._base, *self._shards.values())]
+
+
+class _CounterChild:
+    __slots__ = ("_shards",)
+
+    def __init__(self):
+        self._shards = _ThreadShards(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._shards.local()[0] += amount
+
+    def value(self) -> float:
+        return self._shards.total()[0]
+
+
+class _GaugeChild:
+    __slots__ = ("_value",)
+
+    def __init__(self):
+        self._value = 0.0
+
+    def set(self, value: float) -> None:
+        # Atribuição simples: a última escrita vale
+        self._value = value
+
+    def value(self) -> float:
+        return self._value
+
+
+class _HistogramChild:
+    """
+    Contagem por bucket (não cumulativa; acumulada só na exportação), soma e total das observações.
+    """
+
+    __slots__ = ("buckets", "_shards")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self._shards = _ThreadShards(len(buckets) + 3)
+
+    def observe(self, value: float) -> None:
+        values = self._shards.local()
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        values = self._shards.total()
+        return values[:len(self.buckets) + 1], values[-2], values[-1]
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """
+        Retorna a série dos valores de labels informados (criada apenas na primeira vez).
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: esperados os labels {self.labelnames}, recebidos {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[Tuple[str, LabelValues, Tuple[Tuple[str, str], ...], float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, values, (), child.value()
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, values, (), child.value()
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            counts, total, count = child.snapshot()
+            cumulative = 0.0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", values, (("le", _format_value(bound)),), cumulative
+            yield f"{self.name}_sum", values, (), total
+            yield f"{self.name}_count", values, (), count
+
+
+class CallbackMetric(_Metric):
+    """
+    Métrica lida de outra fonte no momento da coleta (ex: contadores que os caches já mantêm,
+    tamanho do índice, profundidade da fila), sem custo no caminho das requisições.
+    """
+
+    def __init__(self, name: str, documentation: str, type_name: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[LabelValues, float]]]):
+        self.type_name = type_name
+        self.callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return None
+
+    def samples(self):
+        for values, value in self.callback():
+            yield self.name, values, (), value
+
+
+def _escape(value: str, quotes: bool = True) -> str:
+    # Valores de labels escapam também as aspas; textos de HELP, apenas barra invertida e quebra de linha
+    value = str(value).replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quotes else value
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class MetricsRegistry:
+    """
+    Registro das métricas do processo, exportadas no formato texto do Prometheus (GET /metrics).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica já registrada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, type_name: str, labelnames: Sequence[str],
+                 callback: Callable[[], Iterable[Tuple[LabelValues, float]]]) -> CallbackMetric:
+        return self._register(CallbackMetric(name, documentation, type_name, labelnames, callback))
+
+    def render(self) -> str:
+        """
+        Exporta todas as métricas no formato texto do Prometheus (versão 0.0.4).
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation, quotes=False)}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for sample_name, values, extra, value in metric.samples():
+                labels = list(zip(metric.labelnames, values)) + list(extra)
+                if labels:
+                    label_text = ",".join(f'{name}="{_escape(label)}"' for name, label in labels)
+                    lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{sample_name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+# Consultas
+QUERY_STAGE_SECONDS = METRICS.histogram(
+    "rag_query_stage_seconds",
+    "Duração de cada etapa das consultas (embed, search, rerank, prompt, first_token, llm, total)",
+    ("stage", "provider", "model"),
+)
+BATCH_STAGE_SECONDS = METRICS.histogram(
+    "rag_batch_stage_seconds",
+    "Duração das etapas compartilhadas de cada lote de /query/batch (embed, search, total)",
+    ("stage",),
+)
+QUERIES_TOTAL = METRICS.counter(
+    "rag_queries_total",
+    "Consultas atendidas, por endpoint e origem da resposta (llm, cache_exact, cache_semantic)",
+    ("endpoint", "source"),
+)
+QUERY_ERRORS_TOTAL = METRICS.counter(
+    "rag_query_errors_total",
+    "Consultas com erro, por endpoint e código HTTP ('item': consulta de um lote; 'generation': falha no meio do streaming)",
+    ("endpoint", "status"),
+)
+RETRIEVED_DOCUMENTS_TOTAL = METRICS.counter(
+    "rag_retrieved_documents_total",
+    "Documentos recuperados do índice, por tipo de busca",
+    ("search_type",),
+)
+PROMPT_TOKENS_TOTAL = METRICS.counter(
+    "rag_prompt_tokens_total",
+    "Tokens dos prompts enviados aos LLMs",
+    ("provider", "model"),
+)
+
+# Ingestão
+INGEST_FILE_SECONDS = METRICS.histogram(
+    "rag_ingest_file_seconds",
+    "Duração da carga e divisão em chunks (load_split) de cada arquivo, por tipo de arquivo",
+    ("stage", "file_type"),
+)
+INGEST_BATCH_SECONDS = METRICS.histogram(
+    "rag_ingest_batch_seconds",
+    "Duração das etapas de cada lote de chunks (embed, index), por tipo de arquivo ('mixed' se variados)",
+    ("stage", "file_type"),
+)
+INGEST_FILES_TOTAL = METRICS.counter(
+    "rag_ingest_files_total",
+    "Arquivos carregados, por tipo de arquivo e resultado (ok; failed: erro ou nenhum chunk gerado)",
+    ("file_type", "status"),
+)
+INGEST_CHUNKS_TOTAL = METRICS.counter(
+    "rag_ingest_chunks_total",
+    "Chunks embeddados e indexados, por tipo de arquivo (a taxa é o throughput da ingestão)",
+    ("file_type",),
+)
+
+
+def observe_stages(histogram: Histogram, timings_ms: Dict[str, float], *labels: str) -> None:
+    """
+    Registra no histograma cada etapa de um dicionário de tempos em milissegundos.
+    """
+    for stage, elapsed_ms in timings_ms.items():
+        histogram.labels(stage, *labels).observe(elapsed_ms / 1000)
+
+
+def batch_file_type(file_types: Iterable[str]) -> str:
+    """
+    Label de tipo de arquivo de um lote: o tipo, se único, ou "mixed".
+    """
+    types = set(file_types)
+    return types.pop() if len(types) == 1 else "mixed"
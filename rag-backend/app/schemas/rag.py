@@ -1,27 +1,92 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
+
+from app.core.config.llm import BATCH_MAX_QUERIES, DEFAULT_PROVIDER, LLM_CONFIGS, LLMProvider
+
+class QueryFilters(BaseModel):
+    source_docs: Optional[List[str]] = Field(default=None, description="Restringe a busca a estes documentos de origem (nomes dos arquivos)")
+    file_types: Optional[List[str]] = Field(default=None, description="Restringe a busca a estes tipos de arquivo (ex: 'pdf', 'docx')")
+    ingested_after: Optional[datetime] = Field(default=None, description="Apenas chunks ingeridos a partir deste momento")
+    ingested_before: Optional[datetime] = Field(default=None, description="Apenas chunks ingeridos antes deste momento")
+
+    def to_search_filters(self) -> Dict[str, Any]:
+        """
+        Converte os filtros para os argumentos do QueryService (datas em epoch).
+        """
+        return {
+            "source_docs": self.source_docs or None,
+            "file_types": self.file_types or None,
+            "ingested_after": self.ingested_after.timestamp() if self.ingested_after else None,
+            "ingested_before": self.ingested_before.timestamp() if self.ingested_before else None,
+        }
 
 class QueryRequest(BaseModel):
     query: str = Field(..., description="Pergunta do usuário em linguagem natural")
-    provider: Optional[str] = Field(default="google", description="Provedor do modelo de linguagem")
-    model: Optional[str] = Field(default="gemini-2.0-flash", description="Nome do modelo de linguagem")
+    provider: Optional[LLMProvider] = Field(default=DEFAULT_PROVIDER, description="Provedor do modelo de linguagem")
+    model: Optional[str] = Field(default=None, description="Nome do modelo de linguagem (padrão do provedor se omitido)")
     temperature: Optional[float] = Field(default=0.7, description="Temperatura para geração de texto (0.0 a 1.0)")
     max_tokens: Optional[int] = Field(default=4096, description="Número máximo de tokens na resposta")
 
-    search_type: Optional[Literal['similarity', 'mmr', 'similarity_score_threshold']] = Field(default='similarity', description="Tipo de busca para o retriever")
+    search_type: Optional[Literal['similarity', 'mmr', 'similarity_score_threshold', 'hybrid']] = Field(default='similarity', description="Tipo de busca para o retriever ('hybrid' funde a busca vetorial com BM25)")
     search_k: Optional[int] = Field(default=5, ge=1, le=20, description="Número de documentos a serem recuperados (k)")
+    nprobe: Optional[int] = Field(default=None, ge=1, le=4096, description="Listas visitadas na busca em índices IVF (padrão do índice se omitido)")
+    ef_search: Optional[int] = Field(default=None, ge=1, le=4096, description="Tamanho da fila de candidatos na busca em índices HNSW (padrão do índice se omitido)")
+    rerank: Optional[bool] = Field(default=False, description="Re-ranqueia os candidatos da busca com um cross-encoder e mantém os search_k melhores")
+    max_context_tokens: Optional[int] = Field(default=None, ge=256, le=128000, description="Orçamento de tokens do contexto enviado ao LLM (padrão: CONTEXT_MAX_TOKENS)")
+    filters: Optional[QueryFilters] = Field(default=None, description="Filtros de metadados aplicados na busca (combinados com E; valores de uma mesma lista, com OU)")
 
-class IngestRequest(BaseModel):
-    data_dir: Optional[str] = Field(default="data/", description="Diretório onde estão os documentos")
-    clear_existing: Optional[bool] = Field(default=False, description="Se verdadeiro, limpa o índice existente")
+    def to_llm_params(self) -> Dict[str, Any]:
+        """
+        Converte os parâmetros do LLM para os argumentos do QueryService, com o mesmo
+        provedor e modelo padrão em /query, /query/stream e /query/batch.
+        """
+        provider = self.provider or DEFAULT_PROVIDER
+        return {
+            "provider": provider,
+            "model": self.model or LLM_CONFIGS[provider]["default_model"],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
 
 class FileUploadResponse(BaseModel):
     status: str = Field(..., description="Status da operação de upload")
     message: str = Field(..., description="Mensagem detalhada sobre o resultado do upload")
+    job_id: Optional[str] = Field(default=None, description="Identificador do job de ingestão, para consulta em /ingest/jobs/{job_id}")
+
+class IngestJobResponse(BaseModel):
+    job_id: str = Field(..., description="Identificador do job de ingestão")
+    filename: str = Field(..., description="Nome do arquivo enviado")
+    status: Literal['queued', 'processing', 'success', 'warning', 'error'] = Field(..., description="Situação atual do job")
+    message: str = Field(..., description="Mensagem detalhada sobre o andamento ou resultado do job")
+    chunks: Optional[int] = Field(default=None, description="Número de chunks gerados a partir do arquivo")
+    progress: Optional[Dict[str, int]] = Field(default=None, description="Andamento do OCR: pages_done, pages_total e pages_cached")
+    created_at: float = Field(..., description="Momento (epoch) em que o job foi enfileirado")
+    started_at: Optional[float] = Field(default=None, description="Momento (epoch) em que o processamento começou")
+    finished_at: Optional[float] = Field(default=None, description="Momento (epoch) em que o processamento terminou")
 
 class QueryResponse(BaseModel):
     answer: str = Field(..., description="Resposta gerada pelo modelo")
     sources: List[str] = Field(..., description="Fontes utilizadas para gerar a resposta")
+    cache: Optional[Literal['exact', 'semantic']] = Field(default=None, description="Tipo de acerto no cache de respostas, se a resposta veio do cache")
+    timings: Optional[Dict[str, float]] = Field(default=None, description="Tempo (ms) de cada etapa: embed, search, rerank, prompt, llm e total")
+    prompt_tokens: Optional[int] = Field(default=None, description="Tokens do prompt enviado ao LLM (ausente se a resposta veio do cache)")
+
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest] = Field(..., min_length=1, max_length=BATCH_MAX_QUERIES, description="Consultas do lote (mesmo formato de /query)")
+    concurrency: Optional[int] = Field(default=None, ge=1, le=64, description="Chamadas ao LLM em andamento ao mesmo tempo (padrão: BATCH_LLM_CONCURRENCY)")
+
+class BatchQueryItem(BaseModel):
+    answer: Optional[str] = Field(default=None, description="Resposta gerada pelo modelo (ausente se a consulta falhou)")
+    sources: List[str] = Field(default_factory=list, description="Fontes utilizadas para gerar a resposta")
+    cache: Optional[Literal['exact', 'semantic']] = Field(default=None, description="Tipo de acerto no cache de respostas, se a resposta veio do cache")
+    timings: Optional[Dict[str, float]] = Field(default=None, description="Tempo (ms) das etapas próprias da consulta: rerank, prompt, rate_limit_wait e llm")
+    prompt_tokens: Optional[int] = Field(default=None, description="Tokens do prompt enviado ao LLM (ausente se a resposta veio do cache)")
+    error: Optional[str] = Field(default=None, description="Erro desta consulta, se houver (as demais consultas do lote não são afetadas)")
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryItem] = Field(..., description="Resultados na mesma ordem das consultas enviadas")
+    timings: Dict[str, float] = Field(..., description="Tempo (ms) das etapas compartilhadas pelo lote: embed, search e total")
 
 class IngestResponse(BaseModel):
     status: str = Field(..., description="Status da operação de ingestão")
@@ -0,0 +1,260 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from app.core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Número máximo de respostas mantidas em cache (LRU)
+ANSWER_CACHE_MAX_SIZE = 1024
+# Tempo de vida de cada resposta em cache, em segundos
+ANSWER_CACHE_TTL_SECONDS = 6 * 60 * 60
+# Similaridade de cosseno mínima entre consultas para reaproveitar uma resposta
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+# Quantos vizinhos consultar no índice de consultas passadas do namespace
+ANSWER_CACHE_SEARCH_NEIGHBORS = 8
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normaliza a consulta para a busca exata: caixa, espaços e pontuação final.
+    """
+    normalized = unicodedata.normalize("NFKC", query).lower().strip()
+    normalized = re.sub(r"\s+", " ", normalized)
+    return normalized.rstrip("?!. ")
+
+
+def freeze_filters(filters: Optional[Dict[str, Any]]) -> Tuple:
+    """
+    Representação imutável e canônica dos filtros de metadados (ignora os vazios).
+    """
+    return tuple(sorted(
+        (name, tuple(sorted(value)) if isinstance(value, list) else value)
+        for name, value in (filters or {}).items()
+        if value is not None and value != []
+    ))
+
+
+class AnswerNamespace(NamedTuple):
+    """
+    Parâmetros que precisam coincidir para que uma resposta em cache seja reaproveitada.
+    """
+    provider: str
+    model: str
+    search_type: str
+    search_k: int
+    index_version: int
+    rerank: bool
+    filters: Tuple
+    nprobe: Optional[int]
+    ef_search: Optional[int]
+    max_context_tokens: Optional[int]
+    temperature: Optional[float]
+    max_tokens: Optional[int]
+
+
+class AnswerCache:
+    """
+    Cache de respostas geradas pelo LLM, consultado antes da recuperação e da geração.
+
+    Cada entrada pertence a um namespace (AnswerNamespace: provider, model, search_type, search_k,
+    versão do índice, rerank, filtros, nprobe/ef_search, orçamento de contexto, temperature e
+    max_tokens).
+    A busca é feita em duas etapas:
+      1. exata, pela consulta normalizada;
+      2. aproximada, comparando o embedding da consulta com um pequeno índice FAISS
+         (produto interno sobre vetores normalizados) das consultas já respondidas no mesmo
+         namespace; cada namespace tem o seu índice, então entradas de outros namespaces não
+         ocupam os vizinhos consultados.
+
+    As entradas expiram por TTL e são removidas em ordem LRU quando o cache enche.
+    Quando a versão do índice muda (nova ingestão), todo o cache é invalidado.
+    """
+
+    def __init__(
+        self,
+        max_size: int = ANSWER_CACHE_MAX_SIZE,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._exact: Dict[Tuple, int] = {}
+        self._indexes: Dict[AnswerNamespace, faiss.IndexIDMap] = {}
+        self._next_id = 0
+        self._index_version: Optional[int] = None
+
+        self._stats = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def make_namespace(provider: str, model: str, search_type: str, search_k: int, index_version: int,
+                       rerank: bool = False, filters: Optional[Dict[str, Any]] = None,
+                       nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                       max_context_tokens: Optional[int] = None, temperature: Optional[float] = None,
+                       max_tokens: Optional[int] = None) -> AnswerNamespace:
+        # Respostas de consultas filtradas só são reaproveitadas com os mesmos filtros; nprobe/ef_search
+        # mudam os documentos recuperados, max_context_tokens corta o contexto enviado ao LLM e
+        # temperature/max_tokens mudam a geração
+        return AnswerNamespace(
+            provider, model, search_type, search_k, index_version, rerank, freeze_filters(filters),
+            nprobe, ef_search, max_context_tokens, temperature, max_tokens
+        )
+
+    def _check_version(self, index_version: int) -> None:
+        if self._index_version != index_version:
+            if self._entries:
+                logger.info(
+                    f"Versão do índice mudou ({self._index_version} -> {index_version}). Invalidando cache de respostas."
+                )
+                self._stats["invalidations"] += 1
+            self._clear()
+            self._index_version = index_version
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._exact.clear()
+        self._indexes.clear()
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        self._exact.pop((entry["namespace"], entry["normalized_query"]), None)
+        index = self._indexes.get(entry["namespace"])
+        if index is not None:
+            index.remove_ids(np.array([entry_id], dtype=np.int64))
+            if index.ntotal == 0:
+                del self._indexes[entry["namespace"]]
+
+    def _is_expired(self, entry: Dict[str, Any]) -> bool:
+        return time.monotonic() - entry["created_at"] > self.ttl_seconds
+
+    def _hit(self, entry_id: int, kind: str) -> Dict[str, Any]:
+        self._entries.move_to_end(entry_id)
+        self._stats[f"{kind}_hits"] += 1
+        entry = self._entries[entry_id]
+        return {"answer": entry["answer"], "sources": list(entry["sources"]), "cache": kind}
+
+    def get_exact(self, query: str, namespace: AnswerNamespace) -> Optional[Dict[str, Any]]:
+        """
+        Busca uma resposta para a consulta normalizada (sem precisar de embedding).
+        Não contabiliza miss: a busca aproximada ainda pode encontrar a resposta.
+        """
+        with self._lock:
+            self._check_version(namespace.index_version)
+            entry_id = self._exact.get((namespace, normalize_query(query)))
+            if entry_id is None:
+                return None
+            if self._is_expired(self._entries[entry_id]):
+                self._remove(entry_id)
+                self._stats["expirations"] += 1
+                return None
+            return self._hit(entry_id, "exact")
+
+    def get_similar(self, embedding: List[float], namespace: AnswerNamespace) -> Optional[Dict[str, Any]]:
+        """
+        Busca uma resposta para uma consulta semanticamente equivalente já respondida.
+        """
+        with self._lock:
+            self._check_version(namespace.index_version)
+            index = self._indexes.get(namespace)
+            if index is None:
+                self._stats["misses"] += 1
+                return None
+
+            vector = np.asarray([embedding], dtype=np.float32)
+            faiss.normalize_L2(vector)
+            k = min(ANSWER_CACHE_SEARCH_NEIGHBORS, index.ntotal)
+            scores, ids = index.search(vector, k)
+
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.similarity_threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None:
+                    continue
+                if self._is_expired(entry):
+                    self._remove(int(entry_id))
+                    self._stats["expirations"] += 1
+                    continue
+                return self._hit(int(entry_id), "semantic")
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(
+        self,
+        query: str,
+        embedding: List[float],
+        namespace: AnswerNamespace,
+        answer: str,
+        sources: List[str],
+    ) -> None:
+        """
+        Armazena uma resposta gerada, removendo a entrada menos recente se o cache estiver cheio.
+        """
+        vector = np.asarray([embedding], dtype=np.float32)
+        faiss.normalize_L2(vector)
+
+        with self._lock:
+            self._check_version(namespace.index_version)
+            key = (namespace, normalize_query(query))
+            if key in self._exact:
+                self._remove(self._exact[key])
+
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._indexes[namespace] = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {
+                "namespace": namespace,
+                "normalized_query": key[1],
+                "answer": answer,
+                "sources": list(sources),
+                "created_at": time.monotonic(),
+            }
+            self._exact[key] = entry_id
+
+            while len(self._entries) > self.max_size:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self._stats["evictions"] += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            if self._entries:
+                self._stats["invalidations"] += 1
+            self._clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["max_size"] = self.max_size
+            lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+            stats["hit_rate"] = round((stats["exact_hits"] + stats["semantic_hits"]) / lookups, 4) if lookups else 0.0
+            return stats
+
+
+ANSWER_CACHE = AnswerCache()
@@ -0,0 +1,205 @@
+import math
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.config.embeddings import CHUNK_OVERLAP
+from app.core.config.llm import LLM_CONFIGS
+from app.core.config.prompts import (
+    CONTEXT_DUPLICATE_THRESHOLD,
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_MIN_OVERLAP_CHARS,
+)
+from app.core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DOCUMENT_SEPARATOR = "\n\n"
+# Caracteres por token usados quando não há tokenizador local para o provedor (texto em português)
+ESTIMATED_CHARS_PER_TOKEN = 3.5
+# Tamanho (em palavras) dos trechos comparados na detecção de passagens quase duplicadas
+_SHINGLE_SIZE = 5
+
+_counters: Dict[Tuple[str, str], Callable[[str], int]] = {}
+_counters_lock = threading.Lock()
+
+
+def _estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / ESTIMATED_CHARS_PER_TOKEN)
+
+
+def get_token_counter(provider: str, model: str) -> Callable[[str], int]:
+    """
+    Retorna a função de contagem de tokens do provedor/modelo.
+
+    Provedores com "tokenizer": "tiktoken" em LLM_CONFIGS usam o tokenizador do próprio modelo;
+    os demais (ou se o tiktoken não estiver disponível) usam uma estimativa por caracteres.
+    """
+    key = (provider, model)
+    counter = _counters.get(key)
+    if counter is not None:
+        return counter
+
+    with _counters_lock:
+        if key in _counters:
+            return _counters[key]
+        counter = _estimate_tokens
+        if LLM_CONFIGS.get(provider, {}).get("tokenizer") == "tiktoken":
+            try:
+                import tiktoken
+
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding("o200k_base")
+                counter = lambda text: len(encoding.encode(text, disallowed_special=()))
+            except Exception as e:
+                logger.warning(f"Tokenizador de {provider}/{model} indisponível ({e}); usando estimativa por caracteres.")
+        _counters[key] = counter
+        return counter
+
+
+def _overlap_merge(first: str, second: str) -> Optional[str]:
+    """
+    Se o fim de `first` coincide com o início de `second` (sobreposição do splitter),
+    retorna os dois textos unidos sem repetir o trecho comum.
+    """
+    max_overlap = min(len(first), len(second), CHUNK_OVERLAP * 2)
+    if max_overlap < CONTEXT_MIN_OVERLAP_CHARS:
+        return None
+    probe = second[:CONTEXT_MIN_OVERLAP_CHARS]
+    pos = first.find(probe, len(first) - max_overlap)
+    while pos != -1:
+        if second.startswith(first[pos:]):
+            return first[:pos] + second
+        pos = first.find(probe, pos + 1)
+    return None
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < _SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+class ContextBuilder:
+    """
+    Monta o contexto do prompt dentro de um orçamento de tokens.
+
+    Etapas, sobre os documentos em ordem de relevância:
+      1. chunks vizinhos do mesmo source_doc cujo texto se sobrepõe (overlap do splitter)
+         são unidos em uma única passagem, na posição do mais relevante;
+      2. passagens quase duplicadas (a maior parte dos trechos de 5 palavras contida em
+         uma passagem mais relevante) são descartadas;
+      3. as passagens entram no contexto em ordem de relevância enquanto couberem no
+         orçamento; se nem a primeira couber, ela é truncada.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int],
+        max_tokens: int = CONTEXT_MAX_TOKENS,
+        duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD,
+    ):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.duplicate_threshold = duplicate_threshold
+
+    @staticmethod
+    def merge_adjacent(documents: List[Document]) -> Tuple[List[Document], int]:
+        """
+        Une chunks sobrepostos do mesmo source_doc.
+
+        Returns:
+            Tupla (passagens em ordem de relevância, quantidade de uniões feitas)
+        """
+        entries: List[Tuple[int, Document]] = []
+        merges = 0
+        for rank, doc in enumerate(documents):
+            entry = (rank, doc)
+            source = doc.metadata.get("source_doc")
+            # Uma união pode aproximar a passagem de outra já escolhida (ex: chunks 1, 3 e depois 2)
+            while source is not None:
+                match = None
+                for other in entries:
+                    if other[1].metadata.get("source_doc") != source:
+                        continue
+                    text = _overlap_merge(other[1].page_content, entry[1].page_content) \
+                        or _overlap_merge(entry[1].page_content, other[1].page_content)
+                    if text is not None:
+                        match = (other, text)
+                        break
+                if match is None:
+                    break
+                other, text = match
+                entries.remove(other)
+                # A passagem unida fica na posição da mais relevante das duas
+                best = min(other, entry, key=lambda e: e[0])
+                entry = (best[0], Document(page_content=text, metadata=best[1].metadata))
+                merges += 1
+            entries.append(entry)
+        entries.sort(key=lambda e: e[0])
+        return [doc for _, doc in entries], merges
+
+    def remove_near_duplicates(self, passages: List[Document]) -> Tuple[List[Document], int]:
+        kept: List[Document] = []
+        kept_shingles: List[Set[Tuple[str, ...]]] = []
+        for passage in passages:
+            shingles = _shingles(passage.page_content)
+            duplicate = any(
+                shingles and other and len(shingles & other) / min(len(shingles), len(other)) >= self.duplicate_threshold
+                for other in kept_shingles
+            )
+            if not duplicate:
+                kept.append(passage)
+                kept_shingles.append(shingles)
+        return kept, len(passages) - len(kept)
+
+    def _truncate(self, text: str, budget: int) -> str:
+        tokens = self.count_tokens(text)
+        if tokens <= budget:
+            return text
+        # Corte proporcional, refinado até caber
+        cut = int(len(text) * budget / tokens)
+        while cut > 0 and self.count_tokens(text[:cut]) > budget:
+            cut = int(cut * 0.9)
+        return text[:cut]
+
+    def build(self, documents: List[Document]) -> Dict[str, Any]:
+        """
+        Monta o contexto a partir dos documentos recuperados (em ordem de relevância).
+
+        Returns:
+            Dicionário com context, documents (passagens usadas), context_tokens, merged,
+            duplicates e omitted
+        """
+        passages, merged = self.merge_adjacent(documents)
+        passages, duplicates = self.remove_near_duplicates(passages)
+
+        separator_tokens = self.count_tokens(DOCUMENT_SEPARATOR)
+        used: List[Document] = []
+        texts: List[str] = []
+        total = 0
+        for passage in passages:
+            tokens = self.count_tokens(passage.page_content) + (separator_tokens if texts else 0)
+            if total + tokens <= self.max_tokens:
+                used.append(passage)
+                texts.append(passage.page_content)
+                total += tokens
+            elif not texts:
+                text = self._truncate(passage.page_content, self.max_tokens)
+                used.append(Document(page_content=text, metadata=passage.metadata))
+                texts.append(text)
+                total += self.count_tokens(text)
+
+        return {
+            "context": DOCUMENT_SEPARATOR.join(texts),
+            "documents": used,
+            "context_tokens": total,
+            "merged": merged,
+            "duplicates": duplicates,
+            "omitted": len(passages) - len(used),
+        }
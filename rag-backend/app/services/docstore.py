@@ -0,0 +1,222 @@
+import json
+import os
+import sqlite3
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+from app.core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DOCSTORE_FILE = "docstore.sqlite"
+
+
+class SQLiteDocstoreWriter:
+    """
+    Grava incrementalmente o docstore SQLite de uma nova base, na ordem das posições
+    do índice FAISS. Permite construir a base em streaming, sem manter os chunks em memória.
+    """
+
+    def __init__(self, file_path: str):
+        self.conn = sqlite3.connect(file_path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute(
+            "CREATE TABLE docs (pos INTEGER PRIMARY KEY, doc_id TEXT NOT NULL, page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self.count = 0
+
+    def append(self, documents: Iterable[Tuple[str, Document]]) -> None:
+        """
+        Acrescenta documentos (doc_id, Document) nas próximas posições.
+        """
+        def rows():
+            for doc_id, doc in documents:
+                yield self.count, doc_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str)
+                self.count += 1
+
+        self.conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", rows())
+
+    def close(self) -> None:
+        try:
+            self.conn.execute("CREATE UNIQUE INDEX idx_docs_doc_id ON docs (doc_id)")
+            self.conn.commit()
+        finally:
+            self.conn.close()
+
+    def abort(self) -> None:
+        self.conn.close()
+
+
+def write_sqlite_docstore(file_path: str, docstore: Docstore, index_to_docstore_id: Dict[int, str]) -> None:
+    """
+    Grava chunks e metadados em um SQLite indexado pela posição do vetor no índice FAISS.
+
+    Args:
+        file_path: Caminho do arquivo SQLite a ser criado
+        docstore: Docstore de origem
+        index_to_docstore_id: Mapeamento posição FAISS -> id do documento
+    """
+    writer = SQLiteDocstoreWriter(file_path)
+    try:
+        writer.append(
+            (index_to_docstore_id[pos], docstore.search(index_to_docstore_id[pos]))
+            for pos in range(len(index_to_docstore_id))
+        )
+    except Exception:
+        writer.abort()
+        raise
+    writer.close()
+
+
+class _SQLiteTable:
+    """
+    Conexão somente leitura compartilhada por todas as versões derivadas de uma mesma base.
+
+    A conexão é aberta na criação: mesmo que a base seja removida do disco por uma
+    compactação, as versões que ainda a usam continuam lendo pelo descritor aberto.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.conn = sqlite3.connect(f"file:{file_path}?mode=ro", uri=True, check_same_thread=False)
+        self.count = self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def doc_by_id(self, doc_id: str) -> Optional[Document]:
+        row = self.conn.execute(
+            "SELECT doc_id, page_content, metadata FROM docs WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return Document(id=row[0], page_content=row[1], metadata=json.loads(row[2]))
+
+    def doc_id_by_pos(self, pos: int) -> Optional[str]:
+        row = self.conn.execute("SELECT doc_id FROM docs WHERE pos = ?", (pos,)).fetchone()
+        return row[0] if row else None
+
+    def positions_of(self, doc_ids: List[str]) -> List[int]:
+        positions = []
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            positions.extend(row[0] for row in self.conn.execute(
+                f"SELECT pos FROM docs WHERE doc_id IN ({placeholders})", batch
+            ))
+        return positions
+
+    def all_doc_ids(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT doc_id FROM docs ORDER BY pos")]
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Docstore que lê os chunks da base sob demanda (apenas os top-k de cada busca) e mantém
+    em memória somente os documentos adicionados depois do carregamento (segmentos).
+    """
+
+    def __init__(self, table: _SQLiteTable, overlay: Optional[Dict[str, Document]] = None):
+        self._table = table
+        self._overlay: Dict[str, Document] = overlay if overlay is not None else {}
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self._overlay.get(search)
+        if doc is None:
+            doc = self._table.doc_by_id(search)
+        if doc is None:
+            return f"ID {search} not found."
+        return doc
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        overlapping = set(texts).intersection(self._overlay)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        self._overlay.update(texts)
+
+    def delete(self, ids: List) -> None:
+        for doc_id in ids:
+            self._overlay.pop(doc_id, None)
+
+
+class SQLiteIndexMap(MutableMapping):
+    """
+    Mapeamento posição FAISS -> id do documento, lido do SQLite da base sob demanda.
+    Posições adicionadas depois do carregamento ficam em um dicionário em memória.
+    """
+
+    def __init__(self, table: _SQLiteTable, overlay: Optional[Dict[int, str]] = None):
+        self._table = table
+        self._overlay: Dict[int, str] = overlay if overlay is not None else {}
+
+    def __getitem__(self, pos: int) -> str:
+        if pos in self._overlay:
+            return self._overlay[pos]
+        if 0 <= pos < self._table.count:
+            doc_id = self._table.doc_id_by_pos(pos)
+            if doc_id is not None:
+                return doc_id
+        raise KeyError(pos)
+
+    def __setitem__(self, pos: int, doc_id: str) -> None:
+        self._overlay[pos] = doc_id
+
+    def __delitem__(self, pos: int) -> None:
+        del self._overlay[pos]
+
+    def __iter__(self) -> Iterator[int]:
+        yield from range(self._table.count)
+        yield from (pos for pos in self._overlay if pos >= self._table.count)
+
+    def __len__(self) -> int:
+        return self._table.count + sum(1 for pos in self._overlay if pos >= self._table.count)
+
+    def positions_of(self, doc_ids: List[str]) -> List[int]:
+        wanted = set(doc_ids)
+        positions = [pos for pos, doc_id in self._overlay.items() if doc_id in wanted]
+        overridden = set(self._overlay)
+        positions.extend(pos for pos in self._table.positions_of(list(wanted)) if pos not in overridden)
+        return positions
+
+    def doc_ids(self) -> List[str]:
+        ids = self._table.all_doc_ids()
+        for pos, doc_id in self._overlay.items():
+            if pos < len(ids):
+                ids[pos] = doc_id
+        ids.extend(doc_id for _, doc_id in sorted(
+            (pos, doc_id) for pos, doc_id in self._overlay.items() if pos >= len(ids)
+        ))
+        return ids
+
+
+def open_sqlite_docstore(directory: str):
+    """
+    Abre o docstore SQLite de uma base.
+
+    Returns:
+        Tupla (docstore, index_to_docstore_id)
+    """
+    table = _SQLiteTable(os.path.join(directory, DOCSTORE_FILE))
+    return SQLiteDocstore(table), SQLiteIndexMap(table)
+
+
+def index_map_positions(index_to_docstore_id: Any, doc_ids: List[str]) -> List[int]:
+    """
+    Posições no índice FAISS dos documentos informados (ids inexistentes são ignorados).
+    """
+    if not doc_ids:
+        return []
+    if isinstance(index_to_docstore_id, SQLiteIndexMap):
+        return index_to_docstore_id.positions_of(doc_ids)
+    wanted = set(doc_ids)
+    return [pos for pos, doc_id in index_to_docstore_id.items() if doc_id in wanted]
+
+
+def index_map_doc_ids(index_to_docstore_id: Any) -> List[str]:
+    """
+    Ids dos documentos na ordem das posições do índice FAISS.
+    """
+    if isinstance(index_to_docstore_id, SQLiteIndexMap):
+        return index_to_docstore_id.doc_ids()
+    return [index_to_docstore_id[pos] for pos in range(len(index_to_docstore_id))]
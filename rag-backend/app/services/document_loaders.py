@@ -1,22 +1,31 @@
 import os
+import time
 import concurrent.futures
 from abc import ABC, abstractmethod
-from typing import List
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Tuple
 from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import (
     PyPDFLoader,
     Docx2txtLoader,
-    UnstructuredPDFLoader,
     UnstructuredWordDocumentLoader,
     UnstructuredExcelLoader,
     TextLoader,
     UnstructuredMarkdownLoader
 )
 
-from app.core.utils.logger import get_logger
+from app.core.config.ingest import INGEST_MAX_IN_FLIGHT_FILES
+from app.core.utils.logger import get_logger, process_pool_logging
+from app.core.utils.metrics import INGEST_FILE_SECONDS, INGEST_FILES_TOTAL
+from app.services.metadata_index import file_type_of
+from app.services.ocr import OCR_ENGINE, OCRProgressCallback
 
 logger = get_logger(__name__)
 
+# Páginas de PDF com menos caracteres extraídos que isso são tratadas como digitalizadas (vão para OCR)
+MIN_PAGE_TEXT_CHARS = 30
+
 
 class DocumentLoaderStrategy(ABC):
     @abstractmethod
@@ -30,10 +39,67 @@ class PDFTextLoader(DocumentLoaderStrategy):
 
 
 class PDFOCRLoader(DocumentLoaderStrategy):
+    """
+    OCR página a página (ver OCREngine): páginas em paralelo e texto em cache no disco.
+    """
+
+    def __init__(self, progress: Optional[OCRProgressCallback] = None):
+        self.progress = progress
+
+    def load(self, file_path: str) -> List[Document]:
+        texts = self.load_pages(file_path)
+        return [
+            Document(page_content=text, metadata={"source": file_path, "page": page, "ocr": True})
+            for page, text in sorted(texts.items())
+            if text.strip()
+        ]
+
+    def load_pages(self, file_path: str, pages: Optional[List[int]] = None) -> Dict[int, str]:
+        """
+        Aplica OCR apenas às páginas informadas (índices a partir de 0; todas se None).
+
+        Returns:
+            Dicionário índice da página -> texto reconhecido
+        """
+        return OCR_ENGINE.ocr_pdf(file_path, pages, progress=self.progress)
+
+
+class PDFLoader(DocumentLoaderStrategy):
+    """
+    Extrai o texto de cada página com PyPDF em uma única passada e aplica OCR apenas
+    às páginas sem texto (digitalizadas). Em documentos mistos, as páginas digitais
+    não passam pelo OCR.
+    """
+
+    def __init__(self, progress: Optional[OCRProgressCallback] = None):
+        self.progress = progress
+
     def load(self, file_path: str) -> List[Document]:
-        return UnstructuredPDFLoader(
-            file_path, mode="single", strategy="hi_res"
-        ).load()
+        file_name = os.path.basename(file_path)
+        try:
+            pages = PDFTextLoader().load(file_path)
+        except Exception as e:
+            logger.warning(f"Text loading failed ({e}). Trying OCR for: {file_name}")
+            return PDFOCRLoader(self.progress).load(file_path)
+
+        scanned = [
+            i for i, page in enumerate(pages)
+            if len(page.page_content.strip()) < MIN_PAGE_TEXT_CHARS
+        ]
+        if not scanned:
+            logger.info(f"Successfully loaded text from: {file_name}")
+            return pages
+
+        logger.info(
+            f"{len(scanned)} de {len(pages)} página(s) sem texto em {file_name}. Aplicando OCR apenas nelas."
+        )
+        ocr_texts = PDFOCRLoader(self.progress).load_pages(file_path, scanned)
+        for i in scanned:
+            if ocr_texts.get(i, "").strip():
+                pages[i].page_content = ocr_texts[i]
+                pages[i].metadata["ocr"] = True
+
+        return [page for page in pages if page.page_content.strip()]
 
 
 class DocxLoader(DocumentLoaderStrategy):
@@ -61,61 +127,89 @@ class MarkdownLoader(DocumentLoaderStrategy):
         return UnstructuredMarkdownLoader(file_path).load()
 
 
-def load_all_documents(folder_path: str) -> List[Document]:
-    all_docs = []
+def list_data_files(folder_path: str) -> List[str]:
+    """
+    Lista os arquivos (não recursivamente) de um diretório de dados.
+    """
     file_paths = []
-    for file in os.listdir(folder_path):
+    for file in sorted(os.listdir(folder_path)):
         full_path = os.path.join(folder_path, file)
         if os.path.isfile(full_path):
             file_paths.append(full_path)
+    return file_paths
 
-    logger.info(
-        f"Encontrados {len(file_paths)} arquivos para processamento em {folder_path}"
-    )
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=None) as executor:
-        future_to_path = {
-            executor.submit(load_document, path): path for path in file_paths
-        }
-
-        for future in concurrent.futures.as_completed(future_to_path):
-            path = future_to_path[future]
-            try:
-                docs_for_file = future.result()
-                all_docs.extend(docs_for_file)
-            except Exception as exc:
-                logger.error(
-                    f"Exceção gerada ao carregar {os.path.basename(path)}: {exc}"
-                )
-
-    logger.info(f"Total de documentos carregados: {len(all_docs)}")
+def iter_split_documents(
+        file_paths: List[str],
+        chunk_size: int,
+        chunk_overlap: int,
+        max_in_flight: int = INGEST_MAX_IN_FLIGHT_FILES,
+) -> Iterator[Tuple[str, List[Document]]]:
+    """
+    Carrega e divide os arquivos em paralelo, entregando os chunks arquivo a arquivo
+    à medida que ficam prontos.
 
-    return all_docs
+    No máximo max_in_flight arquivos estão em processamento (ou com resultado aguardando
+    consumo) ao mesmo tempo: a memória usada não depende do tamanho do diretório, e os
+    chunks de cada arquivo podem ser indexados enquanto os próximos são carregados.
+    A divisão acontece nos processos do pool, então apenas os chunks voltam ao processo principal.
 
+    Args:
+        file_paths: Caminhos completos dos arquivos
+        chunk_size: Tamanho máximo de cada chunk
+        chunk_overlap: Sobreposição entre chunks consecutivos
+        max_in_flight: Arquivos processados simultaneamente
 
-def _choose_loader(file_path: str) -> DocumentLoaderStrategy:
+    Yields:
+        Tuplas (caminho do arquivo, chunks do arquivo); lista vazia se o arquivo falhar
+    """
+    if not file_paths:
+        return
+
+    remaining = iter(file_paths)
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(max_in_flight, os.cpu_count() or 1), **process_pool_logging()
+    ) as executor:
+        future_to_path = {}
+
+        def submit_next() -> None:
+            path = next(remaining, None)
+            if path is not None:
+                future_to_path[executor.submit(_timed_load_and_split, path, chunk_size, chunk_overlap)] = path
+
+        for _ in range(max_in_flight):
+            submit_next()
+
+        while future_to_path:
+            done, _ = concurrent.futures.wait(future_to_path, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                path = future_to_path.pop(future)
+                file_type = file_type_of(path)
+                try:
+                    chunks, elapsed = future.result()
+                except Exception as exc:
+                    logger.error(f"Exceção gerada ao carregar {os.path.basename(path)}: {exc}")
+                    chunks = []
+                # load_document registra o erro e retorna [] para arquivos ilegíveis ou não suportados
+                if chunks:
+                    INGEST_FILE_SECONDS.labels("load_split", file_type).observe(elapsed)
+                    INGEST_FILES_TOTAL.labels(file_type, "ok").inc()
+                else:
+                    INGEST_FILES_TOTAL.labels(file_type, "failed").inc()
+                submit_next()
+                yield path, chunks
+
+
+def _timed_load_and_split(file_path: str, chunk_size: int, chunk_overlap: int) -> Tuple[List[Document], float]:
+    # Executado no processo do pool: mede apenas a carga e a divisão, sem a espera na fila do pool
+    start = time.perf_counter()
+    chunks = load_and_split_document(file_path, chunk_size, chunk_overlap)
+    return chunks, time.perf_counter() - start
+
+
+def _choose_loader(file_path: str, progress: Optional[OCRProgressCallback] = None) -> DocumentLoaderStrategy:
     if file_path.endswith(".pdf"):
-        try:
-            text_loader = PDFTextLoader()
-            docs = text_loader.load(file_path)
-            is_empty = not docs or all(
-                len(doc.page_content.strip()) < 30 for doc in docs
-            )
-            if docs and not is_empty:
-                logger.info(
-                    f"Successfully loaded text from: {os.path.basename(file_path)}"
-                )
-                return text_loader
-            else:
-                logger.warning(
-                    f"No documents returned by text loader. Trying OCR for: {os.path.basename(file_path)}"
-                )
-                return PDFOCRLoader()
-        except Exception as e:
-            logger.warning(
-                f"Text loading failed ({e}). Trying OCR for: {os.path.basename(file_path)}"
-            )
-            return PDFOCRLoader()
+        return PDFLoader(progress)
     elif file_path.endswith(".docx"):
         return DocxLoader()
     elif file_path.endswith(".doc"):
@@ -132,12 +226,13 @@ def _choose_loader(file_path: str) -> DocumentLoaderStrategy:
         raise ValueError(f"❌ {error_msg}")
 
 
-def load_document(file_path: str) -> List[Document]:
+def load_document(file_path: str, progress: Optional[OCRProgressCallback] = None) -> List[Document]:
     """
     Carrega um único documento a partir do caminho do arquivo.
 
     Args:
         file_path: Caminho completo para o arquivo a ser carregado
+        progress: Chamado a cada página de OCR concluída (PDFs digitalizados)
 
     Returns:
         Lista de documentos carregados ou lista vazia se ocorrer um erro
@@ -145,7 +240,7 @@ def load_document(file_path: str) -> List[Document]:
     try:
         logger.info(f"Iniciando carregamento de: {os.path.basename(file_path)}")
 
-        loader = _choose_loader(file_path)
+        loader = _choose_loader(file_path, progress)
         docs = loader.load(file_path)
         for doc in docs:
             doc.metadata["source_doc"] = os.path.basename(file_path)
@@ -156,3 +251,42 @@ def load_document(file_path: str) -> List[Document]:
     except Exception as e:
         logger.error(f"Erro ao processar {os.path.basename(file_path)}: {e}")
         return []
+
+
+def load_and_split_document(
+        file_path: str,
+        chunk_size: int,
+        chunk_overlap: int,
+        progress_store: Optional[MutableMapping] = None,
+        progress_key: Optional[str] = None,
+) -> List[Document]:
+    """
+    Carrega um único documento e o divide em chunks.
+
+    Executado nos processos do pool de ingestão: recebe os parâmetros de chunking
+    explicitamente para não depender do modelo de embeddings no processo filho.
+
+    Args:
+        file_path: Caminho completo para o arquivo a ser carregado
+        chunk_size: Tamanho máximo de cada chunk
+        chunk_overlap: Sobreposição entre chunks consecutivos
+        progress_store: Dicionário compartilhado entre processos (ex: multiprocessing.Manager().dict())
+                        onde o andamento do OCR é publicado sob progress_key
+        progress_key: Chave do arquivo em progress_store
+
+    Returns:
+        Lista de chunks ou lista vazia se o arquivo não gerar documentos
+    """
+    progress = None
+    if progress_store is not None and progress_key is not None:
+        def progress(done: int, total: int, cached: int) -> None:
+            progress_store[progress_key] = {"pages_done": done, "pages_total": total, "pages_cached": cached}
+
+    docs = load_document(file_path, progress)
+    if not docs:
+        return []
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    return splitter.split_documents(docs)
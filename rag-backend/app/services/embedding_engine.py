@@ -0,0 +1,180 @@
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+
+from app.core.config.embeddings import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MODEL,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_THREADS_PER_WORKER,
+    EMBEDDING_WORKERS,
+    PrefixedCachedEmbeddings,
+)
+from app.core.utils.logger import get_logger, process_pool_logging
+
+logger = get_logger(__name__)
+
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+
+# Modelo carregado em cada processo de embedding (ver _init_worker)
+_worker_model: Any = None
+
+
+def load_sentence_transformer(model_name: str, backend: str) -> Any:
+    """
+    Carrega o modelo de embeddings no backend pedido, para execução em CPU.
+
+    Raises:
+        ValueError: Se o backend não for suportado
+        ImportError: Se o backend "onnx" for pedido sem optimum[onnxruntime] instalado
+    """
+    # torch e sentence-transformers só são importados quando um modelo é carregado
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name, device="cpu")
+    if backend == "int8":
+        model = SentenceTransformer(model_name, device="cpu")
+        # Quantização dinâmica: pesos das camadas lineares em int8, ativações quantizadas em tempo de execução
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(model_name, device="cpu", backend="onnx")
+        except ImportError as e:
+            raise ImportError(
+                "O backend 'onnx' requer optimum e onnxruntime: pip install 'optimum[onnxruntime]'"
+            ) from e
+    raise ValueError(f"Backend de embeddings não suportado: {backend}. Use um de {EMBEDDING_BACKENDS}.")
+
+
+def _init_worker(model_name: str, backend: str, threads: int) -> None:
+    global _worker_model
+    import torch
+
+    # Cada processo usa um número fixo de threads para não disputar núcleos com os demais
+    torch.set_num_threads(threads)
+    _worker_model = load_sentence_transformer(model_name, backend)
+
+
+def _encode(model: Any, texts: List[str]) -> np.ndarray:
+    return np.asarray(
+        model.encode(texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True),
+        dtype=np.float32,
+    )
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    return _encode(_worker_model, texts)
+
+
+class EmbeddingEngine:
+    """
+    Geração em lote dos embeddings de passagens na ingestão (CPU).
+
+    Os textos são ordenados por tamanho antes de formar os lotes, de modo que cada lote
+    contenha textos de comprimento parecido e o padding seja mínimo; os vetores voltam na
+    ordem original. Os lotes podem ser distribuídos entre vários processos, cada um com um
+    número fixo de threads do torch, e o modelo pode rodar quantizado em int8 ou no ONNX Runtime.
+
+    Com um único processo e o mesmo backend das consultas, os lotes são calculados pelo
+    modelo do EMBEDDING_MODEL, sem carregar uma segunda cópia. Um backend diferente do das
+    consultas gera passagens em outro espaço de embeddings (apenas para benchmarks).
+    """
+
+    def __init__(
+        self,
+        embeddings: PrefixedCachedEmbeddings = EMBEDDING_MODEL,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        backend: str = EMBEDDING_BACKEND,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        workers: int = EMBEDDING_WORKERS,
+        threads_per_worker: Optional[int] = EMBEDDING_THREADS_PER_WORKER,
+    ):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Backend de embeddings não suportado: {backend}. Use um de {EMBEDDING_BACKENDS}.")
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._local_model: Any = None
+        self._lock = threading.Lock()
+
+        if backend != self.query_backend:
+            logger.warning(
+                f"Backend de embeddings das passagens ({backend}) diferente do das consultas "
+                f"({self.query_backend}): os vetores não são comparáveis com os das consultas."
+            )
+
+    @property
+    def query_backend(self) -> Optional[str]:
+        return getattr(self.embeddings.embeddings, "backend", None)
+
+    def _get_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                logger.info(
+                    f"Iniciando {self.workers} processo(s) de embedding ({self.backend}, "
+                    f"{self.threads_per_worker} thread(s) cada)."
+                )
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    **process_pool_logging(_init_worker, (self.model_name, self.backend, self.threads_per_worker)),
+                )
+            return self._pool
+
+    def _encode_local(self, texts: List[str]) -> np.ndarray:
+        if self.backend == self.query_backend:
+            # Direto no SentenceTransformer: o embed_documents do langchain refaria os lotes (32 textos)
+            return _encode(self.embeddings.embeddings.client, texts)
+        with self._lock:
+            if self._local_model is None:
+                import torch
+
+                torch.set_num_threads(self.threads_per_worker)
+                self._local_model = load_sentence_transformer(self.model_name, self.backend)
+        return _encode(self._local_model, texts)
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """
+        Gera os embeddings das passagens (com o prefixo do modelo).
+
+        Returns:
+            Matriz (len(texts), dim) float32, na ordem dos textos recebidos
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        passages = self.embeddings.prepare_passages(texts)
+        order = sorted(range(len(passages)), key=lambda i: len(passages[i]))
+        batches = [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+
+        if self.workers > 1:
+            pool = self._get_pool()
+            results = list(pool.map(_encode_in_worker, [[passages[i] for i in batch] for batch in batches]))
+        else:
+            results = [self._encode_local([passages[i] for i in batch]) for batch in batches]
+
+        vectors = np.empty((len(passages), results[0].shape[1]), dtype=np.float32)
+        for batch, batch_vectors in zip(batches, results):
+            vectors[batch] = batch_vectors
+        return vectors
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+
+EMBEDDING_ENGINE = EmbeddingEngine()
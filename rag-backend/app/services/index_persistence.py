@@ -0,0 +1,583 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas o lock entre threads do processo
+    fcntl = None
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.core.config.ingest import (
+    INDEX_COMPACTION_MAX_SEGMENTS,
+    INDEX_COMPACTION_MAX_SEGMENT_RATIO,
+    INDEX_USE_MMAP,
+    VECTOR_INDEX_TYPE,
+)
+from app.core.utils.logger import get_logger
+from app.services.docstore import DOCSTORE_FILE, SQLiteDocstoreWriter, open_sqlite_docstore, write_sqlite_docstore
+from app.services.lexical_index import (
+    LEXICAL_DIR,
+    LexicalIndex,
+    LexicalPart,
+    LexicalPartBuilder,
+    build_lexical_part,
+)
+from app.services.metadata_index import (
+    METADATA_DIR,
+    MetadataIndex,
+    MetadataPart,
+    MetadataPartBuilder,
+    build_metadata_part,
+)
+from app.services.vector_index import (
+    SegmentedVectorstore,
+    StreamingIndexBuilder,
+    append_vectorstore,
+    is_index_mapped,
+    remove_documents,
+)
+
+logger = get_logger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+# Serializa as trocas de manifest entre os processos (workers) que compartilham o diretório
+LOCK_FILE = ".manifest.lock"
+INDEX_FILE = "index.faiss"
+SEGMENTS_DIR = "segments"
+# Índices salvos antes do formato segmentado ficam direto na raiz do VECTORSTORE_PATH
+LEGACY_BASE = "."
+
+
+class BaseWriter:
+    """
+    Grava uma nova base em streaming: os vetores vão para um StreamingIndexBuilder e os
+    chunks direto para o docstore SQLite e para os índices lexical e de metadados em um diretório
+    temporário, lote a lote.
+    A base só passa a valer quando IndexPersistence.commit_base troca o manifest.
+    """
+
+    def __init__(self, path: str, index_type: Optional[str] = None, params: Optional[Dict[str, Any]] = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.base_dir = f"base-{uuid.uuid4().hex[:12]}"
+        self.tmp_dir = os.path.join(path, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(self.tmp_dir)
+        self._docs = SQLiteDocstoreWriter(os.path.join(self.tmp_dir, DOCSTORE_FILE))
+        self._index = StreamingIndexBuilder(index_type or VECTOR_INDEX_TYPE, params)
+        self._lexical = LexicalPartBuilder()
+        self._metadata = MetadataPartBuilder()
+        self.index_info: Optional[Dict[str, Any]] = None
+
+    @property
+    def count(self) -> int:
+        return self._docs.count
+
+    def add(self, documents: List[Document], vectors: np.ndarray) -> None:
+        """
+        Acrescenta um lote de documentos (com id definido) e seus vetores.
+        """
+        self._index.add(vectors)
+        self._docs.append((doc.id, doc) for doc in documents)
+        self._lexical.add(doc.page_content for doc in documents)
+        self._metadata.add(documents)
+
+    def finish(self) -> None:
+        """
+        Grava o índice e move a base para o diretório definitivo (ainda fora do manifest).
+        """
+        index, self.index_info = self._index.finish()
+        faiss.write_index(index, os.path.join(self.tmp_dir, INDEX_FILE))
+        self._docs.close()
+        self._lexical.finish().save(os.path.join(self.tmp_dir, LEXICAL_DIR))
+        self._metadata.finish().save(os.path.join(self.tmp_dir, METADATA_DIR))
+        os.rename(self.tmp_dir, os.path.join(self.path, self.base_dir))
+
+    def abort(self) -> None:
+        self._docs.abort()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+class IndexPersistence:
+    """
+    Persistência incremental do índice FAISS em formato "snapshot + segmentos".
+
+    Layout em disco (VECTORSTORE_PATH):
+        manifest.json            -> fonte da verdade: snapshot base atual, tipo do índice, segmentos
+                                    ativos, ids de documentos removidos (deleted_ids) e a geração,
+                                    incrementada a cada troca
+        base-<id>/               -> snapshot completo: index.faiss + docstore.sqlite + lexical/ (BM25)
+                                    + metadata/ (posições por source_doc, tipo de arquivo e data de ingestão)
+        segments/seg-<id>/       -> vetores (índice flat), documentos (save_local) e índices lexical
+                                    e de metadados de um único upload
+
+    A base é aberta com mmap (IO_FLAG_MMAP_IFC), de modo que vários workers compartilham as
+    mesmas páginas pelo page cache, e os chunks ficam em SQLite, lidos apenas para os
+    resultados de cada busca. Os segmentos são abertos como partes separadas de um
+    SegmentedVectorstore: a base nunca recebe vetores depois de gravada, então continua
+    mapeada mesmo com segmentos pendentes.
+
+    Vários processos podem escrever no mesmo diretório: as trocas de manifest são serializadas
+    por um lock de arquivo, e cada processo acompanha a geração do manifest para carregar os
+    segmentos e bases gravados pelos outros (ver VectorstoreService.refresh).
+
+    Cada upload grava apenas o seu próprio segmento, então o custo de persistência é
+    proporcional ao tamanho do arquivo e não ao tamanho do corpus. Quando há segmentos
+    demais, uma compactação em background funde base + segmentos em um novo snapshot.
+
+    Toda escrita acontece em um diretório temporário renomeado ao final, e o manifest é
+    trocado atomicamente com os.replace: uma queda no meio da escrita deixa no máximo um
+    diretório órfão, nunca um índice inconsistente.
+
+    Documentos removidos (arquivos apagados ou substituídos) são apenas marcados em
+    deleted_ids e excluídos das buscas; a compactação os remove fisicamente do índice.
+    """
+
+    _write_lock = threading.Lock()
+    _compaction_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _manifest_path(path: str) -> str:
+        return os.path.join(path, MANIFEST_FILE)
+
+    @staticmethod
+    def read_manifest(path: str) -> Dict[str, Any]:
+        """
+        Lê o manifest do índice. Índices no formato antigo (sem manifest) são tratados
+        como um snapshot base na raiz do diretório, sem segmentos.
+        """
+        manifest_path = IndexPersistence._manifest_path(path)
+        if not os.path.exists(manifest_path):
+            return {"base": LEGACY_BASE, "base_vectors": None, "segments": [], "deleted_ids": [], "generation": 0}
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest.setdefault("deleted_ids", [])
+        manifest.setdefault("generation", 0)
+        return manifest
+
+    @staticmethod
+    def manifest_stamp(path: str) -> Optional[Tuple[int, int]]:
+        """
+        Identifica o arquivo de manifest atual (inode, mtime) sem lê-lo; muda a cada troca.
+        """
+        try:
+            stat = os.stat(IndexPersistence._manifest_path(path))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    @staticmethod
+    @contextmanager
+    def _locked(path: str) -> Iterator[None]:
+        """
+        Adquire o lock de escrita do índice: entre as threads do processo e, por um lock de
+        arquivo, entre os processos que compartilham o diretório.
+        """
+        with IndexPersistence._write_lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(path, exist_ok=True)
+            with open(os.path.join(path, LOCK_FILE), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _write_manifest(path: str, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Troca o manifest atomicamente, com a geração seguinte à de `manifest` (lido sob o
+        mesmo lock). Deve ser chamado com _locked adquirido.
+
+        Returns:
+            O manifest gravado
+        """
+        manifest = {**manifest, "generation": manifest.get("generation", 0) + 1}
+        tmp_path = os.path.join(path, f".{MANIFEST_FILE}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, IndexPersistence._manifest_path(path))
+        IndexPersistence._fsync_dir(path)
+        return manifest
+
+    @staticmethod
+    def _fsync_dir(path: str) -> None:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _save_atomically(db: FAISS, path: str, relative_dir: str, lexical_part: Optional[LexicalPart] = None,
+                         metadata_part: Optional[MetadataPart] = None) -> None:
+        """
+        Salva um FAISS (e seus índices lexical e de metadados) em path/relative_dir passando
+        por um diretório temporário.
+        """
+        final_dir = os.path.join(path, relative_dir)
+        tmp_dir = os.path.join(os.path.dirname(final_dir), f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+        db.save_local(tmp_dir)
+        if lexical_part is None:
+            lexical_part = build_lexical_part(db, 0, db.index.ntotal)
+        lexical_part.save(os.path.join(tmp_dir, LEXICAL_DIR))
+        if metadata_part is None:
+            metadata_part = build_metadata_part(db, 0, db.index.ntotal)
+        metadata_part.save(os.path.join(tmp_dir, METADATA_DIR))
+        os.rename(tmp_dir, final_dir)
+
+    @staticmethod
+    def _save_base_atomically(db: FAISS, path: str, base_dir: str) -> None:
+        """
+        Grava uma base (índice FAISS + docstore SQLite) passando por um diretório temporário.
+        """
+        tmp_dir = os.path.join(path, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        faiss.write_index(db.index, os.path.join(tmp_dir, INDEX_FILE))
+        write_sqlite_docstore(os.path.join(tmp_dir, DOCSTORE_FILE), db.docstore, db.index_to_docstore_id)
+        build_lexical_part(db, 0, db.index.ntotal).save(os.path.join(tmp_dir, LEXICAL_DIR))
+        build_metadata_part(db, 0, db.index.ntotal).save(os.path.join(tmp_dir, METADATA_DIR))
+        os.rename(tmp_dir, os.path.join(path, base_dir))
+
+    @staticmethod
+    def _load_base(directory: str, embeddings: Embeddings, mmap: bool) -> FAISS:
+        """
+        Abre uma base. Bases no formato antigo (index.pkl) são carregadas com FAISS.load_local.
+        """
+        if not os.path.exists(os.path.join(directory, DOCSTORE_FILE)):
+            return FAISS.load_local(directory, embeddings, allow_dangerous_deserialization=True)
+
+        # IO_FLAG_MMAP_IFC mapeia os códigos de todos os tipos de índice (flat/SQ, HNSW e as listas
+        # dos IVF); IO_FLAG_MMAP só mapearia as listas dos IVF, lendo os demais inteiros para a RAM
+        io_flags = faiss.IO_FLAG_MMAP_IFC if mmap else 0
+        index = faiss.read_index(os.path.join(directory, INDEX_FILE), io_flags)
+        docstore, index_to_docstore_id = open_sqlite_docstore(directory)
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+        )
+
+    @staticmethod
+    def load(path: str, embeddings: Embeddings) -> SegmentedVectorstore:
+        """
+        Abre o snapshot base e, como partes seguintes, todos os segmentos do manifest, em ordem.
+        """
+        db, _ = IndexPersistence.load_with_manifest(path, embeddings)
+        return db
+
+    @staticmethod
+    def load_with_manifest(path: str, embeddings: Embeddings) -> Tuple[SegmentedVectorstore, Dict[str, Any]]:
+        """
+        Como load, mas retorna também o manifest lido, para que o chamador use os
+        deleted_ids exatamente da mesma versão do índice carregada.
+        """
+        manifest = IndexPersistence.read_manifest(path)
+        # A base nunca recebe vetores (os segmentos são partes separadas), então pode ficar mapeada
+        db = IndexPersistence._load_base(os.path.join(path, manifest["base"]), embeddings, mmap=INDEX_USE_MMAP)
+        parts = [db]
+        for segment in manifest["segments"]:
+            parts.append(IndexPersistence.load_segment(path, segment, embeddings))
+        starts = np.cumsum([0] + [part.index.ntotal for part in parts[:-1]])
+        db = SegmentedVectorstore(list(zip(starts.tolist(), parts)))
+
+        logger.info(
+            f"Índice carregado de {path}: base '{manifest['base']}' ({manifest.get('index', {}).get('index_type', 'flat')}, "
+            f"{'mapeada' if is_index_mapped(db.base.index) else 'em memória'}) "
+            f"+ {len(manifest['segments'])} segmento(s), {db.ntotal} vetores, "
+            f"{len(manifest['deleted_ids'])} removido(s) aguardando compactação."
+        )
+        return db, manifest
+
+    @staticmethod
+    def load_segment(path: str, segment: Dict[str, Any], embeddings: Embeddings) -> FAISS:
+        return FAISS.load_local(os.path.join(path, segment["dir"]), embeddings, allow_dangerous_deserialization=True)
+
+    @staticmethod
+    def _load_or_build_part(directory: str, kind: str, load_fn: Callable[[str], Any],
+                            build_fn: Callable[[], Any]) -> Any:
+        """
+        Abre o índice auxiliar `kind` (lexical/ ou metadata/) de uma base ou segmento. Se ele
+        não existir (gravado por uma versão anterior), é construído e gravado uma única vez.
+        """
+        part_dir = os.path.join(directory, kind)
+        if os.path.exists(part_dir):
+            return load_fn(part_dir)
+
+        logger.info(f"Construindo o índice '{kind}' de '{directory}'.")
+        part = build_fn()
+        tmp_dir = os.path.join(directory, f".tmp-{uuid.uuid4().hex}")
+        part.save(tmp_dir)
+        try:
+            os.rename(tmp_dir, part_dir)
+        except OSError:
+            # Outro processo gravou o mesmo índice no meio tempo
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return part
+
+    @staticmethod
+    def load_part_indexes(path: str, manifest: Dict[str, Any],
+                          db: SegmentedVectorstore) -> Tuple[LexicalIndex, MetadataIndex]:
+        """
+        Abre os índices lexical (BM25) e de metadados da base e dos segmentos de um manifest,
+        alinhados às partes de db (carregado do mesmo manifest por load_with_manifest).
+        """
+        relative_dirs = [manifest["base"]] + [segment["dir"] for segment in manifest["segments"]]
+
+        lexical_parts = []
+        metadata_parts = []
+        for relative_dir, (start, part) in zip(relative_dirs, db.parts):
+            lexical_part, metadata_part = IndexPersistence.load_part_index(os.path.join(path, relative_dir), part)
+            lexical_parts.append((start, lexical_part))
+            metadata_parts.append((start, metadata_part))
+        return LexicalIndex(lexical_parts), MetadataIndex(metadata_parts)
+
+    @staticmethod
+    def load_part_index(directory: str, db: FAISS) -> Tuple[LexicalPart, MetadataPart]:
+        """
+        Abre os índices lexical e de metadados de uma base ou segmento (db, já aberto).
+        """
+        lexical_part = IndexPersistence._load_or_build_part(
+            directory, LEXICAL_DIR,
+            lambda part_dir: LexicalPart.load(part_dir, mmap=INDEX_USE_MMAP),
+            lambda: build_lexical_part(db, 0, db.index.ntotal),
+        )
+        metadata_part = IndexPersistence._load_or_build_part(
+            directory, METADATA_DIR,
+            lambda part_dir: MetadataPart.load(part_dir, mmap=INDEX_USE_MMAP),
+            lambda: build_metadata_part(db, 0, db.index.ntotal),
+        )
+        return lexical_part, metadata_part
+
+    @staticmethod
+    def save_snapshot(db: FAISS, path: str, index_info: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Grava um snapshot completo como nova base e descarta os segmentos anteriores.
+        Usado na ingestão completa do diretório de dados.
+
+        Args:
+            db: Vectorstore completo
+            path: Diretório do índice
+            index_info: Tipo e parâmetros do índice FAISS, registrados no manifest
+        """
+        os.makedirs(path, exist_ok=True)
+        base_dir = f"base-{uuid.uuid4().hex[:12]}"
+        IndexPersistence._save_base_atomically(db, path, base_dir)
+        with IndexPersistence._locked(path):
+            IndexPersistence._swap_base(path, base_dir, db.index.ntotal, index_info)
+
+    @staticmethod
+    def create_base(db: FAISS, path: str) -> bool:
+        """
+        Grava db como a primeira base de um diretório ainda sem índice (ex: primeiro upload
+        depois de uma inicialização sem dados). Se outro processo criou o índice no meio tempo,
+        nada é alterado.
+
+        Returns:
+            True se a base foi criada; False se o diretório já tinha um índice
+        """
+        os.makedirs(path, exist_ok=True)
+        base_dir = f"base-{uuid.uuid4().hex[:12]}"
+        IndexPersistence._save_base_atomically(db, path, base_dir)
+        with IndexPersistence._locked(path):
+            if any(os.path.exists(os.path.join(path, name)) for name in (MANIFEST_FILE, INDEX_FILE)):
+                shutil.rmtree(os.path.join(path, base_dir), ignore_errors=True)
+                return False
+            IndexPersistence._swap_base(path, base_dir, db.index.ntotal, None)
+        logger.info(f"Base '{base_dir}' criada com {db.index.ntotal} vetores.")
+        return True
+
+    @staticmethod
+    def commit_base(writer: BaseWriter) -> None:
+        """
+        Finaliza uma base construída em streaming e a torna a base atual, descartando os
+        segmentos anteriores (equivalente a save_snapshot).
+        """
+        writer.finish()
+        with IndexPersistence._locked(writer.path):
+            IndexPersistence._swap_base(writer.path, writer.base_dir, writer.count, writer.index_info)
+
+    @staticmethod
+    def _swap_base(path: str, base_dir: str, base_vectors: int, index_info: Optional[Dict[str, Any]]) -> None:
+        # Deve ser chamado com _locked adquirido
+        old_manifest = IndexPersistence.read_manifest(path)
+        IndexPersistence._write_manifest(path, {
+            "base": base_dir,
+            "base_vectors": base_vectors,
+            "index": index_info or {"index_type": "flat"},
+            "segments": [],
+            "deleted_ids": [],
+            "generation": old_manifest["generation"],
+        })
+        IndexPersistence._remove_replaced(path, old_manifest, old_manifest["segments"])
+
+    @staticmethod
+    def append_segment(
+            segment_db: Optional[FAISS],
+            path: str,
+            on_compacted: Optional[Callable[[], None]] = None,
+            deleted_ids: Optional[List[str]] = None,
+            embeddings: Optional[Embeddings] = None,
+            lexical_part: Optional[LexicalPart] = None,
+            metadata_part: Optional[MetadataPart] = None,
+    ) -> Tuple[int, Dict[str, Any]]:
+        """
+        Persiste apenas os vetores/documentos novos de um upload como um segmento e,
+        na mesma troca de manifest, os ids dos documentos removidos.
+
+        Args:
+            segment_db: FAISS contendo somente os chunks do arquivo adicionado (None se só houver remoções)
+            path: Diretório do índice
+            on_compacted: Chamado se uma compactação disparada por este segmento for concluída
+            deleted_ids: Ids de documentos a excluir das buscas até a próxima compactação
+            embeddings: Modelo usado pela compactação (padrão: o do segmento)
+            lexical_part: Índice lexical dos chunks do segmento (construído a partir dele se None)
+            metadata_part: Índice de metadados dos chunks do segmento (construído a partir dele se None)
+
+        Returns:
+            Tupla (geração do manifest estendido, manifest gravado): se a geração estendida não
+            for a do snapshot do chamador, outro processo gravou no meio tempo
+        """
+        segment_dir = None
+        with IndexPersistence._locked(path):
+            manifest = IndexPersistence.read_manifest(path)
+            previous_generation = manifest["generation"]
+            if segment_db is not None and segment_db.index.ntotal > 0:
+                segment_dir = os.path.join(SEGMENTS_DIR, f"seg-{uuid.uuid4().hex[:12]}")
+                IndexPersistence._save_atomically(segment_db, path, segment_dir, lexical_part, metadata_part)
+                manifest["segments"].append({"dir": segment_dir, "vectors": segment_db.index.ntotal})
+            if deleted_ids:
+                manifest["deleted_ids"] = sorted(set(manifest["deleted_ids"]).union(deleted_ids))
+            written = IndexPersistence._write_manifest(path, manifest)
+
+        if segment_dir is not None:
+            logger.info(f"Segmento '{segment_dir}' gravado com {segment_db.index.ntotal} vetores.")
+        if deleted_ids:
+            logger.info(f"{len(deleted_ids)} documento(s) marcados como removidos no índice.")
+        IndexPersistence.maybe_compact(path, embeddings or segment_db.embeddings, on_compacted)
+        return previous_generation, written
+
+    @staticmethod
+    def needs_compaction(manifest: Dict[str, Any]) -> bool:
+        segments = manifest["segments"]
+        if len(segments) >= INDEX_COMPACTION_MAX_SEGMENTS:
+            return True
+        base_vectors = manifest.get("base_vectors")
+        if not base_vectors:
+            return False
+        # Documentos removidos ocupam espaço e custam tempo de busca como os segmentos
+        pending = sum(segment["vectors"] for segment in segments) + len(manifest["deleted_ids"])
+        return pending / base_vectors >= INDEX_COMPACTION_MAX_SEGMENT_RATIO
+
+    @classmethod
+    def maybe_compact(cls, path: str, embeddings: Embeddings, on_compacted: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Dispara a compactação em background se houver segmentos demais e nenhuma
+        compactação em andamento.
+
+        Returns:
+            True se uma compactação foi iniciada
+        """
+        if cls._compaction_thread is not None and cls._compaction_thread.is_alive():
+            return False
+        if not cls.needs_compaction(cls.read_manifest(path)):
+            return False
+
+        cls._compaction_thread = threading.Thread(
+            target=cls.compact, args=(path, embeddings, on_compacted), name="faiss-compaction", daemon=True
+        )
+        cls._compaction_thread.start()
+        return True
+
+    @staticmethod
+    def compact(path: str, embeddings: Embeddings, on_compacted: Optional[Callable[[], None]] = None) -> None:
+        """
+        Funde a base e os segmentos atuais em um novo snapshot, descartando os documentos
+        marcados como removidos.
+
+        A fusão é feita a partir do disco, sem bloquear novos uploads; segmentos gravados
+        durante a compactação continuam no manifest após a troca. Ao final, on_compacted
+        permite recarregar o índice a partir da nova base (mapeada em memória).
+        """
+        try:
+            manifest = IndexPersistence.read_manifest(path)
+            compacted: List[Dict[str, Any]] = list(manifest["segments"])
+            if not compacted and not manifest["deleted_ids"]:
+                return
+
+            logger.info(
+                f"Iniciando compactação do índice: {len(compacted)} segmento(s), "
+                f"{len(manifest['deleted_ids'])} documento(s) removido(s)."
+            )
+            db = IndexPersistence._load_base(os.path.join(path, manifest["base"]), embeddings, mmap=False)
+            for segment in compacted:
+                append_vectorstore(db, IndexPersistence.load_segment(path, segment, embeddings))
+            resolved = set(manifest["deleted_ids"])
+            removed = remove_documents(db, resolved)
+
+            base_dir = f"base-{uuid.uuid4().hex[:12]}"
+            IndexPersistence._save_base_atomically(db, path, base_dir)
+
+            with IndexPersistence._locked(path):
+                current = IndexPersistence.read_manifest(path)
+                if current["base"] != manifest["base"]:
+                    # Um snapshot completo foi gravado no meio tempo; esta compactação ficou obsoleta
+                    shutil.rmtree(os.path.join(path, base_dir), ignore_errors=True)
+                    return
+                compacted_dirs = {segment["dir"] for segment in compacted}
+                IndexPersistence._write_manifest(path, {
+                    **current,
+                    "base": base_dir,
+                    "base_vectors": db.index.ntotal,
+                    "segments": [s for s in current["segments"] if s["dir"] not in compacted_dirs],
+                    # Remoções feitas durante a compactação continuam valendo sobre a nova base
+                    "deleted_ids": [doc_id for doc_id in current["deleted_ids"] if doc_id not in resolved],
+                })
+                IndexPersistence._remove_replaced(path, manifest, compacted)
+
+            logger.info(
+                f"Compactação concluída: nova base '{base_dir}' com {db.index.ntotal} vetores "
+                f"({len(removed)} documento(s) removido(s))."
+            )
+            if on_compacted is not None:
+                on_compacted()
+        except Exception as e:
+            logger.error(f"Erro durante a compactação do índice: {e}", exc_info=True)
+
+    @staticmethod
+    def _remove_replaced(path: str, old_manifest: Dict[str, Any], segments: List[Dict[str, Any]]) -> None:
+        """
+        Remove do disco a base e os segmentos que deixaram de ser referenciados pelo manifest.
+        """
+        if old_manifest["base"] == LEGACY_BASE:
+            for name in ("index.faiss", "index.pkl"):
+                legacy_file = os.path.join(path, name)
+                if os.path.exists(legacy_file):
+                    os.remove(legacy_file)
+            shutil.rmtree(os.path.join(path, LEXICAL_DIR), ignore_errors=True)
+            shutil.rmtree(os.path.join(path, METADATA_DIR), ignore_errors=True)
+        else:
+            shutil.rmtree(os.path.join(path, old_manifest["base"]), ignore_errors=True)
+
+        for segment in segments:
+            shutil.rmtree(os.path.join(path, segment["dir"]), ignore_errors=True)
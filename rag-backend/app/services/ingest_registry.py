@@ -0,0 +1,229 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config.embeddings import VECTORSTORE_PATH
+from app.core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+REGISTRY_FILE = "registry.sqlite"
+# Limite de parâmetros por consulta "IN (...)" (o SQLite antigo aceita no máximo 999)
+_SQL_BATCH = 500
+
+ORIGIN_DIRECTORY = "directory"
+ORIGIN_UPLOAD = "upload"
+
+
+def chunk_hash(text: str) -> str:
+    """
+    Hash do conteúdo de um chunk, usado para detectar chunks repetidos em um arquivo ou que
+    continuam iguais entre versões dele.
+    """
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def fingerprint_file(file_path: str, known: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Calcula o hash do conteúdo de um arquivo.
+
+    Se o registro conhecido tiver o mesmo tamanho e mtime, o hash registrado é reaproveitado
+    sem ler o arquivo, o que torna a sincronização de um diretório sem alterações quase instantânea.
+
+    Args:
+        file_path: Caminho do arquivo
+        known: Registro atual do arquivo (ver IngestRegistry.get_files), se houver
+
+    Returns:
+        Dicionário com sha256, size e mtime_ns
+    """
+    stat = os.stat(file_path)
+    if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return {"sha256": known["sha256"], "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return {"sha256": digest.hexdigest(), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _batches(values: List[str]) -> Iterable[List[str]]:
+    for start in range(0, len(values), _SQL_BATCH):
+        yield values[start:start + _SQL_BATCH]
+
+
+class IngestRegistry:
+    """
+    Registro dos arquivos e chunks indexados, gravado em SQLite ao lado do índice.
+
+    Tabelas:
+        files        -> hash do conteúdo de cada arquivo (source_doc) e sua origem (diretório ou upload)
+        file_chunks  -> hash de cada chunk de cada arquivo e o id do documento no índice FAISS
+
+    Um mesmo conteúdo presente em dois arquivos tem um documento (e um vetor) para cada um,
+    com o próprio source_doc: as fontes citadas e os filtros por documento continuam corretos,
+    e remover ou alterar um arquivo nunca afeta os chunks de outro.
+    """
+
+    def __init__(self, path: str = VECTORSTORE_PATH):
+        self.file_path = os.path.join(path, REGISTRY_FILE)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            conn = sqlite3.connect(self.file_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    source_doc TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    origin TEXT NOT NULL,
+                    chunks INTEGER NOT NULL,
+                    ingested_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS file_chunks (
+                    source_doc TEXT NOT NULL,
+                    chunk_hash TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    PRIMARY KEY (source_doc, chunk_hash)
+                );
+            """)
+            self._conn = conn
+        return self._conn
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._connection().execute("SELECT 1 FROM files LIMIT 1").fetchone() is None
+
+    def get_files(self, origin: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Retorna os arquivos registrados (opcionalmente apenas os de uma origem), por source_doc.
+        """
+        query = "SELECT source_doc, sha256, size, mtime_ns, origin, chunks FROM files"
+        params: tuple = ()
+        if origin is not None:
+            query += " WHERE origin = ?"
+            params = (origin,)
+        with self._lock:
+            rows = self._connection().execute(query, params).fetchall()
+        return {
+            row[0]: {"sha256": row[1], "size": row[2], "mtime_ns": row[3], "origin": row[4], "chunks": row[5]}
+            for row in rows
+        }
+
+    def get_file(self, source_doc: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT sha256, size, mtime_ns, origin, chunks FROM files WHERE source_doc = ?", (source_doc,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"sha256": row[0], "size": row[1], "mtime_ns": row[2], "origin": row[3], "chunks": row[4]}
+
+    def find_chunks(self, source_docs: Iterable[str]) -> Dict[Tuple[str, str], str]:
+        """
+        Retorna os chunks já indexados dos arquivos informados.
+
+        Returns:
+            (source_doc, hash do chunk) -> id do documento no índice
+        """
+        found: Dict[Tuple[str, str], str] = {}
+        with self._lock:
+            conn = self._connection()
+            for batch in _batches(list(set(source_docs))):
+                placeholders = ",".join("?" * len(batch))
+                for source_doc, content_hash, doc_id in conn.execute(
+                    f"SELECT source_doc, chunk_hash, doc_id FROM file_chunks WHERE source_doc IN ({placeholders})", batch
+                ):
+                    found[(source_doc, content_hash)] = doc_id
+        return found
+
+    def orphaned_doc_ids(self, links: Dict[str, List[str]]) -> List[str]:
+        """
+        Calcula quais documentos do índice deixam de existir se os arquivos de `links`
+        passarem a conter exatamente os chunks informados.
+
+        Args:
+            links: source_doc -> hashes dos chunks do arquivo (lista vazia para arquivos removidos)
+
+        Returns:
+            Ids dos documentos a serem removidos do índice
+        """
+        doc_ids = []
+        with self._lock:
+            conn = self._connection()
+            for source_doc, hashes in links.items():
+                kept = set(hashes)
+                doc_ids.extend(
+                    doc_id for content_hash, doc_id in conn.execute(
+                        "SELECT chunk_hash, doc_id FROM file_chunks WHERE source_doc = ?", (source_doc,)
+                    )
+                    if content_hash not in kept
+                )
+        return doc_ids
+
+    def commit(
+            self,
+            files: Dict[str, Dict[str, Any]],
+            links: Dict[str, List[str]],
+            new_chunks: Dict[Tuple[str, str], str],
+            origin: str,
+            reset: bool = False,
+    ) -> None:
+        """
+        Registra o resultado de uma ingestão já publicada no índice, em uma única transação.
+
+        Args:
+            files: source_doc -> fingerprint (ver fingerprint_file) dos arquivos indexados
+            links: source_doc -> hashes dos chunks; arquivos com lista vazia e ausentes de
+                   `files` são removidos do registro
+            new_chunks: (source_doc, hash) -> id do documento dos chunks adicionados ao índice
+            origin: ORIGIN_DIRECTORY ou ORIGIN_UPLOAD
+            reset: Se True, descarta todo o registro anterior (ingestão completa)
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                if reset:
+                    conn.execute("DELETE FROM files")
+                    conn.execute("DELETE FROM file_chunks")
+
+                # Os chunks que continuam no arquivo mantêm o documento já indexado
+                stale = []
+                for source_doc, hashes in links.items():
+                    kept = set(hashes)
+                    stale.extend(
+                        (source_doc, row[0]) for row in conn.execute(
+                            "SELECT chunk_hash FROM file_chunks WHERE source_doc = ?", (source_doc,)
+                        )
+                        if row[0] not in kept
+                    )
+                conn.executemany("DELETE FROM file_chunks WHERE source_doc = ? AND chunk_hash = ?", stale)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO file_chunks (source_doc, chunk_hash, doc_id) VALUES (?, ?, ?)",
+                    [(source_doc, content_hash, doc_id) for (source_doc, content_hash), doc_id in new_chunks.items()],
+                )
+                conn.executemany(
+                    "DELETE FROM files WHERE source_doc = ?", [(s,) for s in links if s not in files]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO files (source_doc, sha256, size, mtime_ns, origin, chunks, ingested_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (source_doc, fp["sha256"], fp["size"], fp["mtime_ns"], origin,
+                         len(set(links.get(source_doc, []))), now)
+                        for source_doc, fp in files.items()
+                    ],
+                )
+
+
+INGEST_REGISTRY = IngestRegistry()
@@ -1,10 +1,11 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
 from langchain.schema import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+import numpy as np
 import os
-import shutil
-from pathlib import Path
+import threading
+import time
+import uuid
 
 from app.core.config.embeddings import (
     EMBEDDING_MODEL,
@@ -12,8 +13,21 @@ from app.core.config.embeddings import (
     CHUNK_OVERLAP,
     VECTORSTORE_PATH,
 )
+from app.core.config.ingest import INGEST_BATCH_MAX_CHUNKS
 from app.core.utils.logger import get_logger
-from app.services.document_loaders import load_all_documents, load_document
+from app.core.utils.metrics import INGEST_BATCH_SECONDS, INGEST_CHUNKS_TOTAL, batch_file_type
+from app.services.embedding_engine import EMBEDDING_ENGINE
+from app.services.document_loaders import iter_split_documents, list_data_files
+from app.services.ingest_registry import (
+    INGEST_REGISTRY,
+    ORIGIN_DIRECTORY,
+    ORIGIN_UPLOAD,
+    chunk_hash,
+    fingerprint_file,
+)
+from app.services.index_persistence import BaseWriter
+from app.services.lexical_index import LexicalPart
+from app.services.metadata_index import MetadataPart, file_type_of
 from app.services.vectorstore_service import VectorstoreService
 
 logger = get_logger(__name__)
@@ -22,16 +36,36 @@ logger = get_logger(__name__)
 class IngestService:
     """
     Serviço para ingestão de documentos no sistema RAG
+
+    Cada arquivo indexado e cada chunk são registrados por hash de conteúdo no
+    INGEST_REGISTRY (ao lado do índice): arquivos sem alteração não são reprocessados,
+    os chunks que continuam iguais em um arquivo alterado mantêm o vetor já indexado e os
+    vetores de arquivos removidos ou substituídos são retirados do índice pelos ids dos
+    documentos. A deduplicação é por arquivo: um conteúdo repetido em outro arquivo é
+    indexado também com o source_doc dele (o embedding de textos iguais em um mesmo lote
+    é calculado uma única vez).
+
+    A ingestão do diretório é feita em streaming: os arquivos são carregados e divididos
+    em paralelo (com um limite de arquivos em andamento) e os chunks são embeddados e
+    indexados em lotes de até INGEST_BATCH_MAX_CHUNKS, sem materializar o corpus inteiro.
     """
+    # Serializa o par "alteração do índice + registro" entre uploads e sincronizações
+    _lock = threading.Lock()
 
     @staticmethod
-    def ingest_documents(data_dir: str = "data/", clear_existing: bool = False) -> Dict[str, Any]:
+    def ingest_documents(
+            data_dir: str = "data/",
+            clear_existing: bool = False,
+            progress: Optional[Callable[[Dict[str, int]], None]] = None
+    ) -> Dict[str, Any]:
         """
-        Realiza a ingestão de documentos para o vectorstore
+        Realiza a ingestão de documentos para o vectorstore.
+        Se o índice já existir, sincroniza apenas os arquivos novos, alterados ou removidos.
 
         Args:
             data_dir: Diretório onde estão os documentos
-            clear_existing: Se True, limpa o vectorstore existente
+            clear_existing: Se True, reconstrói o vectorstore do zero
+            progress: Chamada a cada lote da reconstrução com files_total, files_done e chunks_indexed
 
         Returns:
             Dicionário com status e mensagem do resultado da operação
@@ -48,23 +82,18 @@ class IngestService:
 
             if VectorstoreService.check_vectorstore_exists():
                 if not clear_existing:
-                    logger.info(f"Vectorstore já existe em: {VECTORSTORE_PATH}. Pulando ingestão.")
-                    return {
-                        "status": "success",
-                        "message": "Vectorstore já existe. Use 'clear_existing=True' para forçar a reingestão."
-                    }
-                logger.info(f"Removendo vectorstore existente em: {VECTORSTORE_PATH}")
-                shutil.rmtree(VECTORSTORE_PATH)
-                os.makedirs(VECTORSTORE_PATH, exist_ok=True)
+                    if not INGEST_REGISTRY.is_empty():
+                        return IngestService.sync_directory(data_dir)
+                    # Índice criado antes do registro existir: sem os hashes não há como sincronizar
+                    logger.info("Registro de ingestão ausente para o índice existente. Reconstruindo uma única vez.")
+                # O índice existente continua servindo consultas até o novo ser publicado
+                logger.info(f"Reconstruindo vectorstore existente em: {VECTORSTORE_PATH}")
 
             logger.info(f"Carregando documentos de: {data_dir}")
-            documents = load_all_documents(data_dir)
-
-            result = IngestService._process_documents(documents)
-            if result["status"] != "success":
-                return result
+            file_paths = list_data_files(data_dir)
+            logger.info(f"Encontrados {len(file_paths)} arquivos para processamento em {data_dir}")
 
-            return IngestService._save_to_vectorstore(result["chunks"], create_new=True)
+            return IngestService._rebuild(file_paths, progress)
 
         except Exception as e:
             error_msg = f"Erro durante a ingestão de documentos: {e}"
@@ -75,150 +104,374 @@ class IngestService:
             }
 
     @staticmethod
-    def _filter_and_prepare_chunks(
-            chunks: List[Document]
-    ) -> List[Document]:
+    def sync_directory(data_dir: str = "data/") -> Dict[str, Any]:
         """
-        Filtra chunks inúteis e prepara os chunks para indexação.
+        Sincroniza o índice com o diretório de dados: processa apenas arquivos novos ou
+        alterados (pelo hash do conteúdo) e remove do índice os chunks de arquivos apagados.
 
         Args:
-            chunks: Lista de chunks a serem filtrados e preparados
+            data_dir: Diretório onde estão os documentos
 
         Returns:
-            Lista de chunks filtrados e preparados
+            Dicionário com status e mensagem do resultado da operação
         """
+        known = INGEST_REGISTRY.get_files()
+        file_paths = list_data_files(data_dir)
+
+        fingerprints = {}
+        changed_paths = []
+        for path in file_paths:
+            source_doc = os.path.basename(path)
+            fingerprints[source_doc] = fingerprint_file(path, known.get(source_doc))
+            if source_doc not in known or known[source_doc]["sha256"] != fingerprints[source_doc]["sha256"]:
+                changed_paths.append(path)
+
+        # Arquivos enviados por upload não estão no diretório e não devem ser removidos
+        removed_files = [
+            source_doc for source_doc, info in known.items()
+            if info["origin"] == ORIGIN_DIRECTORY and source_doc not in fingerprints
+        ]
+        unchanged = len(file_paths) - len(changed_paths)
+        logger.info(
+            f"Sincronização de {data_dir}: {len(changed_paths)} arquivo(s) novo(s) ou alterado(s), "
+            f"{len(removed_files)} removido(s), {unchanged} inalterado(s)."
+        )
+        if not changed_paths and not removed_files:
+            return {
+                "status": "success",
+                "message": f"Nenhuma alteração encontrada. {unchanged} arquivo(s) já indexado(s)."
+            }
 
-        filtered_chunks = []
-
-        for chunk in chunks:
-            chunk.page_content = f"passage: {chunk.page_content.strip()}"
-            filtered_chunks.append(chunk)
+        failed: List[str] = []
+        totals = {"chunks_added": 0, "chunks_duplicated": 0, "chunks_removed": 0}
+        batches = IngestService._iter_batches(changed_paths)
+        # As remoções vão junto com o primeiro lote (ou sozinhas, se nada tiver sido carregado)
+        pending_removals = removed_files
+        while True:
+            batch = next(batches, None)
+            if batch is None and not pending_removals:
+                break
+            chunks, files = IngestService._collect_batch(batch or [], failed, fingerprints)
+            result = IngestService._save_to_vectorstore(
+                chunks, files, origin=ORIGIN_DIRECTORY, removed_files=pending_removals
+            )
+            pending_removals = []
+            if result["status"] != "success":
+                return result
+            for key in totals:
+                totals[key] += result[key]
 
-        return filtered_chunks
+        message = (
+            f"Sincronização concluída! {totals['chunks_added']} chunks indexados, "
+            f"{totals['chunks_duplicated']} já existiam e {totals['chunks_removed']} foram removidos "
+            f"({unchanged} arquivo(s) inalterado(s))."
+        )
+        if failed:
+            # Arquivos que falharam não são registrados e serão tentados de novo na próxima sincronização
+            return {"status": "warning", "message": f"{message} Não foi possível processar: {', '.join(failed)}."}
+        return {"status": "success", "message": message}
 
     @staticmethod
-    def add_file_to_vectorstore(file_path: str) -> Dict[str, Any]:
+    def _rebuild(
+            file_paths: List[str],
+            progress: Optional[Callable[[Dict[str, int]], None]] = None
+    ) -> Dict[str, Any]:
         """
-        Adiciona um único arquivo à vector store existente
+        Reconstrói o índice do zero em streaming: cada lote de chunks é embeddado e gravado
+        direto na nova base (vetores no índice, textos no docstore SQLite), que só substitui
+        a atual ao final. O índice existente continua servindo consultas até lá.
 
         Args:
-            file_path: Caminho para o arquivo a ser adicionado
+            file_paths: Arquivos do diretório de dados
+            progress: Chamada a cada lote com files_total, files_done e chunks_indexed
 
         Returns:
             Dicionário com status e mensagem do resultado da operação
         """
+        with IngestService._lock:
+            writer = BaseWriter(VECTORSTORE_PATH)
+            try:
+                files: Dict[str, Dict[str, Any]] = {}
+                links: Dict[str, List[str]] = {}
+                new_ids: Dict[Tuple[str, str], str] = {}
+                failed: List[str] = []
+                total_chunks = 0
+
+                for batch in IngestService._iter_batches(file_paths):
+                    chunks, batch_files = IngestService._collect_batch(batch, failed)
+                    files.update(batch_files)
+                    hashes = [chunk_hash(chunk.page_content) for chunk in chunks]
+                    new_chunks = IngestService._dedupe(chunks, hashes, {}, new_ids, links)
+                    total_chunks += len(chunks)
+                    if new_chunks:
+                        embeddings = IngestService._embed(new_chunks)
+                        start = time.perf_counter()
+                        writer.add(new_chunks, embeddings)
+                        IngestService._observe_batch("index", new_chunks, start)
+                    logger.info(f"Ingestão em andamento: {len(files)} arquivo(s), {writer.count} chunks indexados.")
+                    if progress is not None:
+                        progress({
+                            "files_total": len(file_paths),
+                            "files_done": len(files) + len(failed),
+                            "chunks_indexed": writer.count,
+                        })
+
+                if writer.count == 0:
+                    writer.abort()
+                    return {
+                        "status": "warning",
+                        "message": "Não foi possível gerar chunks úteis a partir dos documentos."
+                    }
 
-        try:
-            file_path = Path(file_path)
+                VectorstoreService.publish_base(writer)
+            except Exception:
+                writer.abort()
+                raise
 
-            if not file_path.exists() or not file_path.is_file():
-                error_msg = f"Arquivo não encontrado: {file_path}"
-                logger.error(error_msg)
-                return {
-                    "status": "error",
-                    "message": error_msg
-                }
+            INGEST_REGISTRY.commit(files, links, new_ids, ORIGIN_DIRECTORY, reset=True)
 
-            logger.info(f"Carregando arquivo: {file_path}")
-            document = load_document(str(file_path))
+        message = (
+            f"Indexação completa! {writer.count} chunks foram indexados com sucesso "
+            f"({total_chunks - writer.count} duplicados ignorados)."
+        )
+        if failed:
+            return {"status": "warning", "message": f"{message} Não foi possível processar: {', '.join(failed)}."}
+        return {"status": "success", "message": message}
 
-            result = IngestService._process_documents(document)
-            if result["status"] != "success":
-                return result
+    @staticmethod
+    def _iter_batches(file_paths: List[str]) -> Iterator[List[Tuple[str, List[Document]]]]:
+        """
+        Agrupa os arquivos carregados em lotes de até INGEST_BATCH_MAX_CHUNKS chunks
+        (um arquivo nunca é dividido entre lotes).
+        """
+        batch: List[Tuple[str, List[Document]]] = []
+        size = 0
+        for path, chunks in iter_split_documents(file_paths, CHUNK_SIZE, CHUNK_OVERLAP):
+            chunks = IngestService._filter_and_prepare_chunks(chunks)
+            batch.append((path, chunks))
+            size += len(chunks)
+            if size >= INGEST_BATCH_MAX_CHUNKS:
+                yield batch
+                batch, size = [], 0
+        if batch:
+            yield batch
 
-            return IngestService._save_to_vectorstore(result["chunks"], create_new=False)
-        except Exception as e:
-            error_msg = f"Erro ao adicionar arquivo à vector store: {e}"
-            logger.error(error_msg)
+    @staticmethod
+    def _collect_batch(
+            batch: List[Tuple[str, List[Document]]],
+            failed: List[str],
+            fingerprints: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Tuple[List[Document], Dict[str, Dict[str, Any]]]:
+        """
+        Junta os chunks de um lote e os fingerprints dos arquivos que geraram chunks.
+        Arquivos sem chunks são anotados em `failed` e não são registrados.
+        """
+        chunks: List[Document] = []
+        files: Dict[str, Dict[str, Any]] = {}
+        for path, file_chunks in batch:
+            source_doc = os.path.basename(path)
+            if not file_chunks:
+                failed.append(source_doc)
+                continue
+            files[source_doc] = fingerprints[source_doc] if fingerprints else fingerprint_file(path)
+            chunks.extend(file_chunks)
+        return chunks, files
 
-            return {
-                "status": "error",
-                "message": error_msg
-            }
+    @staticmethod
+    def _dedupe(
+            chunks: List[Document],
+            hashes: List[str],
+            existing: Dict[Tuple[str, str], str],
+            new_ids: Dict[Tuple[str, str], str],
+            links: Dict[str, List[str]]
+    ) -> List[Document]:
+        """
+        Registra em `links` os hashes dos chunks de cada arquivo e atribui ids (e a data de
+        ingestão, usada nos filtros de consulta) aos chunks inéditos no próprio arquivo (nem
+        em `existing`, nem já vistos em `new_ids`, ambos por (source_doc, hash)).
+
+        Returns:
+            Apenas os chunks que precisam ser embeddados e indexados
+        """
+        new_chunks = []
+        ingested_at = int(time.time())
+        for chunk, content_hash in zip(chunks, hashes):
+            source_doc = chunk.metadata["source_doc"]
+            links.setdefault(source_doc, []).append(content_hash)
+            key = (source_doc, content_hash)
+            if key in existing or key in new_ids:
+                continue
+            chunk.id = uuid.uuid4().hex
+            chunk.metadata["ingested_at"] = ingested_at
+            new_ids[key] = chunk.id
+            new_chunks.append(chunk)
+        return new_chunks
+
+    @staticmethod
+    def _embed(chunks: List[Document]) -> np.ndarray:
+        """
+        Gera os embeddings dos chunks, calculando uma única vez o de textos repetidos no lote
+        (ex: o mesmo trecho em vários arquivos).
+        """
+        start = time.perf_counter()
+        texts = [chunk.page_content for chunk in chunks]
+        positions: Dict[str, int] = {}
+        rows = [positions.setdefault(text, len(positions)) for text in texts]
+        embeddings = EMBEDDING_ENGINE.embed_documents(list(positions))
+        if len(positions) < len(texts):
+            embeddings = embeddings[rows]
+        file_type = IngestService._observe_batch("embed", chunks, start)
+        INGEST_CHUNKS_TOTAL.labels(file_type).inc(len(chunks))
+        return embeddings
+
+    @staticmethod
+    def _observe_batch(stage: str, chunks: List[Document], start: float) -> str:
+        """
+        Registra a duração de uma etapa de um lote de chunks, com o tipo de arquivo do lote.
+
+        Returns:
+            Label do tipo de arquivo do lote (o tipo, se único, ou "mixed")
+        """
+        file_type = batch_file_type(file_type_of(str(chunk.metadata.get("source_doc", ""))) for chunk in chunks)
+        INGEST_BATCH_SECONDS.labels(stage, file_type).observe(time.perf_counter() - start)
+        return file_type
 
     @staticmethod
-    def _process_documents(documents: List[Document]) -> Dict[str, Any]:
+    def is_already_indexed(source_doc: str, fingerprint: Dict[str, Any]) -> bool:
         """
-        Processa documentos em chunks e retorna chunks filtrados
+        Indica se um arquivo com o mesmo nome e o mesmo conteúdo já está indexado.
+        """
+        known = INGEST_REGISTRY.get_file(source_doc)
+        return known is not None and known["sha256"] == fingerprint["sha256"]
+
+    @staticmethod
+    def _filter_and_prepare_chunks(
+            chunks: List[Document]
+    ) -> List[Document]:
+        """
+        Filtra chunks inúteis e prepara os chunks para indexação.
+        O prefixo "passage: " do E5 é aplicado pelo EMBEDDING_MODEL no momento do embedding,
+        de modo que o conteúdo armazenado (e enviado ao LLM) fica sem prefixo.
 
         Args:
-            documents: Lista de documentos a serem processados
+            chunks: Lista de chunks a serem filtrados e preparados
 
         Returns:
-            Dicionário com status, mensagem e chunks processados (se houver)
+            Lista de chunks filtrados e preparados
         """
 
-        if not documents:
-            return {
-                "status": "warning",
-                "message": "Nenhum documento foi carregado.",
-                "chunks": None
-            }
+        filtered_chunks = []
 
-        logger.info("Dividindo em chunks...")
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
-        )
-        chunks = splitter.split_documents(documents)
+        for chunk in chunks:
+            chunk.page_content = chunk.page_content.strip()
+            filtered_chunks.append(chunk)
 
-        logger.info("Filtrando e preparando chunks...")
-        filtered_chunks = IngestService._filter_and_prepare_chunks(chunks)
+        return filtered_chunks
+
+    @staticmethod
+    def add_chunks_to_vectorstore(
+            chunks: List[Document],
+            source_doc: str,
+            fingerprint: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Adiciona à vector store existente chunks já divididos (ex: pelo pool de ingestão).
+        Se já houver uma versão anterior do arquivo indexada, ela é substituída.
+
+        Args:
+            chunks: Lista de chunks gerados a partir de um arquivo
+            source_doc: Nome do arquivo (metadado source_doc dos chunks)
+            fingerprint: Hash e tamanho do arquivo (ver fingerprint_file)
 
+        Returns:
+            Dicionário com status e mensagem do resultado da operação
+        """
+
+        filtered_chunks = IngestService._filter_and_prepare_chunks(chunks)
         if not filtered_chunks:
             return {
                 "status": "warning",
-                "message": "Não foi possível gerar chunks úteis a partir dos documentos.",
-                "chunks": None
+                "message": "Não foi possível gerar chunks úteis a partir dos documentos."
             }
 
-        return {
-            "status": "success",
-            "message": "",
-            "chunks": filtered_chunks
-        }
+        return IngestService._save_to_vectorstore(
+            filtered_chunks, {source_doc: fingerprint}, origin=ORIGIN_UPLOAD
+        )
 
     @staticmethod
-    def _save_to_vectorstore(chunks: List[Document], create_new: bool = False) -> Dict[str, Any]:
+    def _save_to_vectorstore(
+            chunks: List[Document],
+            files: Dict[str, Dict[str, Any]],
+            origin: str,
+            removed_files: Iterable[str] = ()
+    ) -> Dict[str, Any]:
         """
-        Salva chunks em uma vector store
+        Adiciona chunks à vector store existente (como um segmento) e registra os arquivos
+        e chunks no INGEST_REGISTRY.
+
+        Chunks que o arquivo já tinha indexados (ex: trechos inalterados de um arquivo
+        modificado) não são embeddados de novo. Os chunks que deixam de pertencer ao arquivo
+        (versão anterior de um arquivo alterado ou arquivo removido) são removidos do índice
+        pelo id; os de outros arquivos, mesmo com o mesmo conteúdo, não são afetados.
 
         Args:
             chunks: Lista de chunks a serem salvos
-            create_new: Se True, cria uma nova vector store. Se False, adiciona à existente.
+            files: source_doc -> fingerprint dos arquivos cujos chunks estão em `chunks`
+            origin: ORIGIN_DIRECTORY ou ORIGIN_UPLOAD
+            removed_files: Arquivos cujos chunks devem ser removidos do índice
 
         Returns:
-            Dicionário com status e mensagem do resultado da operação
+            Dicionário com status, mensagem e contagens (chunks_added, chunks_duplicated, chunks_removed)
         """
 
         try:
-            if create_new:
-                logger.info(f"Gerando embeddings para {len(chunks)} chunks e criando vectorstore...")
-
-                db = FAISS.from_documents(chunks, EMBEDDING_MODEL)
-                db.save_local(VECTORSTORE_PATH)
-
-                return {
-                    "status": "success",
-                    "message": f"Indexação completa! {len(chunks)} chunks foram indexados com sucesso."
-                }
-            else:
-                logger.info(f"Adicionando {len(chunks)} chunks à vector store existente...")
-
-                try:
-                    db = VectorstoreService.get_vectorstore()
-                    db.add_documents(chunks)
-                    db.save_local(VECTORSTORE_PATH)
+            with IngestService._lock:
+                links: Dict[str, List[str]] = {source_doc: [] for source_doc in files}
+                links.update({source_doc: [] for source_doc in removed_files})
+                hashes = [chunk_hash(chunk.page_content) for chunk in chunks]
+                new_ids: Dict[Tuple[str, str], str] = {}
+                new_chunks = IngestService._dedupe(
+                    chunks, hashes, INGEST_REGISTRY.find_chunks(files), new_ids, links
+                )
+                duplicates = len(chunks) - len(new_chunks)
+                deleted_ids = INGEST_REGISTRY.orphaned_doc_ids(links)
+
+                logger.info(
+                    f"Adicionando {len(new_chunks)} chunks à vector store existente "
+                    f"({duplicates} já indexados, {len(deleted_ids)} a remover)..."
+                )
+
+                if new_chunks or deleted_ids:
+                    # Embeddings gerados uma única vez: o segmento é persistido e publicado em uma nova versão do índice
+                    # Os índices lexical (BM25) e de metadados do segmento usam os mesmos chunks, na mesma ordem
+                    segment_db = None
+                    lexical_part = None
+                    metadata_part = None
+                    if new_chunks:
+                        texts = [chunk.page_content for chunk in new_chunks]
+                        embeddings = IngestService._embed(new_chunks)
+                        start = time.perf_counter()
+                        segment_db = FAISS.from_embeddings(
+                            zip(texts, embeddings),
+                            EMBEDDING_MODEL,
+                            metadatas=[chunk.metadata for chunk in new_chunks],
+                            ids=[chunk.id for chunk in new_chunks],
+                        )
+                        lexical_part = LexicalPart.from_texts(texts)
+                        metadata_part = MetadataPart.from_documents(new_chunks)
+                    VectorstoreService.add_segment(segment_db, deleted_ids, lexical_part, metadata_part)
+                    if new_chunks:
+                        IngestService._observe_batch("index", new_chunks, start)
+                INGEST_REGISTRY.commit(files, links, new_ids, origin)
 
-                    return {
-                        "status": "success",
-                        "message": f"Adicionados com sucesso! {len(chunks)} chunks foram indexados."
-                    }
-                except Exception as e:
-                    logger.error(f"Erro ao carregar ou atualizar vectorstore: {e}")
-                    return {
-                        "status": "error",
-                        "message": f"Erro ao carregar ou atualizar vectorstore: {e}"
-                    }
+            return {
+                "status": "success",
+                "message": f"Adicionados com sucesso! {len(new_chunks)} chunks foram indexados, "
+                           f"{duplicates} já existiam e {len(deleted_ids)} foram removidos.",
+                "chunks_added": len(new_chunks),
+                "chunks_duplicated": duplicates,
+                "chunks_removed": len(deleted_ids),
+            }
 
         except Exception as e:
             logger.error(f"Erro ao salvar na vectorstore: {e}")
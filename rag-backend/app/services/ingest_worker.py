@@ -0,0 +1,274 @@
+import asyncio
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from app.core.config.embeddings import CHUNK_SIZE, CHUNK_OVERLAP
+from app.core.config.ingest import (
+    INGEST_QUEUE_MAX_SIZE,
+    INGEST_PROCESS_POOL_SIZE,
+    INGEST_WORKER_CONCURRENCY,
+    INGEST_JOB_HISTORY_SIZE,
+    INGEST_PROGRESS_POLL_SECONDS,
+)
+from app.core.utils.logger import get_logger, process_pool_logging
+from app.core.utils.metrics import INGEST_FILE_SECONDS, INGEST_FILES_TOTAL
+from app.services.document_loaders import load_and_split_document
+from app.services.ingest_registry import fingerprint_file
+from app.services.ingest_service import IngestService
+from app.services.metadata_index import file_type_of
+
+logger = get_logger(__name__)
+
+
+class IngestQueueFullError(Exception):
+    """
+    Levantada quando a fila de ingestão atingiu o limite e não aceita novos arquivos.
+    """
+
+
+class IngestWorker:
+    """
+    Subsistema de ingestão assíncrona de arquivos enviados.
+
+    Cada upload vira um job em uma fila limitada. Workers assíncronos consomem a fila e
+    delegam o trabalho pesado para fora do event loop:
+      - parsing, OCR e chunking rodam em um pool de processos;
+      - embeddings e escrita no índice rodam em uma thread do executor padrão,
+        um job por vez.
+    Assim as consultas em /query continuam sendo atendidas durante ingestões longas.
+    """
+
+    def __init__(
+        self,
+        queue_max_size: int = INGEST_QUEUE_MAX_SIZE,
+        process_pool_size: int = INGEST_PROCESS_POOL_SIZE,
+        concurrency: int = INGEST_WORKER_CONCURRENCY,
+        history_size: int = INGEST_JOB_HISTORY_SIZE,
+    ):
+        self.queue_max_size = queue_max_size
+        self.process_pool_size = process_pool_size
+        self.concurrency = concurrency
+        self.history_size = history_size
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._workers: List[asyncio.Task] = []
+        self._index_lock: Optional[asyncio.Lock] = None
+        self._manager = None
+        self._progress = None
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def start(self) -> None:
+        """
+        Cria a fila, o pool de processos e os workers. Chamado na inicialização da aplicação.
+        """
+        if self._workers:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.queue_max_size)
+        self._index_lock = asyncio.Lock()
+        # "spawn" evita herdar via fork o modelo de embeddings e as threads do processo principal
+        mp_context = multiprocessing.get_context("spawn")
+        self._process_pool = ProcessPoolExecutor(
+            max_workers=self.process_pool_size,
+            mp_context=mp_context,
+            **process_pool_logging(),
+        )
+        # Andamento (páginas de OCR) publicado pelos processos do pool, por job
+        self._manager = mp_context.Manager()
+        self._progress = self._manager.dict()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(self.concurrency)
+        ]
+        logger.info(
+            f"Worker de ingestão iniciado: fila={self.queue_max_size}, processos={self.process_pool_size}, "
+            f"concorrência={self.concurrency}"
+        )
+
+    async def stop(self) -> None:
+        """
+        Cancela os workers e encerra o pool de processos. Chamado no desligamento da aplicação.
+        """
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+            self._progress = None
+        logger.info("Worker de ingestão encerrado.")
+
+    def submit(self, file_path: str, temp_dir: str, filename: str) -> Dict[str, Any]:
+        """
+        Enfileira um arquivo para ingestão.
+
+        Args:
+            file_path: Caminho do arquivo temporário
+            temp_dir: Diretório temporário removido ao final do processamento
+            filename: Nome original do arquivo
+
+        Returns:
+            Registro do job criado
+
+        Raises:
+            IngestQueueFullError: Se a fila estiver cheia
+            RuntimeError: Se o worker não tiver sido iniciado
+        """
+        if self._queue is None:
+            raise RuntimeError("Worker de ingestão não foi iniciado.")
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "filename": filename,
+            "status": "queued",
+            "message": "Aguardando processamento.",
+            "chunks": None,
+            "progress": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "_file_path": file_path,
+            "_temp_dir": temp_dir,
+        }
+
+        self._jobs[job["job_id"]] = job
+        try:
+            self._queue.put_nowait(job["job_id"])
+        except asyncio.QueueFull:
+            del self._jobs[job["job_id"]]
+            raise IngestQueueFullError(
+                f"Fila de ingestão cheia ({self.queue_max_size} arquivos aguardando). Tente novamente mais tarde."
+            )
+
+        self._trim_history()
+        logger.info(f"Job de ingestão {job['job_id']} enfileirado para o arquivo '{filename}'")
+        return self._public(job)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return self._public(job) if job else None
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @staticmethod
+    def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in job.items() if not key.startswith("_")}
+
+    def _trim_history(self) -> None:
+        # Remove os jobs finalizados mais antigos; jobs pendentes nunca são descartados
+        excess = len(self._jobs) - self.history_size
+        if excess <= 0:
+            return
+        for job_id in [
+            job_id for job_id, job in self._jobs.items() if job["status"] in ("success", "warning", "error")
+        ][:excess]:
+            del self._jobs[job_id]
+
+    async def _worker_loop(self, worker_id: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process_job(self._jobs[job_id])
+            except Exception as e:
+                logger.error(f"Erro inesperado no worker de ingestão {worker_id}: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _process_job(self, job: Dict[str, Any]) -> None:
+        loop = asyncio.get_running_loop()
+        job["status"] = "processing"
+        job["message"] = "Processando arquivo."
+        job["started_at"] = time.time()
+        logger.info(f"Iniciando job de ingestão {job['job_id']}: {job['filename']}")
+
+        try:
+            source_doc = os.path.basename(job["_file_path"])
+            fingerprint = await loop.run_in_executor(None, fingerprint_file, job["_file_path"])
+            if IngestService.is_already_indexed(source_doc, fingerprint):
+                # Mesmo arquivo enviado de novo: nada a reprocessar
+                result = {"status": "success", "message": f"Arquivo '{source_doc}' já está indexado com o mesmo conteúdo."}
+                job["status"] = result["status"]
+                job["message"] = result["message"]
+                logger.info(f"Job de ingestão {job['job_id']} ignorado: {result['message']}")
+                return
+
+            file_type = file_type_of(source_doc)
+            start = time.perf_counter()
+            try:
+                chunks = await self._wait_with_progress(job, loop.run_in_executor(
+                    self._process_pool, load_and_split_document, job["_file_path"], CHUNK_SIZE, CHUNK_OVERLAP,
+                    self._progress, job["job_id"]
+                ))
+            except Exception:
+                INGEST_FILES_TOTAL.labels(file_type, "failed").inc()
+                raise
+            if not chunks:
+                # load_document registra o erro e retorna [] para arquivos ilegíveis ou não suportados
+                INGEST_FILES_TOTAL.labels(file_type, "failed").inc()
+                result = {"status": "warning", "message": "Nenhum documento foi carregado."}
+            else:
+                INGEST_FILE_SECONDS.labels("load_split", file_type).observe(time.perf_counter() - start)
+                INGEST_FILES_TOTAL.labels(file_type, "ok").inc()
+                job["chunks"] = len(chunks)
+                # Parsing roda em paralelo; a escrita no índice é feita por um job de cada vez
+                async with self._index_lock:
+                    result = await loop.run_in_executor(
+                        None, IngestService.add_chunks_to_vectorstore, chunks, source_doc, fingerprint
+                    )
+
+            job["status"] = result["status"]
+            job["message"] = result["message"]
+            if result["status"] == "success":
+                logger.info(f"Job de ingestão {job['job_id']} concluído: {result['message']}")
+            else:
+                logger.error(f"Falha no job de ingestão {job['job_id']}: {result['message']}")
+        except Exception as e:
+            job["status"] = "error"
+            job["message"] = f"Erro durante o processamento do arquivo: {e}"
+            logger.error(f"Erro no job de ingestão {job['job_id']}: {e}")
+        finally:
+            job["finished_at"] = time.time()
+            self._cleanup(job["_temp_dir"])
+
+    async def _wait_with_progress(self, job: Dict[str, Any], future: asyncio.Future) -> Any:
+        """
+        Aguarda o parsing do arquivo copiando para o job o andamento publicado pelo pool.
+        """
+        try:
+            while True:
+                done, _ = await asyncio.wait({future}, timeout=INGEST_PROGRESS_POLL_SECONDS)
+                if done:
+                    return future.result()
+                progress = self._progress.get(job["job_id"])
+                if progress:
+                    job["progress"] = dict(progress)
+                    job["message"] = (
+                        f"OCR: {progress['pages_done']}/{progress['pages_total']} páginas "
+                        f"({progress['pages_cached']} do cache)."
+                    )
+        finally:
+            self._progress.pop(job["job_id"], None)
+
+    @staticmethod
+    def _cleanup(temp_dir: str) -> None:
+        try:
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+                logger.info(f"Diretório temporário removido: {temp_dir}")
+        except Exception as e:
+            logger.error(f"Erro ao limpar diretório temporário: {e}")
+
+
+INGEST_WORKER = IngestWorker()
@@ -0,0 +1,256 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app.core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+LEXICAL_DIR = "lexical"
+_VOCAB_FILE = "vocab.json"
+_ARRAY_FILES = ("offsets", "doc_ids", "tfs", "doc_lens")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Termos presentes em mais desta fração dos documentos pontuam quase nada (idf ~ 0) e têm as
+# maiores listas de ocorrências; são ignorados em consultas com outros termos
+BM25_MAX_DF_RATIO = 0.5
+
+# Siglas e códigos como "2.3-reivindicacoes" ou "art.5" são mantidos inteiros e também divididos
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[./_-][a-z0-9]+)*")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Divide o texto em termos: minúsculas, sem acentos, com os termos compostos (códigos de
+    formulários, números de artigos) emitidos inteiros e também por partes.
+    """
+    normalized = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    tokens = []
+    for token in _TOKEN_RE.findall(normalized):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_WORD_RE.findall(token))
+    return tokens
+
+
+class LexicalPart:
+    """
+    Índice invertido (BM25) de um bloco contíguo de documentos: a base ou um segmento do índice FAISS.
+
+    As listas de ocorrências ficam em arrays numpy contíguos: para o termo t, as posições
+    offsets[t]:offsets[t + 1] de doc_ids (uint32, crescentes) e tfs (uint16). Os documentos são
+    numerados na ordem das posições do índice FAISS do bloco.
+    """
+
+    def __init__(self, vocab: Dict[str, int], offsets: np.ndarray, doc_ids: np.ndarray,
+                 tfs: np.ndarray, doc_lens: np.ndarray):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.total_len = float(doc_lens.sum()) if len(doc_lens) else 0.0
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_lens)
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return None
+        start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str]) -> "LexicalPart":
+        builder = LexicalPartBuilder()
+        builder.add(texts)
+        return builder.finish()
+
+    def save(self, directory: str) -> None:
+        """
+        Grava o índice em um diretório (o chamador é responsável por torná-lo visível atomicamente).
+        """
+        os.makedirs(directory, exist_ok=True)
+        terms = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        with open(os.path.join(directory, _VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        for name in _ARRAY_FILES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> "LexicalPart":
+        with open(os.path.join(directory, _VOCAB_FILE), "r", encoding="utf-8") as f:
+            vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+            for name in _ARRAY_FILES
+        }
+        return cls(vocab, **arrays)
+
+
+class LexicalPartBuilder:
+    """
+    Constrói um LexicalPart em lotes, acompanhando a ordem em que os vetores entram no índice FAISS.
+    """
+
+    def __init__(self):
+        self._vocab: Dict[str, int] = {}
+        self._terms: List[np.ndarray] = []
+        self._docs: List[np.ndarray] = []
+        self._tfs: List[np.ndarray] = []
+        self._doc_lens: List[int] = []
+
+    @property
+    def count(self) -> int:
+        return len(self._doc_lens)
+
+    def add(self, texts: Iterable[str]) -> None:
+        terms, docs, tfs = [], [], []
+        for text in texts:
+            counts = Counter(tokenize(text))
+            doc = self.count
+            self._doc_lens.append(sum(counts.values()))
+            for token, tf in counts.items():
+                terms.append(self._vocab.setdefault(token, len(self._vocab)))
+                docs.append(doc)
+                tfs.append(min(tf, 65535))
+        self._terms.append(np.asarray(terms, dtype=np.uint32))
+        self._docs.append(np.asarray(docs, dtype=np.uint32))
+        self._tfs.append(np.asarray(tfs, dtype=np.uint16))
+
+    def finish(self) -> LexicalPart:
+        n_terms = len(self._vocab)
+        terms = np.concatenate(self._terms) if self._terms else np.zeros(0, dtype=np.uint32)
+        # Ordenação estável por termo: dentro de cada lista os documentos continuam crescentes
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=offsets[1:])
+        docs = np.concatenate(self._docs)[order] if self._docs else np.zeros(0, dtype=np.uint32)
+        tfs = np.concatenate(self._tfs)[order] if self._tfs else np.zeros(0, dtype=np.uint16)
+        return LexicalPart(self._vocab, offsets, docs, tfs, np.asarray(self._doc_lens, dtype=np.uint32))
+
+
+def build_lexical_part(db: FAISS, start: int, count: int, batch_size: int = 4096) -> LexicalPart:
+    """
+    Constrói o índice lexical das posições [start, start + count) de um vectorstore, lendo
+    os textos do docstore (índices gravados antes da busca híbrida ou bases compactadas).
+    """
+    builder = LexicalPartBuilder()
+    for batch_start in range(start, start + count, batch_size):
+        texts = []
+        for pos in range(batch_start, min(batch_start + batch_size, start + count)):
+            doc = db.docstore.search(db.index_to_docstore_id[pos])
+            texts.append(doc.page_content if isinstance(doc, Document) else "")
+        builder.add(texts)
+    return builder.finish()
+
+
+class LexicalIndex:
+    """
+    Índice BM25 de uma versão do vectorstore, alinhado às posições do índice FAISS.
+
+    É composto por partes imutáveis (base e segmentos), cada uma começando na posição do
+    seu primeiro vetor; acrescentar um segmento cria um novo LexicalIndex sem copiar as demais.
+    As estatísticas (N, df, tamanho médio) são globais, e as posições em `deleted` (documentos
+    removidos aguardando compactação) nunca são retornadas. Com `allowed` (máscara de um
+    filtro de metadados), apenas as posições marcadas podem ser retornadas.
+    """
+
+    def __init__(self, parts: Sequence[Tuple[int, LexicalPart]], deleted: Optional[np.ndarray] = None,
+                 allowed: Optional[np.ndarray] = None):
+        self.parts = list(parts)
+        self.deleted = deleted if deleted is not None else np.zeros(0, dtype=np.int64)
+        self.allowed = allowed
+        self.n_docs = sum(part.n_docs for _, part in self.parts)
+        self.total_len = sum(part.total_len for _, part in self.parts)
+        self.ntotal = max((start + part.n_docs for start, part in self.parts), default=0)
+
+    def with_part(self, part: LexicalPart, start: int) -> "LexicalIndex":
+        return LexicalIndex(self.parts + [(start, part)], self.deleted)
+
+    def with_deleted(self, positions: Iterable[int]) -> "LexicalIndex":
+        return LexicalIndex(self.parts, np.fromiter(positions, dtype=np.int64), self.allowed)
+
+    def with_allowed(self, mask: np.ndarray) -> "LexicalIndex":
+        return LexicalIndex(self.parts, self.deleted, mask)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        Busca os k documentos com maior pontuação BM25.
+
+        Returns:
+            Lista de (posição no índice FAISS, pontuação), da maior para a menor pontuação
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or self.n_docs == 0 or k <= 0:
+            return []
+
+        avg_len = self.total_len / self.n_docs or 1.0
+        positions, weights = [], []
+        for term in terms:
+            postings = [(start, part, part.postings(term)) for start, part in self.parts]
+            postings = [(start, part, p) for start, part, p in postings if p is not None and len(p[0])]
+            df = sum(len(p[0]) for _, _, p in postings)
+            if df == 0 or (len(terms) > 1 and df > BM25_MAX_DF_RATIO * self.n_docs):
+                continue
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            for start, part, (doc_ids, tfs) in postings:
+                tf = tfs.astype(np.float32)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * part.doc_lens[doc_ids].astype(np.float32) / avg_len)
+                weights.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+                positions.append(doc_ids.astype(np.int64) + start)
+        if not positions:
+            return []
+
+        positions = np.concatenate(positions)
+        weights = np.concatenate(weights)
+        if len(positions) * 8 < self.ntotal:
+            # Poucas ocorrências: acumula só sobre os candidatos, sem um array do tamanho do corpus
+            candidates, inverse = np.unique(positions, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights)
+            if len(self.deleted):
+                scores[np.isin(candidates, self.deleted)] = 0
+            if self.allowed is not None:
+                scores[~self.allowed[candidates]] = 0
+        else:
+            scores = np.bincount(positions, weights=weights, minlength=self.ntotal)
+            candidates = None
+            if len(self.deleted):
+                scores[self.deleted[self.deleted < len(scores)]] = 0
+            if self.allowed is not None:
+                scores[:len(self.allowed)][~self.allowed] = 0
+
+        top = np.flatnonzero(scores > 0)
+        if len(top) > k:
+            top = top[np.argpartition(-scores[top], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        found = candidates[top] if candidates is not None else top
+        return [(int(pos), float(scores[i])) for pos, i in zip(found, top)]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Funde rankings de posições pelo Reciprocal Rank Fusion: score(d) = soma de 1 / (k + rank(d)).
+
+    Returns:
+        Lista de (posição, score) do maior para o menor score
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, pos in enumerate(ranking, start=1):
+            scores[pos] = scores.get(pos, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
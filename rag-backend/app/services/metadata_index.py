@@ -0,0 +1,212 @@
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app.core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+METADATA_DIR = "metadata"
+# Atributos categóricos indexados: para cada valor, as posições dos documentos que o têm
+FILTER_ATTRIBUTES = ("source_doc", "file_type")
+_INGESTED_AT_FILE = "ingested_at.npy"
+
+
+def file_type_of(source_doc: str) -> str:
+    """
+    Tipo do arquivo de origem (extensão, sem ponto e em minúsculas), ex: "pdf".
+    """
+    return os.path.splitext(source_doc)[1].lower().lstrip(".")
+
+
+def document_attributes(doc: Document) -> Dict[str, str]:
+    source_doc = str(doc.metadata.get("source_doc", ""))
+    return {"source_doc": source_doc, "file_type": file_type_of(source_doc)}
+
+
+class _ValueIndex:
+    """
+    Posições (crescentes) dos documentos com cada valor de um atributo: para o valor v, as
+    posições positions[offsets[v]:offsets[v + 1]], em um único array uint32 contíguo.
+    """
+
+    def __init__(self, values: List[str], offsets: np.ndarray, positions: np.ndarray):
+        self.values = values
+        self.ids = {value: i for i, value in enumerate(values)}
+        self.offsets = offsets
+        self.positions = positions
+
+    def positions_of(self, value: str) -> np.ndarray:
+        value_id = self.ids.get(value)
+        if value_id is None:
+            return self.positions[:0]
+        return self.positions[int(self.offsets[value_id]):int(self.offsets[value_id + 1])]
+
+    @classmethod
+    def from_value_ids(cls, values: List[str], value_ids: np.ndarray) -> "_ValueIndex":
+        order = np.argsort(value_ids, kind="stable").astype(np.uint32)
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(value_ids, minlength=len(values)), out=offsets[1:])
+        return cls(values, offsets, order)
+
+
+class MetadataPart:
+    """
+    Índice de metadados de um bloco contíguo de documentos (base ou segmento do índice FAISS):
+    listas de posições por source_doc e por tipo de arquivo, e a data de ingestão de cada documento.
+    """
+
+    def __init__(self, attributes: Dict[str, _ValueIndex], ingested_at: np.ndarray):
+        self.attributes = attributes
+        self.ingested_at = ingested_at
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.ingested_at)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document]) -> "MetadataPart":
+        builder = MetadataPartBuilder()
+        builder.add(documents)
+        return builder.finish()
+
+    def save(self, directory: str) -> None:
+        """
+        Grava o índice em um diretório (o chamador é responsável por torná-lo visível atomicamente).
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, index in self.attributes.items():
+            with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(index.values, f, ensure_ascii=False)
+            np.save(os.path.join(directory, f"{name}.offsets.npy"), index.offsets)
+            np.save(os.path.join(directory, f"{name}.positions.npy"), index.positions)
+        np.save(os.path.join(directory, _INGESTED_AT_FILE), self.ingested_at)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False) -> "MetadataPart":
+        mmap_mode = "r" if mmap else None
+        attributes = {}
+        for name in FILTER_ATTRIBUTES:
+            with open(os.path.join(directory, f"{name}.json"), "r", encoding="utf-8") as f:
+                values = json.load(f)
+            attributes[name] = _ValueIndex(
+                values,
+                np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode=mmap_mode),
+                np.load(os.path.join(directory, f"{name}.positions.npy"), mmap_mode=mmap_mode),
+            )
+        return cls(attributes, np.load(os.path.join(directory, _INGESTED_AT_FILE), mmap_mode=mmap_mode))
+
+
+class MetadataPartBuilder:
+    """
+    Constrói um MetadataPart em lotes, na ordem em que os vetores entram no índice FAISS.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Dict[str, int]] = {name: {} for name in FILTER_ATTRIBUTES}
+        self._value_ids: Dict[str, List[int]] = {name: [] for name in FILTER_ATTRIBUTES}
+        self._ingested_at: List[int] = []
+
+    def add(self, documents: Iterable[Document]) -> None:
+        for doc in documents:
+            for name, value in document_attributes(doc).items():
+                values = self._values[name]
+                self._value_ids[name].append(values.setdefault(value, len(values)))
+            # Documentos indexados antes do registro da data ficam com 0 (excluídos por filtros de data)
+            self._ingested_at.append(int(doc.metadata.get("ingested_at", 0)))
+
+    def finish(self) -> MetadataPart:
+        attributes = {}
+        for name in FILTER_ATTRIBUTES:
+            values = [None] * len(self._values[name])
+            for value, value_id in self._values[name].items():
+                values[value_id] = value
+            attributes[name] = _ValueIndex.from_value_ids(values, np.asarray(self._value_ids[name], dtype=np.int64))
+        return MetadataPart(attributes, np.asarray(self._ingested_at, dtype=np.int64))
+
+
+def build_metadata_part(db: FAISS, start: int, count: int) -> MetadataPart:
+    """
+    Constrói o índice de metadados das posições [start, start + count) de um vectorstore,
+    lendo os documentos do docstore (índices gravados antes dos filtros ou bases compactadas).
+    """
+    builder = MetadataPartBuilder()
+    for pos in range(start, start + count):
+        doc = db.docstore.search(db.index_to_docstore_id[pos])
+        builder.add([doc if isinstance(doc, Document) else Document(page_content="")])
+    return builder.finish()
+
+
+class MetadataIndex:
+    """
+    Índice de metadados de uma versão do vectorstore, alinhado às posições do índice FAISS
+    (partes imutáveis da base e dos segmentos, como o LexicalIndex).
+    """
+
+    def __init__(self, parts: Sequence[Tuple[int, MetadataPart]]):
+        self.parts = list(parts)
+
+    def with_part(self, part: MetadataPart, start: int) -> "MetadataIndex":
+        return MetadataIndex(self.parts + [(start, part)])
+
+    def mask(
+        self,
+        ntotal: int,
+        source_docs: Optional[List[str]] = None,
+        file_types: Optional[List[str]] = None,
+        ingested_after: Optional[float] = None,
+        ingested_before: Optional[float] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Calcula as posições que satisfazem os filtros (valores de um mesmo atributo são
+        combinados com OU; atributos diferentes, com E).
+
+        Returns:
+            Máscara booleana de tamanho ntotal, ou None se nenhum filtro foi informado
+        """
+        wanted = {
+            "source_doc": source_docs,
+            "file_type": [file_type.lower().lstrip(".") for file_type in file_types or []],
+        }
+        if not any(wanted.values()) and ingested_after is None and ingested_before is None:
+            return None
+
+        mask = np.ones(ntotal, dtype=bool)
+        for name, values in wanted.items():
+            if not values:
+                continue
+            attribute_mask = np.zeros(ntotal, dtype=bool)
+            for start, part in self.parts:
+                for value in values:
+                    attribute_mask[part.attributes[name].positions_of(value).astype(np.int64) + start] = True
+            mask &= attribute_mask
+
+        if ingested_after is not None or ingested_before is not None:
+            date_mask = np.zeros(ntotal, dtype=bool)
+            for start, part in self.parts:
+                in_range = np.ones(part.n_docs, dtype=bool)
+                if ingested_after is not None:
+                    in_range &= part.ingested_at >= ingested_after
+                if ingested_before is not None:
+                    in_range &= part.ingested_at < ingested_before
+                date_mask[start:start + part.n_docs] = in_range
+            mask &= date_mask
+        return mask
+
+
+def make_bitmap_selector(mask: np.ndarray) -> faiss.IDSelector:
+    """
+    Cria um seletor FAISS que aceita apenas as posições marcadas na máscara. A verificação
+    é um acesso a bit, então a busca filtrada custa o mesmo que a busca sem filtro.
+    """
+    bitmap = np.packbits(mask, bitorder="little")
+    # O tamanho informado ao FAISS é o do bitmap em bytes
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    # O seletor guarda apenas um ponteiro para o bitmap
+    selector.referenced_objects = [bitmap]
+    return selector
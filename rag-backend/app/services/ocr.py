@@ -0,0 +1,214 @@
+import concurrent.futures
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from app.core.config.ingest import (
+    OCR_CACHE_DIR,
+    OCR_DPI,
+    OCR_LANGUAGES,
+    OCR_PROCESS_POOL_SIZE,
+    OCR_RASTER_BATCH_SIZE,
+    OCR_STRATEGY,
+)
+from app.core.utils.logger import get_logger, process_pool_logging
+
+logger = get_logger(__name__)
+
+# Chamado a cada página concluída com (páginas concluídas, total de páginas, páginas vindas do cache)
+OCRProgressCallback = Callable[[int, int, int], None]
+
+
+def _init_ocr_process() -> None:
+    # Vários processos de OCR em paralelo: cada Tesseract usa uma única thread
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_page_image(image_path: str, strategy: str, languages: List[str]) -> str:
+    """
+    Reconhece o texto de uma página rasterizada. Executado nos processos do pool de OCR.
+    """
+    # Importado só nos processos de OCR: carrega os modelos de layout do unstructured
+    from unstructured.partition.image import partition_image
+
+    elements = partition_image(filename=image_path, strategy=strategy, languages=languages)
+    return "\n\n".join(str(element) for element in elements if str(element).strip())
+
+
+def _page_batches(pages: List[int], batch_size: int) -> Iterator[List[int]]:
+    """
+    Agrupa as páginas em sequências contíguas de até batch_size páginas,
+    rasterizadas em uma única chamada ao pdftoppm.
+    """
+    batch: List[int] = []
+    for page in sorted(set(pages)):
+        if batch and (page != batch[-1] + 1 or len(batch) >= batch_size):
+            yield batch
+            batch = []
+        batch.append(page)
+    if batch:
+        yield batch
+
+
+class OCREngine:
+    """
+    OCR de PDFs digitalizados página a página.
+
+    As páginas são rasterizadas com pdf2image em lotes e distribuídas entre um pool de
+    processos. O texto de cada página é guardado em disco sob uma chave formada pelo hash
+    da imagem e pelas configurações de OCR: reingerir um documento (ou uma versão com
+    apenas algumas páginas alteradas) só reconhece as páginas que mudaram.
+    """
+
+    def __init__(
+        self,
+        dpi: int = OCR_DPI,
+        strategy: str = OCR_STRATEGY,
+        languages: Optional[List[str]] = None,
+        workers: int = OCR_PROCESS_POOL_SIZE,
+        raster_batch_size: int = OCR_RASTER_BATCH_SIZE,
+        cache_dir: Optional[str] = OCR_CACHE_DIR,
+    ):
+        self.dpi = dpi
+        self.strategy = strategy
+        self.languages = list(languages or OCR_LANGUAGES)
+        self.workers = workers
+        self.raster_batch_size = raster_batch_size
+        self.cache_dir = cache_dir
+        self._pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+    @property
+    def settings_key(self) -> str:
+        return json.dumps(
+            {"dpi": self.dpi, "strategy": self.strategy, "languages": self.languages}, sort_keys=True
+        )
+
+    def _get_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        # Criado sob demanda e reaproveitado entre arquivos: o custo de subir os processos
+        # (e carregar os modelos do unstructured) é pago uma única vez por processo de ingestão
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                **process_pool_logging(_init_ocr_process),
+            )
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def _cache_key(self, image_path: str) -> str:
+        digest = hashlib.sha256(self.settings_key.encode("utf-8"))
+        with open(image_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(key), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _cache_put(self, key: str, text: str) -> None:
+        if not self.cache_dir:
+            return
+        path = self._cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def ocr_pdf(
+        self,
+        file_path: str,
+        pages: Optional[List[int]] = None,
+        progress: Optional[OCRProgressCallback] = None,
+    ) -> Dict[int, str]:
+        """
+        Aplica OCR às páginas de um PDF.
+
+        Args:
+            file_path: Caminho do PDF
+            pages: Índices das páginas (a partir de 0); todas se None
+            progress: Chamado a cada página concluída
+
+        Returns:
+            Dicionário índice da página -> texto reconhecido (páginas com erro ficam vazias)
+        """
+        if pages is None:
+            pages = list(range(pdfinfo_from_path(file_path)["Pages"]))
+        total = len(set(pages))
+        file_name = os.path.basename(file_path)
+        texts: Dict[int, str] = {}
+        state = {"done": 0, "cached": 0}
+
+        def finish(page: int, text: str, from_cache: bool) -> None:
+            texts[page] = text
+            state["done"] += 1
+            state["cached"] += int(from_cache)
+            if progress is not None:
+                progress(state["done"], total, state["cached"])
+            if state["done"] % 25 == 0 or state["done"] == total:
+                logger.info(f"OCR de {file_name}: {state['done']}/{total} páginas ({state['cached']} do cache)")
+
+        def collect(futures: Dict[concurrent.futures.Future, Tuple[int, str, str]], block: bool) -> None:
+            done, _ = concurrent.futures.wait(
+                futures, timeout=None if block else 0, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                page, key, image_path = futures.pop(future)
+                try:
+                    text = future.result()
+                    self._cache_put(key, text)
+                except Exception as e:
+                    logger.error(f"Erro no OCR da página {page + 1} de {file_name}: {e}")
+                    text = ""
+                os.remove(image_path)
+                finish(page, text, from_cache=False)
+
+        futures: Dict[concurrent.futures.Future, Tuple[int, str, str]] = {}
+        with tempfile.TemporaryDirectory(prefix="ocr-") as tmp_dir:
+            for batch in _page_batches(pages, self.raster_batch_size):
+                image_paths = convert_from_path(
+                    file_path, dpi=self.dpi, first_page=batch[0] + 1, last_page=batch[-1] + 1,
+                    output_folder=tmp_dir, fmt="png", paths_only=True,
+                )
+                for page, image_path in zip(batch, image_paths):
+                    key = self._cache_key(image_path)
+                    cached = self._cache_get(key)
+                    if cached is not None:
+                        os.remove(image_path)
+                        finish(page, cached, from_cache=True)
+                    else:
+                        futures[self._get_pool().submit(
+                            _ocr_page_image, image_path, self.strategy, self.languages
+                        )] = (page, key, image_path)
+                # A rasterização do próximo lote acontece enquanto o pool reconhece este;
+                # acima de alguns lotes pendentes espera, para limitar as imagens em disco
+                collect(futures, block=False)
+                while len(futures) > max(self.workers, 1) * self.raster_batch_size:
+                    collect(futures, block=True)
+
+            while futures:
+                collect(futures, block=True)
+
+        return texts
+
+
+OCR_ENGINE = OCREngine()
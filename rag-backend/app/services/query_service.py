@@ -1,57 +1,235 @@
-from http.client import HTTPException
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from langchain.prompts import PromptTemplate
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
-import os
-from typing import Dict, Any, Tuple
+import asyncio
+import logging
+import time
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 
 from app.core.utils.logger import get_logger
+from app.core.utils.metrics import (
+    BATCH_STAGE_SECONDS, PROMPT_TOKENS_TOTAL, QUERIES_TOTAL, QUERY_ERRORS_TOTAL, QUERY_STAGE_SECONDS,
+    RETRIEVED_DOCUMENTS_TOTAL, observe_stages,
+)
 from app.core.config.embeddings import EMBEDDING_MODEL
 from app.core.config.prompts import TEMPLATE
-from app.core.config.llm import get_llm, LLMProvider
-from app.services.vectorstore_service import VectorstoreService
+from app.core.config.llm import BATCH_LLM_CONCURRENCY, LLM_POOL, LLMProvider
+from app.services.answer_cache import ANSWER_CACHE, AnswerCache, AnswerNamespace, freeze_filters
+from app.services.context_builder import ContextBuilder, get_token_counter
+from app.services.lexical_index import LexicalIndex
+from app.services.rate_limiter import LLM_RATE_LIMITER
+from app.services.reranker import RERANK_CANDIDATES, RERANKER
+from app.services.vector_index import fuse_hybrid, mmr_select, search_with_score_by_vectors
+from app.services.vectorstore_service import IndexSnapshot, VectorstoreService
 
 load_dotenv()
 
 logger = get_logger(__name__)
 
+SEARCH_SCORE_THRESHOLD = 0.5
+# Busca híbrida: candidatos de cada lado (vetorial e BM25) por documento pedido, e constante do RRF
+HYBRID_FETCH_FACTOR = 4
+HYBRID_RRF_K = 60
+# Candidatos buscados no FAISS para a seleção por MMR
+MMR_FETCH_K = 20
+SEARCH_TYPES = ("similarity", "mmr", "similarity_score_threshold", "hybrid")
+
+# Valores padrão dos parâmetros de cada consulta de um lote (os mesmos de process_query)
+BATCH_QUERY_DEFAULTS: Dict[str, Any] = {
+    "search_type": "similarity",
+    "search_k": 5,
+    "provider": "openai",
+    "model": "gpt-4o-mini",
+    "temperature": 0.7,
+    "max_tokens": 4096,
+    "nprobe": None,
+    "ef_search": None,
+    "rerank": False,
+    "max_context_tokens": None,
+    "filters": None,
+}
+
+QA_PROMPT = PromptTemplate(
+    input_variables=["context", "input"],
+    template=TEMPLATE,
+)
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _record_query(
+        endpoint: str,
+        provider: str,
+        model: str,
+        timings: Dict[str, float],
+        cache: Optional[str] = None,
+        prompt_tokens: Optional[int] = None
+) -> None:
+    # Métricas de uma consulta atendida: tempos por etapa, origem da resposta e tokens do prompt
+    observe_stages(QUERY_STAGE_SECONDS, timings, provider, model)
+    QUERIES_TOTAL.labels(endpoint, f"cache_{cache}" if cache else "llm").inc()
+    if prompt_tokens:
+        PROMPT_TOKENS_TOTAL.labels(provider, model).inc(prompt_tokens)
+
 
 class QueryService:
     @staticmethod
-    def load_vectorstore(search_type: str = 'similarity', search_k: int = 5) -> Tuple[Any, Any]: # Defina Any para os tipos de vectorstore e retriever
+    def load_snapshot() -> IndexSnapshot:
         """
-        Carrega (ou obtém) o vectorstore e o retriever do VectorstoreService.
+        Obtém o snapshot corrente do VectorstoreService (vectorstore + documentos removidos).
         Este método deve ser chamado ANTES de qualquer tentativa de consulta.
         O vectorstore é esperado estar inicializado pelo IngestService.
         """
-        logger.info(f"Carregando vectorstore e retriever via VectorstoreService com search_type='{search_type}', k={search_k}...")
-        vectorstore = VectorstoreService.get_vectorstore() # Assumindo que VectorstoreService tem este método
+        snapshot = VectorstoreService.get_snapshot()
 
-        if not vectorstore:
+        if snapshot is None or not snapshot.db:
             logger.error("Vectorstore não está carregado ou inicializado no VectorstoreService. Execute a ingestão de dados primeiro.")
             # Levanta uma exceção que o process_query pode capturar e transformar em HTTPException 503
             raise ValueError("Vectorstore não está carregado. Execute a ingestão de dados primeiro.")
 
-        try:
-            # Configurações padrão para o retriever, ajuste conforme necessário
-            retriever = vectorstore.as_retriever(
-                search_type=search_type, # Usa o search_type recebido
-                search_kwargs={"k": search_k, "score_threshold": 0.5} # Usa o search_k recebido
+        return snapshot
+
+    @staticmethod
+    def candidate_k(search_type: str, search_k: int) -> int:
+        """
+        Quantidade de vizinhos buscados no FAISS para o tipo de busca.
+
+        Raises:
+            ValueError: Se o tipo de busca não for suportado
+        """
+        if search_type not in SEARCH_TYPES:
+            raise ValueError(f"Tipo de busca não suportado: {search_type}")
+        if search_type == "mmr":
+            return max(MMR_FETCH_K, search_k)
+        if search_type == "hybrid":
+            return search_k * HYBRID_FETCH_FACTOR
+        return search_k
+
+    @staticmethod
+    def select_documents(
+            vectorstore: Any,
+            embedding: List[float],
+            candidates: List[Tuple[Document, float, int]],
+            search_type: str,
+            search_k: int,
+            query: Optional[str] = None,
+            lexical: Optional[LexicalIndex] = None
+    ) -> List[Document]:
+        """
+        Aplica a etapa própria do tipo de busca sobre os candidatos (documento, distância, posição)
+        já buscados no FAISS, em ordem de proximidade.
+        """
+        if search_type == "mmr":
+            return mmr_select(vectorstore, embedding, candidates, search_k)
+
+        if search_type == "similarity_score_threshold":
+            relevance_score_fn = vectorstore.relevance_score_fn()
+            return [
+                doc for doc, score, _ in candidates
+                if relevance_score_fn(score) >= SEARCH_SCORE_THRESHOLD
+            ]
+
+        if search_type == "hybrid":
+            return fuse_hybrid(
+                vectorstore, candidates, query or "", search_k, lexical,
+                fetch_k=search_k * HYBRID_FETCH_FACTOR, rrf_k=HYBRID_RRF_K
             )
-            logger.info("Vectorstore e retriever carregados com sucesso.")
-            return vectorstore, retriever
-        except Exception as e:
-            logger.error(f"Erro ao criar retriever a partir do vectorstore: {e}")
-            raise ValueError(f"Não foi possível criar o retriever: {e}")
+
+        if search_type == "similarity":
+            return [doc for doc, score, _ in candidates if score <= SEARCH_SCORE_THRESHOLD]
+
+        raise ValueError(f"Tipo de busca não suportado: {search_type}")
+
+    @staticmethod
+    def search_batch(
+            vectorstore: Any,
+            embeddings: List[List[float]],
+            searches: List[Tuple[str, int, Optional[str]]],
+            nprobe: Optional[int] = None,
+            ef_search: Optional[int] = None,
+            selectors: Optional[Any] = None,
+            lexical: Optional[LexicalIndex] = None,
+            allowed: Optional[Any] = None
+    ) -> List[List[Document]]:
+        """
+        Busca os documentos de várias consultas com uma única chamada a index.search sobre a
+        matriz de embeddings (k = o maior entre as consultas); cada consulta usa apenas os seus
+        primeiros candidatos. Bloqueante: deve rodar fora do event loop.
+
+        Args:
+            vectorstore: Vectorstore (base + segmentos) do snapshot
+            embeddings: Embeddings das consultas
+            searches: Para cada consulta, (search_type, search_k, texto da consulta)
+            nprobe, ef_search, selectors, lexical, allowed: Compartilhados por todas as consultas
+                (ver search_documents)
+
+        Returns:
+            Documentos recuperados de cada consulta, na ordem de `searches`
+        """
+        fetch_ks = [QueryService.candidate_k(search_type, search_k) for search_type, search_k, _ in searches]
+        candidates = search_with_score_by_vectors(
+            vectorstore, embeddings, max(fetch_ks), nprobe=nprobe, ef_search=ef_search, selectors=selectors,
+            allowed=allowed
+        )
+        return [
+            QueryService.select_documents(
+                vectorstore, embedding, found[:fetch_k], search_type, search_k, query, lexical
+            )
+            for embedding, found, fetch_k, (search_type, search_k, query)
+            in zip(embeddings, candidates, fetch_ks, searches)
+        ]
+
+    @staticmethod
+    async def search_documents(
+            vectorstore: Any,
+            embedding: List[float],
+            search_type: str = 'similarity',
+            search_k: int = 5,
+            nprobe: Optional[int] = None,
+            ef_search: Optional[int] = None,
+            selectors: Optional[Any] = None,
+            query: Optional[str] = None,
+            lexical: Optional[LexicalIndex] = None,
+            allowed: Optional[Any] = None
+    ) -> List[Document]:
+        """
+        Busca os documentos relevantes a partir de um embedding de consulta já calculado.
+
+        Args:
+            vectorstore: Vectorstore (base + segmentos) do snapshot
+            embedding: Embedding da consulta
+            search_type: Tipo de busca ("similarity", "mmr", "similarity_score_threshold", "hybrid")
+            search_k: Número de documentos a serem recuperados
+            nprobe: Listas IVF visitadas na busca (apenas índices IVF)
+            ef_search: Tamanho da fila de candidatos do HNSW (apenas índices HNSW)
+            selectors: faiss.IDSelector por parte do vectorstore, que restringem as posições elegíveis
+                (ex: excluem documentos removidos)
+            query: Texto da consulta (usado apenas pela busca híbrida)
+            lexical: Índice BM25 do snapshot (usado apenas pela busca híbrida)
+            allowed: Máscara das posições permitidas pelos filtros (ver IndexSnapshot.filter); com
+                ela, buscas HNSW/IVF seletivas passam a ser exatas ou a visitar mais candidatos
+
+        Returns:
+            Lista de documentos recuperados
+        """
+        results = await run_in_threadpool(
+            QueryService.search_batch, vectorstore, [embedding], [(search_type, search_k, query)],
+            nprobe, ef_search, selectors, lexical, allowed
+        )
+        return results[0]
 
     @staticmethod
     def initialize_llm(provider: LLMProvider = "openai", model: str = "gpt-4o-mini", **kwargs) -> Any:
         """
-        Inicializa um modelo de linguagem (LLM).
+        Obtém um modelo de linguagem (LLM) pronto do pool, instanciando-o apenas na primeira vez.
 
         Args:
-            provider: Provedor do LLM ("openai", "google", "ollama")
+            provider: Provedor do LLM ("openai", "google", "ollama", "stub")
             model: Nome do modelo a ser usado
             **kwargs: Parâmetros adicionais para o LLM
 
@@ -62,45 +240,205 @@ class QueryService:
             Exception: Se ocorrer um erro ao inicializar o LLM
         """
         try:
-            logger.info(f"Inicializando modelo de linguagem (LLM) - Provider: {provider}, Model: {model}")
-            llm = get_llm(provider=provider, model=model, **kwargs)
-            logger.info(f"Modelo de linguagem inicializado com sucesso")
-            return llm
+            logger.info(f"Obtendo modelo de linguagem (LLM) - Provider: {provider}, Model: {model}")
+            return LLM_POOL.get_llm(provider=provider, model=model, **kwargs)
         except Exception as e:
             logger.error(f"Erro ao inicializar o modelo de linguagem: {e}")
             raise
 
     @staticmethod
-    def create_qa_chain(llm, retriever) -> Any:
+    def build_prompt(
+            query: str,
+            documents: List[Document],
+            provider: LLMProvider = "openai",
+            model: str = "gpt-4o-mini",
+            max_context_tokens: Optional[int] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Monta o prompt final inserindo no TEMPLATE o contexto empacotado pelo ContextBuilder:
+        chunks sobrepostos do mesmo documento unidos, quase duplicados removidos e passagens
+        adicionadas em ordem de relevância até o orçamento de tokens do modelo de destino.
+
+        Args:
+            query: Pergunta do usuário
+            documents: Documentos recuperados, em ordem de relevância
+            provider: Provedor do LLM (define a contagem de tokens)
+            model: Modelo do LLM
+            max_context_tokens: Orçamento de tokens do contexto (padrão: CONTEXT_MAX_TOKENS)
+
+        Returns:
+            Tupla (prompt, empacotamento: documents usados, prompt_tokens, context_tokens,
+            merged, duplicates e omitted)
+        """
+        count_tokens = get_token_counter(provider, model)
+        builder = ContextBuilder(count_tokens) if max_context_tokens is None \
+            else ContextBuilder(count_tokens, max_tokens=max_context_tokens)
+        packed = builder.build(documents)
+        prompt = QA_PROMPT.format(context=packed.pop("context"), input=query)
+        packed["prompt_tokens"] = count_tokens(prompt)
+        logger.info(
+            f"Contexto: {len(packed['documents'])} passagem(ns), {packed['context_tokens']} tokens "
+            f"({packed['merged']} união(ões), {packed['duplicates']} duplicada(s), {packed['omitted']} fora do orçamento); "
+            f"prompt com {packed['prompt_tokens']} tokens"
+        )
+        return prompt, packed
+
+    @staticmethod
+    def create_qa_chain(llm) -> Any:
         """
-        Cria uma cadeia de processamento RAG para perguntas e respostas.
+        Cria a cadeia de geração que recebe o prompt já montado e devolve a resposta em texto.
+
+        A recuperação não faz parte da cadeia: os documentos são buscados uma única vez
+        em process_query e injetados no prompt por build_prompt, que limita o contexto
+        a um orçamento de tokens.
 
         Args:
             llm: Modelo de linguagem inicializado
-            retriever: Retriever configurado para busca de documentos
 
         Returns:
-            Cadeia de processamento RAG para perguntas e respostas
+            Cadeia de geração (LLM + parser de saída)
 
         Raises:
             Exception: Se ocorrer um erro ao configurar a cadeia
         """
         try:
             logger.info("Configurando cadeia de processamento RAG")
-
-            document_chain_prompt = PromptTemplate(
-                input_variables=["context", "input"],
-                template=TEMPLATE,
-            )
-            combine_docs_chain = create_stuff_documents_chain(llm, document_chain_prompt)
-            qa_chain = create_retrieval_chain(retriever, combine_docs_chain)
-
+            qa_chain = llm | StrOutputParser()
             logger.info("Cadeia de processamento RAG configurada com sucesso")
             return qa_chain
         except Exception as e:
             logger.error(f"Erro ao configurar cadeia de processamento RAG: {e}")
             raise
 
+    @staticmethod
+    def get_qa_chain(provider: LLMProvider = "openai", model: str = "gpt-4o-mini", **kwargs) -> Any:
+        """
+        Retorna a cadeia de geração compilada para o provedor/modelo/parâmetros informados,
+        reaproveitando o cliente LLM e a cadeia mantidos no LLM_POOL.
+        """
+        try:
+            _, qa_chain = LLM_POOL.get_chain(
+                provider=provider, model=model, chain_factory=QueryService.create_qa_chain, **kwargs
+            )
+            return qa_chain
+        except Exception as e:
+            logger.error(f"Erro ao obter a cadeia de geração do pool de LLMs: {e}")
+            raise
+
+    @staticmethod
+    async def embed_query(query: str, timings: Dict[str, float]) -> List[float]:
+        """
+        Gera o embedding da consulta, registrando o tempo da etapa "embed".
+        """
+        start = time.perf_counter()
+        embedding = await EMBEDDING_MODEL.aembed_query(query)
+        timings["embed"] = _elapsed_ms(start)
+        return embedding
+
+    @staticmethod
+    async def retrieve(
+            query: str,
+            search_type: str = 'similarity',
+            search_k: int = 5,
+            embedding: Optional[List[float]] = None,
+            timings: Optional[Dict[str, float]] = None,
+            nprobe: Optional[int] = None,
+            ef_search: Optional[int] = None,
+            rerank: bool = False,
+            filters: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[Document], Dict[str, float]]:
+        """
+        Executa a recuperação (embedding da consulta + busca no FAISS) uma única vez.
+
+        Com rerank, busca RERANK_CANDIDATES candidatos e mantém os search_k melhores segundo
+        o cross-encoder (ou os search_k primeiros da busca, se o orçamento de tempo estourar).
+
+        Com filtros, a busca (vetorial e BM25) considera apenas os documentos que os satisfazem:
+        a máscara de posições vem dos índices de metadados e é aplicada dentro do FAISS.
+
+        Args:
+            embedding: Embedding da consulta já calculado; se None, é gerado aqui
+            timings: Dicionário de tempos a ser completado (criado se None)
+            nprobe: Listas IVF visitadas na busca (apenas índices IVF)
+            ef_search: Tamanho da fila de candidatos do HNSW (apenas índices HNSW)
+            rerank: Se True, re-ranqueia os candidatos com o cross-encoder
+            filters: Filtros de metadados (source_docs, file_types, ingested_after e
+                ingested_before, em epoch), combinados com E
+
+        Returns:
+            Tupla com os documentos recuperados e os tempos (ms) das etapas "embed", "search" e "rerank"
+        """
+        timings = {} if timings is None else timings
+        snapshot = QueryService.load_snapshot()
+
+        if embedding is None:
+            embedding = await QueryService.embed_query(query, timings)
+
+        start = time.perf_counter()
+        selectors, lexical, allowed = snapshot.filter(**(filters or {}))
+        fetch_k = max(search_k, RERANK_CANDIDATES) if rerank else search_k
+        documents = await QueryService.search_documents(
+            snapshot.db, embedding, search_type=search_type, search_k=fetch_k,
+            nprobe=nprobe, ef_search=ef_search, selectors=selectors,
+            query=query, lexical=lexical, allowed=allowed
+        )
+        timings["search"] = _elapsed_ms(start)
+
+        if rerank:
+            start = time.perf_counter()
+            documents, rerank_info = await run_in_threadpool(RERANKER.rerank, query, documents, search_k)
+            timings["rerank"] = _elapsed_ms(start)
+            logger.info(f"Re-ranking: {rerank_info}")
+
+        RETRIEVED_DOCUMENTS_TOTAL.labels(search_type).inc(len(documents))
+
+        logger.info(f"Número de documentos recuperados: {len(documents)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            # Um registro por documento, formatado só se passar pela amostragem de DEBUG
+            for i, doc in enumerate(documents):
+                logger.debug(
+                    "Documento relevante %d | fonte: %s | trecho: %s...",
+                    i + 1, doc.metadata.get("source_doc", "Desconhecido"), doc.page_content[:250]
+                )
+
+        return documents, timings
+
+    @staticmethod
+    async def lookup_answer_cache(
+            query: str,
+            namespace: AnswerNamespace,
+            timings: Dict[str, float]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
+        """
+        Consulta o cache de respostas: primeiro pela consulta normalizada e, se não houver
+        resposta, pelo embedding da consulta (que é reaproveitado na recuperação).
+
+        Returns:
+            Tupla (resposta em cache ou None, embedding da consulta ou None se não foi necessário)
+        """
+        cached = ANSWER_CACHE.get_exact(query, namespace)
+        if cached:
+            logger.info("Resposta encontrada no cache (consulta idêntica).")
+            return cached, None
+
+        embedding = await QueryService.embed_query(query, timings)
+        cached = ANSWER_CACHE.get_similar(embedding, namespace)
+        if cached:
+            logger.info("Resposta encontrada no cache (consulta semelhante).")
+        return cached, embedding
+
+    @staticmethod
+    def extract_sources(documents: List[Document]) -> List[str]:
+        """
+        Retorna a lista (sem repetições, na ordem de relevância) dos documentos de origem.
+        """
+        sources = []
+        for doc in documents:
+            source = doc.metadata.get("source_doc", "Desconhecido")
+            if source not in sources:
+                sources.append(source)
+        return sources
+
     @staticmethod
     async def process_query(
             query: str,
@@ -109,72 +447,392 @@ class QueryService:
             provider: LLMProvider = "openai", # Certifique-se que LLMProvider está definido
             model: str = "gpt-4o-mini",
             temperature: float = 0.7,
-            max_tokens: int = 4096
+            max_tokens: int = 4096,
+            nprobe: Optional[int] = None,
+            ef_search: Optional[int] = None,
+            rerank: bool = False,
+            max_context_tokens: Optional[int] = None,
+            filters: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         try:
             logger.info(f"Processando consulta: '{query}' com search_type='{search_type}', k={search_k}, modelo {provider}/{model}")
+            request_start = time.perf_counter()
+
+            timings: Dict[str, float] = {}
 
-            vectorstore_instance, retriever = QueryService.load_vectorstore(
-                search_type=search_type, 
-                search_k=search_k
+            namespace = AnswerCache.make_namespace(
+                provider, model, search_type, search_k, VectorstoreService.get_index_version(), rerank, filters,
+                nprobe, ef_search, max_context_tokens, temperature, max_tokens
             )
+            cached, embedding = await QueryService.lookup_answer_cache(query, namespace, timings)
+            if cached:
+                timings["total"] = _elapsed_ms(request_start)
+                _record_query("query", provider, model, timings, cache=cached["cache"])
+                return {**cached, "timings": timings}
 
-            # Logar documentos recuperados (MUITO ÚTIL PARA DEBUG)
-            if retriever:
-                logger.info(f"Recuperando documentos relevantes para a query: '{query}' usando search_type='{search_type}', k={search_k}")
-                retrieved_docs = await retriever.aget_relevant_documents(query) # Use aget_ para async
-                logger.info(f"Número de documentos recuperados: {len(retrieved_docs)}")
-                for i, doc in enumerate(retrieved_docs):
-                    logger.debug(f"--- Documento Relevante {i + 1} ---")
-                    logger.debug(f"Fonte: {doc.metadata.get('source_doc', 'Desconhecido')}")
-                    # Logue um trecho do conteúdo para não poluir demais os logs
-                    logger.debug(f"Conteúdo (snippet): {doc.page_content[:250]}...") 
-            else:
-                logger.warning("Retriever não está disponível. A consulta será feita sem contexto de RAG.")
+            documents, _ = await QueryService.retrieve(
+                query, search_type=search_type, search_k=search_k, embedding=embedding, timings=timings,
+                nprobe=nprobe, ef_search=ef_search, rerank=rerank, filters=filters
+            )
 
+            start = time.perf_counter()
+            prompt, packed = QueryService.build_prompt(query, documents, provider, model, max_context_tokens)
+            documents = packed["documents"]
+            timings["prompt"] = _elapsed_ms(start)
 
             llm_kwargs = {
                 "temperature": temperature,
                 "max_tokens": max_tokens
             }
-            llm = QueryService.initialize_llm(provider, model, **llm_kwargs)
-            qa_chain = QueryService.create_qa_chain(llm, retriever)
+            qa_chain = QueryService.get_qa_chain(provider, model, **llm_kwargs)
 
             logger.info("Gerando resposta com qa_chain.ainvoke...")
-            result = await qa_chain.ainvoke({"input": query})
-
-            # ----> LOG CRÍTICO AQUI <----
-            logger.info(f"Resultado COMPLETO da qa_chain.ainvoke: {result}") 
+            start = time.perf_counter()
+            answer_from_chain = await qa_chain.ainvoke(prompt)
+            timings["llm"] = _elapsed_ms(start)
+            timings["total"] = _elapsed_ms(request_start)
 
-            logger.info("Resposta (supostamente) gerada com sucesso pela qa_chain.")
-
-            sources = []
-            if result and result.get("context"): # Adiciona verificação se result existe
-                for doc in result.get("context", []):
-                    source = doc.metadata.get("source_doc", "Desconhecido")
-                    if source not in sources:
-                        sources.append(source)
-
-            # Pega o valor de "answer" do resultado da chain.
-            # Se "answer" não existir ou for None, o default será usado.
-            answer_from_chain = result.get("answer") if result else None # Verifica se result não é None
+            logger.info(f"Tempos por etapa (ms): {timings}")
 
             if not answer_from_chain:
-                logger.warning(f"A chave 'answer' está faltando ou é nula no resultado da qa_chain. Resultado: {result}")
+                logger.warning("A resposta da qa_chain está vazia.")
                 # Define a resposta padrão se não houver resposta da chain.
                 final_answer = "Não foi possível obter uma resposta específica da LLM para esta consulta."
             else:
                 final_answer = answer_from_chain
 
+            sources = QueryService.extract_sources(documents)
+            if answer_from_chain:
+                ANSWER_CACHE.put(query, embedding, namespace, final_answer, sources)
+            _record_query("query", provider, model, timings, prompt_tokens=packed["prompt_tokens"])
+
             return {
                 "answer": final_answer,
-                "sources": sources
+                "sources": sources,
+                "cache": None,
+                "timings": timings,
+                "prompt_tokens": packed["prompt_tokens"]
             }
         except ValueError as ve:
             logger.error(f"Erro de valor ao processar consulta (ex: vectorstore não carregado): {ve}")
+            QUERY_ERRORS_TOTAL.labels("query", "503").inc()
             raise HTTPException(status_code=503, detail=str(ve))
         except Exception as e:
             logger.error(f"Erro ao processar consulta: {e}", exc_info=True) # Adiciona exc_info para traceback completo
             if not isinstance(e, HTTPException):
+                QUERY_ERRORS_TOTAL.labels("query", "500").inc()
                 raise HTTPException(status_code=500, detail=f"Erro interno ao processar consulta: {str(e)}")
+            QUERY_ERRORS_TOTAL.labels("query", str(e.status_code)).inc()
             raise
+
+    @staticmethod
+    async def _answer_batch_item(
+            params: Dict[str, Any],
+            documents: List[Document],
+            embedding: List[float],
+            namespace: AnswerNamespace,
+            semaphore: asyncio.Semaphore
+    ) -> Dict[str, Any]:
+        """
+        Re-ranking, montagem do prompt e geração da resposta de uma consulta do lote. A chamada
+        ao LLM espera uma vaga no semáforo do lote e a vez no limite de taxa do provedor.
+        """
+        query = params["query"]
+        timings: Dict[str, float] = {}
+
+        if params["rerank"]:
+            start = time.perf_counter()
+            documents, _ = await run_in_threadpool(RERANKER.rerank, query, documents, params["search_k"])
+            timings["rerank"] = _elapsed_ms(start)
+
+        start = time.perf_counter()
+        prompt, packed = QueryService.build_prompt(
+            query, documents, params["provider"], params["model"], params["max_context_tokens"]
+        )
+        timings["prompt"] = _elapsed_ms(start)
+
+        qa_chain = QueryService.get_qa_chain(
+            params["provider"], params["model"], temperature=params["temperature"], max_tokens=params["max_tokens"]
+        )
+        async with semaphore:
+            start = time.perf_counter()
+            await LLM_RATE_LIMITER.acquire(params["provider"])
+            timings["rate_limit_wait"] = _elapsed_ms(start)
+            start = time.perf_counter()
+            answer = await qa_chain.ainvoke(prompt)
+            timings["llm"] = _elapsed_ms(start)
+
+        sources = QueryService.extract_sources(packed["documents"])
+        if answer:
+            ANSWER_CACHE.put(query, embedding, namespace, answer, sources)
+        else:
+            answer = "Não foi possível obter uma resposta específica da LLM para esta consulta."
+        _record_query("batch", params["provider"], params["model"], timings, prompt_tokens=packed["prompt_tokens"])
+        return {
+            "answer": answer,
+            "sources": sources,
+            "cache": None,
+            "timings": timings,
+            "prompt_tokens": packed["prompt_tokens"]
+        }
+
+    @staticmethod
+    async def process_batch(
+            items: List[Dict[str, Any]],
+            concurrency: int = BATCH_LLM_CONCURRENCY
+    ) -> Dict[str, Any]:
+        """
+        Processa um lote de consultas compartilhando as etapas de recuperação:
+          - os embeddings das consultas fora do cache são gerados em uma única chamada ao modelo;
+          - as consultas com os mesmos filtros e parâmetros de busca (nprobe, ef_search) são
+            buscadas juntas, em uma única chamada a index.search sobre a matriz de embeddings;
+          - as chamadas ao LLM são feitas concorrentemente, no máximo `concurrency` por vez e
+            respeitando o limite de taxa de cada provedor (requests_per_minute em LLM_CONFIGS).
+
+        Um erro em uma consulta (ex: falha do provedor) não interrompe as demais.
+
+        Args:
+            items: Consultas, cada uma com "query" e, opcionalmente, os demais argumentos de
+                process_query (padrões em BATCH_QUERY_DEFAULTS)
+            concurrency: Chamadas ao LLM em andamento ao mesmo tempo
+
+        Returns:
+            Dicionário com results (na ordem de items, cada um com answer, sources, cache,
+            timings e prompt_tokens, ou apenas error) e timings do lote (embed, search, total)
+
+        Raises:
+            HTTPException: 503 se o vectorstore não estiver carregado
+        """
+        batch_start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        logger.info(f"Processando lote de {len(items)} consulta(s)")
+
+        try:
+            snapshot = QueryService.load_snapshot()
+        except ValueError as ve:
+            QUERY_ERRORS_TOTAL.labels("batch", "503").inc()
+            raise HTTPException(status_code=503, detail=str(ve))
+
+        index_version = VectorstoreService.get_index_version()
+        params_list = [{**BATCH_QUERY_DEFAULTS, **item} for item in items]
+        namespaces = [
+            AnswerCache.make_namespace(
+                params["provider"], params["model"], params["search_type"], params["search_k"],
+                index_version, params["rerank"], params["filters"],
+                params["nprobe"], params["ef_search"], params["max_context_tokens"],
+                params["temperature"], params["max_tokens"]
+            )
+            for params in params_list
+        ]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+
+        for i, params in enumerate(params_list):
+            cached = ANSWER_CACHE.get_exact(params["query"], namespaces[i])
+            if cached:
+                results[i] = {**cached, "timings": {}}
+                _record_query("batch", params["provider"], params["model"], {}, cache=cached["cache"])
+
+        # Uma única chamada ao modelo de embeddings para todas as consultas restantes
+        pending = [i for i, result in enumerate(results) if result is None]
+        embeddings: Dict[int, List[float]] = {}
+        if pending:
+            start = time.perf_counter()
+            vectors = await EMBEDDING_MODEL.aembed_queries([params_list[i]["query"] for i in pending])
+            embeddings = dict(zip(pending, vectors))
+            timings["embed"] = _elapsed_ms(start)
+
+        groups: Dict[Tuple, List[int]] = {}
+        for i in pending:
+            params = params_list[i]
+            cached = ANSWER_CACHE.get_similar(embeddings[i], namespaces[i])
+            if cached:
+                results[i] = {**cached, "timings": {}}
+                _record_query("batch", params["provider"], params["model"], {}, cache=cached["cache"])
+                continue
+            key = (freeze_filters(params["filters"]), params["nprobe"], params["ef_search"])
+            groups.setdefault(key, []).append(i)
+
+        # Uma busca no FAISS por grupo de consultas com os mesmos filtros e parâmetros de busca
+        documents: Dict[int, List[Document]] = {}
+        start = time.perf_counter()
+        for indices in groups.values():
+            first = params_list[indices[0]]
+            try:
+                selectors, lexical, allowed = snapshot.filter(**(first["filters"] or {}))
+                searches = []
+                for i in indices:
+                    params = params_list[i]
+                    fetch_k = max(params["search_k"], RERANK_CANDIDATES) if params["rerank"] else params["search_k"]
+                    searches.append((params["search_type"], fetch_k, params["query"]))
+                found = await run_in_threadpool(
+                    QueryService.search_batch, snapshot.db, [embeddings[i] for i in indices], searches,
+                    first["nprobe"], first["ef_search"], selectors, lexical, allowed
+                )
+                documents.update(zip(indices, found))
+                for i, docs in zip(indices, found):
+                    RETRIEVED_DOCUMENTS_TOTAL.labels(params_list[i]["search_type"]).inc(len(docs))
+            except Exception as e:
+                logger.error(f"Erro na busca em lote: {e}", exc_info=True)
+                for i in indices:
+                    results[i] = {"error": f"Erro na busca: {str(e)}"}
+        if groups:
+            timings["search"] = _elapsed_ms(start)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        answering = list(documents)
+        answers = await asyncio.gather(
+            *(
+                QueryService._answer_batch_item(
+                    params_list[i], documents[i], embeddings[i], namespaces[i], semaphore
+                )
+                for i in answering
+            ),
+            return_exceptions=True
+        )
+        for i, answer in zip(answering, answers):
+            if isinstance(answer, BaseException):
+                logger.error(f"Erro ao gerar a resposta da consulta {i} do lote: {answer}")
+                results[i] = {"error": f"Erro ao gerar a resposta: {str(answer)}"}
+            else:
+                results[i] = answer
+
+        timings["total"] = _elapsed_ms(batch_start)
+        errors = sum(1 for result in results if "error" in result)
+        if errors:
+            QUERY_ERRORS_TOTAL.labels("batch", "item").inc(errors)
+        observe_stages(BATCH_STAGE_SECONDS, timings)
+        logger.info(f"Lote de {len(items)} consulta(s) concluído ({errors} com erro). Tempos (ms): {timings}")
+        return {"results": results, "timings": timings}
+
+    @staticmethod
+    async def stream_query(
+            query: str,
+            search_type: str = 'similarity',
+            search_k: int = 5,
+            provider: LLMProvider = "openai",
+            model: str = "gpt-4o-mini",
+            temperature: float = 0.7,
+            max_tokens: int = 4096,
+            nprobe: Optional[int] = None,
+            ef_search: Optional[int] = None,
+            rerank: bool = False,
+            max_context_tokens: Optional[int] = None,
+            filters: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Executa a recuperação e prepara a geração em streaming da resposta.
+
+        Os erros de recuperação (ex: vectorstore não carregado) são levantados aqui, como
+        HTTPException, antes que qualquer byte da resposta seja enviado ao cliente.
+
+        Returns:
+            Gerador assíncrono de eventos (nome, dados): "sources", vários "token" e "done"
+            (ou "error" se a geração falhar no meio do caminho)
+        """
+        try:
+            logger.info(f"Processando consulta em streaming: '{query}' com search_type='{search_type}', k={search_k}, modelo {provider}/{model}")
+            request_start = time.perf_counter()
+
+            timings: Dict[str, float] = {}
+
+            namespace = AnswerCache.make_namespace(
+                provider, model, search_type, search_k, VectorstoreService.get_index_version(), rerank, filters,
+                nprobe, ef_search, max_context_tokens, temperature, max_tokens
+            )
+            cached, embedding = await QueryService.lookup_answer_cache(query, namespace, timings)
+            if cached:
+                return QueryService._stream_cached_events(cached, timings, request_start, provider, model)
+
+            documents, _ = await QueryService.retrieve(
+                query, search_type=search_type, search_k=search_k, embedding=embedding, timings=timings,
+                nprobe=nprobe, ef_search=ef_search, rerank=rerank, filters=filters
+            )
+
+            start = time.perf_counter()
+            prompt, packed = QueryService.build_prompt(query, documents, provider, model, max_context_tokens)
+            documents = packed["documents"]
+            timings["prompt"] = _elapsed_ms(start)
+
+            qa_chain = QueryService.get_qa_chain(
+                provider, model, temperature=temperature, max_tokens=max_tokens
+            )
+        except ValueError as ve:
+            logger.error(f"Erro de valor ao processar consulta (ex: vectorstore não carregado): {ve}")
+            QUERY_ERRORS_TOTAL.labels("stream", "503").inc()
+            raise HTTPException(status_code=503, detail=str(ve))
+        except Exception as e:
+            logger.error(f"Erro ao processar consulta: {e}", exc_info=True)
+            QUERY_ERRORS_TOTAL.labels("stream", "500").inc()
+            raise HTTPException(status_code=500, detail=f"Erro interno ao processar consulta: {str(e)}")
+
+        cache_context = {"query": query, "embedding": embedding, "namespace": namespace, "provider": provider, "model": model}
+        return QueryService._stream_events(
+            qa_chain, prompt, documents, timings, request_start, cache_context, packed["prompt_tokens"]
+        )
+
+    @staticmethod
+    async def _stream_events(
+            qa_chain: Any,
+            prompt: str,
+            documents: List[Document],
+            timings: Dict[str, float],
+            request_start: float,
+            cache_context: Dict[str, Any],
+            prompt_tokens: Optional[int] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Emite as fontes recuperadas e, em seguida, os tokens gerados por qa_chain.astream.
+
+        Se o consumidor fechar o gerador (ex: cliente desconectado), o astream é encerrado
+        junto e a geração no provedor é cancelada. Apenas respostas completas vão para o cache.
+        """
+        sources = QueryService.extract_sources(documents)
+        yield "sources", {"sources": sources}
+
+        answer_parts = []
+        start = time.perf_counter()
+        try:
+            async for chunk in qa_chain.astream(prompt):
+                if not chunk:
+                    continue
+                if "first_token" not in timings:
+                    timings["first_token"] = _elapsed_ms(start)
+                answer_parts.append(chunk)
+                yield "token", {"text": chunk}
+        except Exception as e:
+            logger.error(f"Erro durante a geração em streaming: {e}", exc_info=True)
+            QUERY_ERRORS_TOTAL.labels("stream", "generation").inc()
+            yield "error", {"detail": f"Erro interno ao gerar a resposta: {str(e)}"}
+            return
+
+        timings["llm"] = _elapsed_ms(start)
+        timings["total"] = _elapsed_ms(request_start)
+        logger.info(f"Tempos por etapa (ms): {timings}")
+
+        if answer_parts:
+            ANSWER_CACHE.put(
+                cache_context["query"], cache_context["embedding"], cache_context["namespace"],
+                "".join(answer_parts), sources
+            )
+        _record_query(
+            "stream", cache_context["provider"], cache_context["model"], timings, prompt_tokens=prompt_tokens
+        )
+
+        yield "done", {"timings": timings, "prompt_tokens": prompt_tokens}
+
+    @staticmethod
+    async def _stream_cached_events(
+            cached: Dict[str, Any],
+            timings: Dict[str, float],
+            request_start: float,
+            provider: str,
+            model: str
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Emite uma resposta vinda do cache no mesmo formato de eventos do streaming.
+        """
+        yield "sources", {"sources": cached["sources"]}
+        yield "token", {"text": cached["answer"]}
+        timings["total"] = _elapsed_ms(request_start)
+        _record_query("stream", provider, model, timings, cache=cached["cache"])
+        yield "done", {"timings": timings, "cache": cached["cache"]}
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Dict, Optional
+
+from app.core.config.llm import LLM_CONFIGS
+from app.core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncRateLimiter:
+    """
+    Limita a taxa de chamadas espaçando-as uniformemente (intervalo mínimo de 60 / rpm segundos).
+
+    Cada acquire reserva o próximo horário livre e aguarda até ele; como a reserva não tem
+    await, é atômica no event loop e dispensa locks.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = 0.0
+
+    async def acquire(self) -> float:
+        """
+        Aguarda a vez da chamada.
+
+        Returns:
+            Tempo (s) aguardado
+        """
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        wait = slot - now
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class ProviderRateLimiter:
+    """
+    Um AsyncRateLimiter por provedor de LLM, com o limite "requests_per_minute" de LLM_CONFIGS
+    (provedores sem limite não esperam).
+    """
+
+    def __init__(self):
+        self._limiters: Dict[str, Optional[AsyncRateLimiter]] = {}
+
+    def _get(self, provider: str) -> Optional[AsyncRateLimiter]:
+        if provider not in self._limiters:
+            rpm = LLM_CONFIGS.get(provider, {}).get("requests_per_minute")
+            self._limiters[provider] = AsyncRateLimiter(rpm) if rpm else None
+        return self._limiters[provider]
+
+    async def acquire(self, provider: str) -> float:
+        limiter = self._get(provider)
+        if limiter is None:
+            return 0.0
+        wait = await limiter.acquire()
+        if wait > 0:
+            logger.debug(f"Chamada ao provedor '{provider}' aguardou {wait:.2f}s pelo limite de taxa.")
+        return wait
+
+
+LLM_RATE_LIMITER = ProviderRateLimiter()
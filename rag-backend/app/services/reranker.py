@@ -0,0 +1,208 @@
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.utils.logger import get_logger
+from app.services.answer_cache import normalize_query
+from app.services.ingest_registry import chunk_hash
+
+logger = get_logger(__name__)
+
+# Cross-encoder multilíngue pequeno (MiniLM, 12 camadas, 384 dimensões), executado em CPU
+RERANK_MODEL_NAME = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+# Candidatos buscados no FAISS para o re-ranking (no mínimo search_k)
+RERANK_CANDIDATES = 20
+# Pares (consulta, chunk) avaliados por chamada ao modelo
+RERANK_BATCH_SIZE = 8
+# Tokens máximos de cada par; o restante do chunk é truncado
+RERANK_MAX_LENGTH = 512
+# Tempo máximo de re-ranking por requisição; se estourar, vale a ordem da busca vetorial
+RERANK_LATENCY_BUDGET_MS = 400
+# Número máximo de pontuações (consulta, chunk) mantidas em memória (LRU)
+RERANK_CACHE_SIZE = 50_000
+# Threads do torch usadas pelo cross-encoder; todas as requisições compartilham uma única thread
+# de execução do modelo, então este é o limite de núcleos ocupados pelo re-ranking no processo
+RERANK_TORCH_THREADS = 2
+# Lotes aguardando ou em execução no cross-encoder, somando todas as requisições; acima disso a
+# requisição espera uma vaga até o fim do seu orçamento e então usa a ordem da busca vetorial
+RERANK_MAX_PENDING_BATCHES = 4
+
+
+class CrossEncoderReranker:
+    """
+    Segunda etapa da recuperação: reordena os candidatos da busca vetorial com um cross-encoder,
+    que avalia a consulta e o chunk em conjunto, e mantém apenas os k melhores.
+
+    O custo em CPU é limitado de quatro formas:
+      - o modelo roda em uma única thread dedicada, com RERANK_TORCH_THREADS threads do torch,
+        e no máximo RERANK_MAX_PENDING_BATCHES lotes (de todas as requisições) aguardam por ela;
+      - os pares são avaliados em lotes pequenos (RERANK_BATCH_SIZE);
+      - a espera por uma vaga e por cada lote é limitada ao que resta do orçamento da requisição,
+        e o tempo gasto é verificado após cada lote; se ele for excedido, os candidatos voltam na
+        ordem da busca vetorial (um lote já iniciado termina na thread do modelo e fica em cache);
+      - as pontuações ficam em cache por (consulta normalizada, id do chunk), e os ids dos
+        chunks não mudam entre versões do índice, então o cache sobrevive a novas ingestões.
+    """
+
+    def __init__(
+        self,
+        model_name: str = RERANK_MODEL_NAME,
+        batch_size: int = RERANK_BATCH_SIZE,
+        max_length: int = RERANK_MAX_LENGTH,
+        latency_budget_ms: float = RERANK_LATENCY_BUDGET_MS,
+        cache_size: int = RERANK_CACHE_SIZE,
+        torch_threads: int = RERANK_TORCH_THREADS,
+        max_pending_batches: int = RERANK_MAX_PENDING_BATCHES,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.latency_budget_ms = latency_budget_ms
+        self.cache_size = cache_size
+        self.torch_threads = torch_threads
+
+        self._model: Any = None
+        self._model_lock = threading.Lock()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max(1, max_pending_batches))
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"reranked": 0, "fallbacks": 0, "pairs_scored": 0, "cache_hits": 0}
+
+    def _get_model(self) -> Any:
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+
+                    logger.info(f"Carregando cross-encoder de re-ranking: {self.model_name}")
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+        return self._model
+
+    def _init_thread(self) -> None:
+        import torch
+
+        torch.set_num_threads(self.torch_threads)
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        with self._model_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="rerank", initializer=self._init_thread
+                )
+            return self._executor
+
+    def _predict(self, model: Any, query: str, query_key: str, documents: List[Document],
+                 chunk_keys: List[str], batch: List[int]) -> Dict[str, float]:
+        # Executado na thread do modelo; libera a vaga mesmo que a requisição já tenha desistido
+        try:
+            batch_scores = model.predict(
+                [(query, documents[i].page_content) for i in batch],
+                batch_size=len(batch), show_progress_bar=False,
+            )
+            new_scores = {chunk_keys[i]: float(score) for i, score in zip(batch, batch_scores)}
+            # Pontuações já calculadas ficam em cache mesmo que o orçamento da requisição estoure
+            self._store(query_key, new_scores)
+            return new_scores
+        finally:
+            self._slots.release()
+
+    def _cached_scores(self, query_key: str, chunk_keys: List[str]) -> Dict[str, float]:
+        scores = {}
+        with self._lock:
+            for chunk_key in chunk_keys:
+                score = self._cache.get((query_key, chunk_key))
+                if score is not None:
+                    self._cache.move_to_end((query_key, chunk_key))
+                    scores[chunk_key] = score
+            self._stats["cache_hits"] += len(scores)
+        return scores
+
+    def _store(self, query_key: str, scores: Dict[str, float]) -> None:
+        with self._lock:
+            for chunk_key, score in scores.items():
+                self._cache[(query_key, chunk_key)] = score
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self._stats["pairs_scored"] += len(scores)
+
+    def _fallback(self, documents: List[Document], k: int, reason: str) -> Tuple[List[Document], Dict[str, Any]]:
+        with self._lock:
+            self._stats["fallbacks"] += 1
+        logger.warning(f"Re-ranking ignorado ({reason}); usando a ordem da busca vetorial.")
+        return documents[:k], {"reranked": False, "reason": reason}
+
+    def rerank(
+        self,
+        query: str,
+        documents: List[Document],
+        k: int,
+        latency_budget_ms: Optional[float] = None,
+    ) -> Tuple[List[Document], Dict[str, Any]]:
+        """
+        Reordena os documentos pela pontuação do cross-encoder e retorna os k melhores.
+
+        Args:
+            query: Pergunta do usuário
+            documents: Candidatos na ordem da busca vetorial
+            k: Quantidade de documentos a manter
+            latency_budget_ms: Orçamento de tempo desta requisição (padrão: o do reranker)
+
+        Returns:
+            Tupla (documentos, informações: reranked, cached, scored e, no fallback, reason)
+        """
+        if len(documents) <= 1:
+            return documents[:k], {"reranked": False, "reason": "poucos candidatos"}
+
+        budget = self.latency_budget_ms if latency_budget_ms is None else latency_budget_ms
+        query_key = normalize_query(query)
+        chunk_keys = [doc.id or chunk_hash(doc.page_content) for doc in documents]
+        scores = self._cached_scores(query_key, chunk_keys)
+        cached = len(scores)
+        pending = [i for i, chunk_key in enumerate(chunk_keys) if chunk_key not in scores]
+
+        if pending:
+            try:
+                model = self._get_model()
+            except Exception as e:
+                logger.error(f"Erro ao carregar o cross-encoder: {e}")
+                return self._fallback(documents, k, "modelo indisponível")
+
+            # O carregamento do modelo (apenas na primeira vez) não conta no orçamento
+            executor = self._get_executor()
+            exceeded = f"orçamento de {budget:.0f} ms excedido"
+            start = time.perf_counter()
+            for batch_start in range(0, len(pending), self.batch_size):
+                remaining = budget / 1000 - (time.perf_counter() - start)
+                if remaining <= 0:
+                    return self._fallback(documents, k, exceeded)
+                if not self._slots.acquire(timeout=remaining):
+                    return self._fallback(documents, k, "cross-encoder ocupado")
+                batch = pending[batch_start:batch_start + self.batch_size]
+                try:
+                    future = executor.submit(self._predict, model, query, query_key, documents, chunk_keys, batch)
+                except Exception:
+                    self._slots.release()
+                    raise
+                try:
+                    scores.update(future.result(timeout=max(0.0, budget / 1000 - (time.perf_counter() - start))))
+                except concurrent.futures.TimeoutError:
+                    return self._fallback(documents, k, exceeded)
+                if (time.perf_counter() - start) * 1000 > budget:
+                    return self._fallback(documents, k, exceeded)
+
+        order = sorted(range(len(documents)), key=lambda i: scores[chunk_keys[i]], reverse=True)
+        with self._lock:
+            self._stats["reranked"] += 1
+        return [documents[i] for i in order[:k]], {"reranked": True, "cached": cached, "scored": len(pending)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "size": len(self._cache), "max_size": self.cache_size}
+
+
+RERANKER = CrossEncoderReranker()
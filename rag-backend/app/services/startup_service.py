@@ -0,0 +1,125 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.core.config.ingest import STARTUP_DATA_DIR, STARTUP_RETRY_AFTER_SECONDS
+from app.core.utils.logger import get_logger
+from app.services.ingest_service import IngestService
+from app.services.vectorstore_service import VectorstoreService
+from app.services.warmup import WarmupService
+
+logger = get_logger(__name__)
+
+# Fases da inicialização, na ordem
+PHASE_STARTING = "starting"
+PHASE_LOADING = "loading"
+PHASE_INGESTING = "ingesting"
+PHASE_WARMING_UP = "warming_up"
+PHASE_READY = "ready"
+PHASE_FAILED = "failed"
+
+
+class StartupService:
+    """
+    Inicialização do índice em background.
+
+    O servidor passa a aceitar conexões imediatamente; uma thread carrega o índice existente
+    (ou, se não houver, ingere o diretório de dados do zero, acompanhando o andamento) e em
+    seguida executa o aquecimento. Até a fase "ready", /health/ready responde 503 e as
+    consultas recebem 503 com Retry-After, sem esperar pela ingestão.
+    """
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _state: Dict[str, Any] = {
+        "phase": PHASE_STARTING,
+        "progress": None,
+        "started_at": None,
+        "ready_at": None,
+        "error": None,
+    }
+
+    @classmethod
+    def _update(cls, **changes: Any) -> None:
+        with cls._lock:
+            cls._state = {**cls._state, **changes}
+
+    @classmethod
+    def start(cls) -> None:
+        """
+        Dispara a inicialização em uma thread (chamado no evento de startup da aplicação).
+        """
+        with cls._lock:
+            if cls._thread is not None:
+                return
+            cls._state = {**cls._state, "phase": PHASE_STARTING, "started_at": time.time()}
+            cls._thread = threading.Thread(target=cls._run, name="startup-index", daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def _run(cls) -> None:
+        try:
+            if VectorstoreService.check_vectorstore_exists():
+                cls._update(phase=PHASE_LOADING)
+                VectorstoreService.load_vectorstore()
+                logger.info("Vectorstore carregado com sucesso a partir de local existente.")
+            else:
+                logger.warning("Vectorstore não encontrado. Iniciando ingestão de documentos em background...")
+                cls._update(phase=PHASE_INGESTING)
+                result = IngestService.ingest_documents(
+                    data_dir=STARTUP_DATA_DIR, clear_existing=True,
+                    progress=lambda progress: cls._update(progress=progress)
+                )
+                if result["status"] == "error" or not VectorstoreService.check_vectorstore_exists():
+                    raise RuntimeError(result["message"])
+                logger.info(f"Ingestão inicial concluída: {result['message']}")
+                VectorstoreService.load_vectorstore()
+
+            cls._update(phase=PHASE_WARMING_UP)
+            WarmupService.run()
+            cls._update(phase=PHASE_READY, ready_at=time.time())
+            logger.info("Inicialização do índice concluída. Pronto para consultas.")
+        except Exception as e:
+            logger.error(f"Falha crítica na inicialização do índice: {e}", exc_info=True)
+            cls._update(phase=PHASE_FAILED, error=str(e))
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        return cls._state["phase"] == PHASE_READY
+
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        """
+        Situação da inicialização: phase, progress (da ingestão inicial), started_at,
+        ready_at, error e warmup (tempos do aquecimento).
+        """
+        with cls._lock:
+            state = dict(cls._state)
+        state["warmup"] = WarmupService.timings()
+        return state
+
+    @classmethod
+    def ensure_ready(cls) -> None:
+        """
+        Dependência das rotas de consulta: responde 503 com Retry-After enquanto a
+        inicialização não termina.
+
+        Raises:
+            HTTPException: 503 se o índice ainda não estiver pronto
+        """
+        if cls.is_ready():
+            return
+        state = cls.status()
+        if state["phase"] == PHASE_FAILED:
+            # Sem índice inicial, ele pode surgir depois por upload (o primeiro vira a base) ou /ingest/sync
+            if VectorstoreService.check_vectorstore_exists():
+                return
+            detail = f"Índice indisponível: a inicialização falhou ({state['error']})."
+        else:
+            detail = f"Índice em inicialização (fase: {state['phase']}). Tente novamente em instantes."
+        raise HTTPException(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(STARTUP_RETRY_AFTER_SECONDS)}
+        )
@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import Field
+
+from app.core.config.llm import STUB_LLM_ANSWER_TOKENS, STUB_LLM_LATENCY_MS, STUB_LLM_TOKENS_PER_SECOND
+
+# Vocabulário das respostas sintéticas (cada palavra conta como um token)
+_WORDS = (
+    "o", "documento", "informa", "que", "o", "prazo", "para", "o", "pedido", "é", "de", "dias",
+    "conforme", "a", "norma", "vigente", "e", "o", "requerimento", "deve", "ser", "protocolado",
+)
+
+
+class StubLLM(LLM):
+    """
+    Provedor de LLM local e determinístico, para benchmarks e testes de carga sem custo de API.
+
+    A resposta depende apenas do prompt (mesmo prompt, mesma resposta) e é gerada como uma
+    chamada real: espera latency_ms até o primeiro token e emite os demais a
+    tokens_per_second, tanto no invoke quanto no streaming.
+    """
+    model: str = "stub-echo"
+    temperature: float = 0.0
+    max_tokens: int = 4096
+    latency_ms: float = Field(default_factory=lambda: STUB_LLM_LATENCY_MS)
+    tokens_per_second: float = Field(default_factory=lambda: STUB_LLM_TOKENS_PER_SECOND)
+    answer_tokens: int = Field(default_factory=lambda: STUB_LLM_ANSWER_TOKENS)
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _tokens(self, prompt: str) -> List[str]:
+        seed = int.from_bytes(hashlib.sha256(f"{self.model}:{prompt}".encode("utf-8")).digest()[:8], "big")
+        count = min(self.answer_tokens, self.max_tokens)
+        return [_WORDS[(seed >> (i % 56)) % len(_WORDS)] + " " for i in range(count)]
+
+    def _token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _call(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any
+    ) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    async def _acall(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any
+    ) -> str:
+        tokens = self._tokens(prompt)
+        await asyncio.sleep(self.latency_ms / 1000 + len(tokens) * self._token_delay())
+        return "".join(tokens)
+
+    def _stream(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[CallbackManagerForLLMRun] = None,
+            **kwargs: Any
+    ) -> Iterator[GenerationChunk]:
+        time.sleep(self.latency_ms / 1000)
+        for i, token in enumerate(self._tokens(prompt)):
+            if i:
+                time.sleep(self._token_delay())
+            yield GenerationChunk(text=token)
+
+    async def _astream(
+            self,
+            prompt: str,
+            stop: Optional[List[str]] = None,
+            run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+            **kwargs: Any
+    ) -> AsyncIterator[GenerationChunk]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        for i, token in enumerate(self._tokens(prompt)):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            yield GenerationChunk(text=token)
@@ -0,0 +1,541 @@
+import bisect
+import math
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+
+from app.core.config.ingest import (
+    VECTOR_INDEX_TYPE,
+    VECTOR_INDEX_PARAMS,
+    INDEX_TRAINING_SAMPLE_SIZE,
+    FILTER_EXACT_SEARCH_SELECTIVITY,
+    FILTER_EXACT_SEARCH_BATCH_SIZE,
+)
+from app.core.utils.logger import get_logger
+from app.services.docstore import index_map_doc_ids, index_map_positions
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+logger = get_logger(__name__)
+
+# Tipos de índice suportados e a string de fábrica do FAISS correspondente
+INDEX_FACTORY_STRINGS = {
+    "flat": "Flat",
+    "hnsw": "HNSW{hnsw_m}",
+    "ivf_flat": "IVF{nlist},Flat",
+    "ivf_pq": "IVF{nlist},PQ{pq_m}x{pq_nbits}",
+    "sq8": "SQ8",
+    "hnsw_sq8": "HNSW{hnsw_m},SQ8",
+    "ivf_sq8": "IVF{nlist},SQ8",
+}
+
+DEFAULT_INDEX_PARAMS = {
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64,
+    "nlist": 1024,
+    "nprobe": 16,
+    "pq_m": 48,
+    "pq_nbits": 8,
+}
+
+
+def resolve_index_params(index_type: str, n_vectors: int, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Combina os parâmetros padrão com os configurados e ajusta nlist ao tamanho do corpus
+    (o FAISS precisa de pelo menos ~39 vetores de treino por centróide).
+    """
+    resolved = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+    if index_type.startswith("ivf"):
+        max_nlist = max(1, n_vectors // 39)
+        resolved["nlist"] = max(1, min(resolved["nlist"], max_nlist, int(4 * math.sqrt(max(n_vectors, 1)))))
+    return resolved
+
+
+def build_index(
+    index_type: str,
+    vectors: np.ndarray,
+    params: Optional[Dict[str, Any]] = None,
+) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Cria (e treina, se necessário) um índice FAISS do tipo informado para os vetores dados.
+    Os vetores não são adicionados ao índice.
+
+    Args:
+        index_type: Um dos tipos de INDEX_FACTORY_STRINGS
+        vectors: Matriz (n, dim) float32 usada no treino
+        params: Parâmetros do índice (sobrescrevem DEFAULT_INDEX_PARAMS)
+
+    Returns:
+        Tupla (índice, parâmetros efetivamente usados)
+    """
+    if index_type not in INDEX_FACTORY_STRINGS:
+        raise ValueError(f"Tipo de índice não suportado: {index_type}")
+
+    n_vectors, dim = vectors.shape
+    resolved = resolve_index_params(index_type, n_vectors, params)
+
+    if index_type == "ivf_pq" and n_vectors < 2 ** resolved["pq_nbits"]:
+        logger.warning(
+            f"Poucos vetores ({n_vectors}) para treinar PQ com {resolved['pq_nbits']} bits. Usando índice 'flat'."
+        )
+        return build_index("flat", vectors, params)
+
+    factory_string = INDEX_FACTORY_STRINGS[index_type].format(**resolved)
+    index = faiss.index_factory(dim, factory_string, faiss.METRIC_L2)
+
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = resolved["ef_construction"]
+        index.hnsw.efSearch = resolved["ef_search"]
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = resolved["nprobe"]
+        # Permite reconstruir vetores (usado pelo MMR) a partir de índices IVF
+        ivf.set_direct_map_type(faiss.DirectMap.Array)
+
+    if not index.is_trained:
+        sample = vectors
+        if n_vectors > INDEX_TRAINING_SAMPLE_SIZE:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(n_vectors, INDEX_TRAINING_SAMPLE_SIZE, replace=False)]
+        logger.info(f"Treinando índice '{factory_string}' com {len(sample)} vetores...")
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+    return index, {"index_type": index_type, "factory_string": factory_string, **resolved}
+
+
+# Tipos de índice que não precisam de treino e podem receber vetores desde o primeiro lote
+_UNTRAINED_INDEX_TYPES = {"flat", "hnsw"}
+
+
+class StreamingIndexBuilder:
+    """
+    Constrói um índice FAISS a partir de lotes de vetores, sem manter o corpus inteiro em memória.
+
+    Índices sem treino (flat, hnsw) são criados no primeiro lote. Os demais acumulam apenas
+    a amostra de treino (até INDEX_TRAINING_SAMPLE_SIZE vetores), são treinados com ela e
+    passam a receber os lotes seguintes diretamente. Os vetores entram no índice na mesma
+    ordem em que foram recebidos.
+    """
+
+    def __init__(
+        self,
+        index_type: str = VECTOR_INDEX_TYPE,
+        params: Optional[Dict[str, Any]] = None,
+        training_size: int = INDEX_TRAINING_SAMPLE_SIZE,
+    ):
+        if index_type not in INDEX_FACTORY_STRINGS:
+            raise ValueError(f"Tipo de índice não suportado: {index_type}")
+        self.index_type = index_type
+        self.params = params if params is not None else VECTOR_INDEX_PARAMS
+        self.training_size = training_size
+        self.index: Optional[faiss.Index] = None
+        self.index_info: Optional[Dict[str, Any]] = None
+        self._pending: List[np.ndarray] = []
+        self._pending_count = 0
+
+    def add(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.index is not None:
+            self.index.add(vectors)
+            return
+
+        self._pending.append(vectors)
+        self._pending_count += len(vectors)
+        if self.index_type in _UNTRAINED_INDEX_TYPES or self._pending_count >= self.training_size:
+            self._build()
+
+    def _build(self) -> None:
+        sample = np.concatenate(self._pending)
+        self._pending, self._pending_count = [], 0
+        self.index, self.index_info = build_index(self.index_type, sample, self.params)
+        self.index.add(sample)
+
+    def finish(self) -> Tuple[faiss.Index, Dict[str, Any]]:
+        """
+        Retorna o índice completo e os metadados a serem persistidos. Corpora menores que
+        a amostra de treino são treinados aqui, com todos os vetores.
+        """
+        if self.index is None:
+            if not self._pending:
+                raise ValueError("Nenhum vetor foi adicionado ao índice.")
+            self._build()
+        return self.index, self.index_info
+
+
+def is_index_mapped(index: faiss.Index) -> bool:
+    """
+    Indica se os códigos do índice apontam para o arquivo mapeado (IO_FLAG_MMAP_IFC) em vez
+    de memória própria: índices flat/SQ, o armazenamento do HNSW e as listas de índices IVF.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        invlists = faiss.downcast_InvertedLists(ivf.invlists)
+        return isinstance(invlists, faiss.ArrayInvertedLists) and ivf.nlist > 0 and not invlists.codes.at(0).is_owned
+    return isinstance(index, faiss.IndexFlatCodes) and not index.codes.is_owned
+
+
+def append_vectorstore(target: FAISS, source: FAISS) -> None:
+    """
+    Adiciona ao target os vetores e documentos de um vectorstore "flat" (ex: um segmento).
+
+    Diferente de FAISS.merge_from, funciona para qualquer tipo de índice do target
+    (HNSW e índices quantizados não suportam merge), pois reconstrói os vetores exatos
+    do segmento e os adiciona pelo caminho normal de inserção.
+    """
+    n_new = source.index.ntotal
+    if n_new == 0:
+        return
+
+    vectors = source.index.reconstruct_n(0, n_new)
+    start = target.index.ntotal
+    target.index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+
+    new_docs = {}
+    for i in range(n_new):
+        doc_id = source.index_to_docstore_id[i]
+        target.index_to_docstore_id[start + i] = doc_id
+        new_docs[doc_id] = source.docstore.search(doc_id)
+    target.docstore.add(new_docs)
+
+
+def make_exclusion_selector(positions: Iterable[int]) -> Optional[faiss.IDSelector]:
+    """
+    Cria um seletor que exclui da busca as posições informadas (documentos removidos
+    logicamente, ainda presentes no índice até a próxima compactação).
+    """
+    ids = np.fromiter(positions, dtype=np.int64)
+    if len(ids) == 0:
+        return None
+    batch = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    selector = faiss.IDSelectorNot(batch)
+    # O IDSelectorNot guarda apenas um ponteiro para o seletor interno
+    selector.referenced_objects = [batch]
+    return selector
+
+
+def remove_documents(db: FAISS, doc_ids: Iterable[str], batch_size: int = 65536) -> Set[str]:
+    """
+    Remove fisicamente documentos do índice, reconstruindo-o apenas com os vetores mantidos.
+
+    A reconstrução (em vez de index.remove_ids) funciona para todos os tipos de índice:
+    HNSW não suporta remoção e, nos demais, remove_ids renumera ou deixa buracos nas
+    posições, o que desalinharia index_to_docstore_id. Os índices treinados (IVF/PQ/SQ)
+    mantêm o treino. O docstore não é alterado: apenas os ids mantidos continuam mapeados.
+
+    Returns:
+        Ids dos documentos efetivamente removidos
+    """
+    positions = set(index_map_positions(db.index_to_docstore_id, list(set(doc_ids))))
+    if not positions:
+        return set()
+
+    ordered_ids = index_map_doc_ids(db.index_to_docstore_id)
+    new_index = faiss.clone_index(db.index)
+    new_index.reset()
+
+    kept_ids = []
+    ntotal = db.index.ntotal
+    for start in range(0, ntotal, batch_size):
+        n = min(batch_size, ntotal - start)
+        keep = [i for i in range(n) if start + i not in positions]
+        if not keep:
+            continue
+        vectors = db.index.reconstruct_n(start, n)
+        new_index.add(np.ascontiguousarray(vectors[keep], dtype=np.float32))
+        kept_ids.extend(ordered_ids[start + i] for i in keep)
+
+    db.index = new_index
+    db.index_to_docstore_id = dict(enumerate(kept_ids))
+    return {ordered_ids[pos] for pos in positions}
+
+
+def make_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                       selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Cria os parâmetros de busca por requisição (sem alterar o índice compartilhado).
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        if ef_search:
+            params.efSearch = ef_search
+        else:
+            params.efSearch = index.hnsw.efSearch
+    elif faiss.try_extract_index_ivf(index) is not None:
+        params = faiss.SearchParametersIVF()
+        params.nprobe = nprobe or faiss.try_extract_index_ivf(index).nprobe
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def is_approximate_index(index: faiss.Index) -> bool:
+    """
+    Indica se a busca no índice é aproximada (HNSW ou IVF): o seletor só é aplicado aos nós
+    visitados do grafo ou às listas sondadas, não ao índice inteiro.
+    """
+    return isinstance(index, faiss.IndexHNSW) or faiss.try_extract_index_ivf(index) is not None
+
+
+def scale_search_params(index: faiss.Index, selectivity: float, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Aumenta nprobe/efSearch na proporção 1/selectivity, para que a busca filtrada visite
+    aproximadamente tantos candidatos permitidos quanto a busca sem filtro.
+
+    Returns:
+        Tupla (nprobe, ef_search) ajustados; o valor que não se aplica ao índice não é alterado
+    """
+    if isinstance(index, faiss.IndexHNSW):
+        ef = ef_search or index.hnsw.efSearch
+        return nprobe, min(math.ceil(ef / selectivity), max(ef, index.ntotal))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        probes = nprobe or ivf.nprobe
+        return min(math.ceil(probes / selectivity), max(probes, ivf.nlist)), ef_search
+    return nprobe, ef_search
+
+
+def exact_search(index: faiss.Index, vectors: np.ndarray, positions: np.ndarray, k: int,
+                 batch_size: int = FILTER_EXACT_SEARCH_BATCH_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Busca exata (L2) restrita às posições informadas: reconstrói os vetores em lotes e mantém
+    os k mais próximos de cada consulta.
+
+    Returns:
+        Tupla (distâncias, posições) com até k colunas, no formato de index.search
+    """
+    scores = np.empty((len(vectors), 0), dtype=np.float32)
+    indices = np.empty((len(vectors), 0), dtype=np.int64)
+    for start in range(0, len(positions), batch_size):
+        batch = positions[start:start + batch_size]
+        candidates = np.ascontiguousarray(index.reconstruct_batch(batch), dtype=np.float32)
+        batch_scores, batch_indices = faiss.knn(vectors, candidates, min(k, len(batch)), metric=faiss.METRIC_L2)
+        scores = np.hstack([scores, batch_scores])
+        indices = np.hstack([indices, batch[batch_indices]])
+        order = np.argsort(scores, axis=1, kind="stable")[:, :k]
+        scores = np.take_along_axis(scores, order, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+    return scores, indices
+
+
+class SegmentedVectorstore:
+    """
+    Vectorstore de uma versão do índice: a base (somente leitura, aberta do disco) seguida dos
+    segmentos dos uploads, cada parte começando na posição global do seu primeiro vetor.
+
+    Como o LexicalIndex e o MetadataIndex, é composto por partes imutáveis: acrescentar um
+    segmento cria um novo SegmentedVectorstore que compartilha as partes existentes, então
+    publicar um upload não copia a base nem altera o que os leitores da versão anterior usam.
+    """
+
+    def __init__(self, parts: Sequence[Tuple[int, FAISS]]):
+        self.parts = tuple(parts)
+        self._starts = [start for start, _ in self.parts]
+        self.ntotal = sum(db.index.ntotal for _, db in self.parts)
+
+    @property
+    def base(self) -> FAISS:
+        return self.parts[0][1]
+
+    @property
+    def embedding_function(self) -> Any:
+        return self.base.embedding_function
+
+    def with_part(self, db: FAISS) -> "SegmentedVectorstore":
+        """
+        Nova versão com os vetores de db acrescentados a partir da posição ntotal.
+        """
+        return SegmentedVectorstore(self.parts + ((self.ntotal, db),))
+
+    def locate(self, pos: int) -> Tuple[FAISS, int]:
+        """
+        Parte que contém a posição global e a posição dentro dela.
+        """
+        start, db = self.parts[bisect.bisect_right(self._starts, pos) - 1]
+        return db, pos - start
+
+    def document(self, pos: int) -> Any:
+        db, local = self.locate(pos)
+        return db.docstore.search(db.index_to_docstore_id[local])
+
+    def reconstruct(self, pos: int) -> np.ndarray:
+        db, local = self.locate(pos)
+        return db.index.reconstruct(local)
+
+    def positions_of(self, doc_ids: List[str]) -> List[int]:
+        """
+        Posições globais dos documentos informados (ids inexistentes são ignorados).
+        """
+        if not doc_ids:
+            return []
+        return [
+            start + pos
+            for start, db in self.parts
+            for pos in index_map_positions(db.index_to_docstore_id, doc_ids)
+        ]
+
+    def relevance_score_fn(self) -> Callable[[float], float]:
+        return self.base._select_relevance_score_fn()
+
+    def part_selectors(self, positions: Iterable[int]) -> Optional[Tuple[Optional[faiss.IDSelector], ...]]:
+        """
+        Seletores, um por parte, que excluem as posições globais informadas (ver
+        make_exclusion_selector), ou None se não houver posições a excluir.
+        """
+        positions = np.fromiter(positions, dtype=np.int64)
+        if len(positions) == 0:
+            return None
+        return tuple(
+            make_exclusion_selector(positions[(positions >= start) & (positions < start + db.index.ntotal)] - start)
+            for start, db in self.parts
+        )
+
+
+def search_with_score_by_vectors(
+    store: SegmentedVectorstore,
+    embeddings: List[List[float]],
+    k: int,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    selectors: Optional[Sequence[Optional[faiss.IDSelector]]] = None,
+    allowed: Optional[np.ndarray] = None,
+) -> List[List[Tuple[Document, float, int]]]:
+    """
+    Busca os k vizinhos mais próximos de várias consultas com uma chamada a index.search por
+    parte do vectorstore, com parâmetros de busca próprios da requisição, e funde os k melhores
+    de cada parte pela distância.
+
+    Em partes HNSW/IVF com filtro, a fração de posições permitidas decide a estratégia: abaixo
+    de FILTER_EXACT_SEARCH_SELECTIVITY a busca é exata sobre as posições permitidas (ver
+    exact_search); acima, nprobe/efSearch são ampliados (ver scale_search_params), para que
+    filtros seletivos não retornem bem menos que k documentos.
+
+    Args:
+        selectors: Um faiss.IDSelector (ou None) por parte, em posições locais da parte
+        allowed: Máscara booleana das posições globais permitidas pelos selectors (None sem filtro)
+
+    Returns:
+        Para cada consulta, lista de (documento, distância L2, posição global)
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    part_scores, part_positions = [], []
+    for i, (start, db) in enumerate(store.parts):
+        ntotal = db.index.ntotal
+        if ntotal == 0:
+            continue
+        selector = selectors[i] if selectors is not None else None
+        part_nprobe, part_ef_search = nprobe, ef_search
+        if allowed is not None and is_approximate_index(db.index):
+            local = allowed[start:start + ntotal]
+            n_allowed = int(local.sum())
+            if n_allowed == 0:
+                continue
+            selectivity = n_allowed / ntotal
+            if selectivity < FILTER_EXACT_SEARCH_SELECTIVITY:
+                scores, indices = exact_search(db.index, vectors, np.flatnonzero(local), k)
+                part_scores.append(scores)
+                part_positions.append(indices + start)
+                continue
+            if selectivity < 1:
+                part_nprobe, part_ef_search = scale_search_params(db.index, selectivity, nprobe, ef_search)
+
+        params = make_search_params(db.index, nprobe=part_nprobe, ef_search=part_ef_search, selector=selector)
+        if params is not None:
+            scores, indices = db.index.search(vectors, k, params=params)
+        else:
+            scores, indices = db.index.search(vectors, k)
+        part_scores.append(np.where(indices >= 0, scores, np.inf))
+        part_positions.append(np.where(indices >= 0, indices + start, -1))
+    if not part_scores:
+        return [[] for _ in range(len(vectors))]
+
+    scores = np.hstack(part_scores)
+    positions = np.hstack(part_positions)
+    order = np.argsort(scores, axis=1, kind="stable")[:, :k]
+
+    results = []
+    for row_scores, row_positions in zip(np.take_along_axis(scores, order, axis=1),
+                                         np.take_along_axis(positions, order, axis=1)):
+        row = []
+        for score, pos in zip(row_scores, row_positions):
+            if pos == -1:
+                continue
+            row.append((store.document(int(pos)), float(score), int(pos)))
+        results.append(row)
+    return results
+
+
+def search_with_score_by_vector(
+    store: SegmentedVectorstore,
+    embedding: List[float],
+    k: int,
+    **search_kwargs,
+) -> List[Tuple[Document, float, int]]:
+    """
+    Busca os k vizinhos mais próximos de uma consulta (ver search_with_score_by_vectors).
+
+    Returns:
+        Lista de (documento, distância L2, posição global)
+    """
+    return search_with_score_by_vectors(store, [embedding], k, **search_kwargs)[0]
+
+
+def mmr_select(
+    store: SegmentedVectorstore,
+    embedding: List[float],
+    candidates: List[Tuple[Document, float, int]],
+    k: int,
+    lambda_mult: float = 0.5,
+) -> List[Document]:
+    """
+    Escolhe, entre candidatos já buscados, os k documentos por Maximal Marginal Relevance.
+    """
+    if not candidates:
+        return []
+
+    candidate_vectors = [store.reconstruct(i) for _, _, i in candidates]
+    selected = maximal_marginal_relevance(
+        np.asarray([embedding], dtype=np.float32), candidate_vectors, k=k, lambda_mult=lambda_mult
+    )
+    return [candidates[i][0] for i in selected]
+
+
+def fuse_hybrid(
+    store: SegmentedVectorstore,
+    dense: List[Tuple[Document, float, int]],
+    query: str,
+    k: int,
+    lexical: Optional[LexicalIndex],
+    fetch_k: int = 20,
+    rrf_k: int = 60,
+) -> List[Document]:
+    """
+    Funde por RRF os candidatos da busca vetorial (já buscados) com os fetch_k melhores do BM25.
+    """
+    docs = {pos: doc for doc, _, pos in dense}
+    rankings = [[pos for _, _, pos in dense]]
+    if lexical is not None:
+        rankings.append([pos for pos, _ in lexical.search(query, fetch_k)])
+
+    results = []
+    for pos, _ in reciprocal_rank_fusion(rankings, rrf_k):
+        doc = docs.get(pos)
+        if doc is None:
+            doc = store.document(pos)
+        if isinstance(doc, Document):
+            results.append(doc)
+            if len(results) == k:
+                break
+    return results
@@ -1,76 +1,372 @@
 from langchain_community.vectorstores import FAISS
+import numpy as np
 import os
-from typing import Tuple, Any
+import threading
+import time
+import weakref
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
 
 from app.core.utils.logger import get_logger
 from app.core.config.embeddings import EMBEDDING_MODEL, VECTORSTORE_PATH
+from app.core.config.ingest import INDEX_REFRESH_INTERVAL_SECONDS
+from app.services.index_persistence import INDEX_FILE, MANIFEST_FILE, BaseWriter, IndexPersistence
+from app.services.lexical_index import LexicalIndex, LexicalPart
+from app.services.metadata_index import MetadataIndex, MetadataPart, make_bitmap_selector
+from app.services.vector_index import SegmentedVectorstore
 
 logger = get_logger(__name__)
 
+
+class IndexSnapshot:
+    """
+    Versão imutável e publicada do vectorstore.
+
+    Um leitor que obteve um snapshot pode usá-lo até o fim da consulta, mesmo que uma
+    nova versão seja publicada no meio tempo: o snapshot antigo só é liberado quando a
+    última referência a ele deixa de existir.
+
+    Documentos removidos logicamente (deleted_ids) continuam no índice até a próxima
+    compactação; os selectors (um por parte de db) os excluem das buscas vetoriais e o
+    índice lexical, das buscas BM25.
+    """
+
+    __slots__ = ("version", "db", "deleted_ids", "deleted_positions", "selectors", "lexical", "metadata",
+                 "__weakref__")
+
+    def __init__(self, version: int, db: SegmentedVectorstore, deleted_ids: FrozenSet[str] = frozenset(),
+                 deleted_positions: FrozenSet[int] = frozenset(), lexical: Optional[LexicalIndex] = None,
+                 metadata: Optional[MetadataIndex] = None):
+        self.version = version
+        self.db = db
+        self.deleted_ids = deleted_ids
+        self.deleted_positions = deleted_positions
+        self.selectors = db.part_selectors(deleted_positions)
+        self.lexical = lexical.with_deleted(deleted_positions) if lexical is not None else None
+        self.metadata = metadata
+
+    def filter(self, **filters: Any) -> Tuple[Any, Any, Optional[np.ndarray]]:
+        """
+        Restringe as buscas deste snapshot aos documentos que satisfazem os filtros de
+        metadados (ver MetadataIndex.mask), já sem os documentos removidos.
+
+        Returns:
+            Tupla (selectors FAISS por parte, índice lexical restrito, máscara das posições
+            permitidas); sem filtros, retorna os selectors e o índice lexical do snapshot e máscara None
+
+        Raises:
+            ValueError: Se houver filtros e o snapshot não tiver índice de metadados
+        """
+        if not any(value is not None and value != [] for value in filters.values()):
+            return self.selectors, self.lexical, None
+        if self.metadata is None:
+            raise ValueError("Filtros de metadados indisponíveis: o índice não possui metadados indexados.")
+
+        mask = self.metadata.mask(self.db.ntotal, **filters)
+        if self.deleted_positions:
+            mask[np.fromiter(self.deleted_positions, dtype=np.int64)] = False
+        lexical = self.lexical.with_allowed(mask) if self.lexical is not None else None
+        selectors = tuple(make_bitmap_selector(mask[start:start + db.index.ntotal]) for start, db in self.db.parts)
+        return selectors, lexical, mask
+
+
+def _log_released(version: int) -> None:
+    logger.debug(f"Versão {version} do índice liberada (nenhum leitor restante).")
+
+
 class VectorstoreService:
     """
     Serviço centralizado para gerenciamento da vector store
+
+    Leitores obtêm o snapshot corrente sem locks (a leitura de um atributo é atômica).
+    Escritores são serializados, constroem uma nova versão acrescentando partes imutáveis
+    (segmentos) às da versão corrente, sem copiar a base, e a publicam trocando a referência
+    de _snapshot, de modo que uma consulta nunca observa um índice parcialmente atualizado.
+
+    Cada processo (worker) guarda o manifest do qual o seu snapshot foi construído e, em uma
+    thread de background, acompanha a geração do manifest em disco: segmentos, bases e
+    compactações gravados por outros workers são publicados aqui em até
+    INDEX_REFRESH_INTERVAL_SECONDS (ver refresh).
     """
-    _db: FAISS = None
-    _retriever: Any = None
+    _snapshot: IndexSnapshot = None
+    _manifest: Optional[Dict[str, Any]] = None
+    _write_lock = threading.RLock()
+    _version: int = 0
+    _watcher: Optional[threading.Thread] = None
+
+    @classmethod
+    def _publish(cls, db: SegmentedVectorstore, deleted_ids: Iterable[str] = (),
+                 deleted_positions: Optional[FrozenSet[int]] = None,
+                 lexical: Optional[LexicalIndex] = None,
+                 metadata: Optional[MetadataIndex] = None) -> IndexSnapshot:
+        """
+        Publica uma nova versão do índice. Deve ser chamado com _write_lock adquirido.
+
+        Args:
+            db: Vectorstore da nova versão
+            deleted_ids: Ids de documentos removidos logicamente
+            deleted_positions: Posições já resolvidas desses ids (calculadas aqui se None)
+            lexical: Índice BM25 alinhado às posições de db (None desativa a busca híbrida)
+            metadata: Índice de metadados alinhado às posições de db (None desativa os filtros)
+        """
+        deleted_ids = frozenset(deleted_ids)
+        if deleted_positions is None:
+            deleted_positions = frozenset(db.positions_of(list(deleted_ids)))
+
+        cls._version += 1
+        snapshot = IndexSnapshot(cls._version, db, deleted_ids, deleted_positions, lexical, metadata)
+        weakref.finalize(snapshot, _log_released, snapshot.version)
+        cls._snapshot = snapshot
+        logger.info(
+            f"Vectorstore publicado. Versão do índice: {snapshot.version} "
+            f"({db.ntotal - len(deleted_positions)} vetores ativos, {len(db.parts)} parte(s))"
+        )
+        return snapshot
+
+    @classmethod
+    def _load_and_publish(cls) -> IndexSnapshot:
+        """
+        Carrega do disco o índice vetorial, o lexical e o de metadados do manifest atual e os
+        publica. Deve ser chamado com _write_lock adquirido.
+        """
+        db, manifest = IndexPersistence.load_with_manifest(VECTORSTORE_PATH, EMBEDDING_MODEL)
+        lexical, metadata = IndexPersistence.load_part_indexes(VECTORSTORE_PATH, manifest, db)
+        snapshot = cls._publish(db, manifest["deleted_ids"], lexical=lexical, metadata=metadata)
+        cls._manifest = manifest
+        cls._start_watcher()
+        return snapshot
+
+    @classmethod
+    def _start_watcher(cls) -> None:
+        if INDEX_REFRESH_INTERVAL_SECONDS <= 0 or (cls._watcher is not None and cls._watcher.is_alive()):
+            return
+        cls._watcher = threading.Thread(target=cls._watch, name="index-watcher", daemon=True)
+        cls._watcher.start()
+
+    @classmethod
+    def _watch(cls) -> None:
+        # Só lê o manifest quando o arquivo é trocado (os.replace cria um novo inode); a primeira
+        # verificação sempre compara a geração, cobrindo trocas feitas durante o carregamento
+        stamp = None
+        while True:
+            time.sleep(INDEX_REFRESH_INTERVAL_SECONDS)
+            try:
+                current = IndexPersistence.manifest_stamp(VECTORSTORE_PATH)
+                if current != stamp:
+                    stamp = current
+                    cls.refresh()
+            except Exception as e:
+                logger.error(f"Erro ao atualizar o índice a partir do disco: {e}", exc_info=True)
+
+    @classmethod
+    def refresh(cls) -> bool:
+        """
+        Publica as alterações do manifest em disco que o snapshot corrente ainda não tem
+        (gravadas por outro worker). Se a base for a mesma, apenas os segmentos novos são
+        abertos e acrescentados às partes existentes; se ela mudou (ingestão completa ou
+        compactação), o índice é recarregado.
+
+        Returns:
+            True se uma nova versão foi publicada
+        """
+        with cls._write_lock:
+            current = cls._snapshot
+            loaded = cls._manifest
+            if current is None or loaded is None:
+                return False
+            manifest = IndexPersistence.read_manifest(VECTORSTORE_PATH)
+            if manifest["generation"] == loaded["generation"]:
+                return False
+
+            loaded_dirs = [segment["dir"] for segment in loaded["segments"]]
+            if manifest["base"] != loaded["base"] or \
+                    [segment["dir"] for segment in manifest["segments"][:len(loaded_dirs)]] != loaded_dirs:
+                logger.info(f"Base do índice alterada por outro processo (geração {manifest['generation']}). Recarregando.")
+                cls._load_and_publish()
+                return True
+
+            db, lexical, metadata = current.db, current.lexical, current.metadata
+            for segment in manifest["segments"][len(loaded_dirs):]:
+                segment_db = IndexPersistence.load_segment(VECTORSTORE_PATH, segment, EMBEDDING_MODEL)
+                lexical_part, metadata_part = IndexPersistence.load_part_index(
+                    os.path.join(VECTORSTORE_PATH, segment["dir"]), segment_db
+                )
+                if lexical is not None:
+                    lexical = lexical.with_part(lexical_part, db.ntotal)
+                if metadata is not None:
+                    metadata = metadata.with_part(metadata_part, db.ntotal)
+                db = db.with_part(segment_db)
+
+            new_ids = [doc_id for doc_id in manifest["deleted_ids"] if doc_id not in current.deleted_ids]
+            positions = current.deleted_positions.union(db.positions_of(new_ids))
+            logger.info(
+                f"Índice atualizado a partir do disco (geração {manifest['generation']}): "
+                f"{len(manifest['segments']) - len(loaded_dirs)} segmento(s) e {len(new_ids)} remoção(ões) novos."
+            )
+            cls._publish(db, current.deleted_ids.union(new_ids), positions, lexical, metadata)
+            cls._manifest = manifest
+            return True
 
     @classmethod
-    def load_vectorstore(cls) -> Tuple[FAISS, Any]:
+    def load_vectorstore(cls) -> SegmentedVectorstore:
         """
-        Carrega o vectorstore FAISS e cria um retriever.
+        Carrega o vectorstore (base + segmentos) e o publica.
         Implementa o padrão singleton para carregar apenas uma vez.
 
         Returns:
-            Uma tupla contendo o vectorstore e o retriever configurado
+            O vectorstore do snapshot corrente
 
         Raises:
             Exception: Se ocorrer um erro ao carregar o vectorstore
         """
-        if cls._db is not None and cls._retriever is not None:
-            return cls._db, cls._retriever
+        snapshot = cls._snapshot
+        if snapshot is not None:
+            return snapshot.db
 
-        try:
-            logger.info(f"Carregando índice de vetores de: {VECTORSTORE_PATH}")
+        with cls._write_lock:
+            if cls._snapshot is not None:
+                return cls._snapshot.db
 
-            if not VectorstoreService.check_vectorstore_exists():
-                logger.warning(
-                    f"Vectorstore não encontrado ou vazio em {VECTORSTORE_PATH}. É necessário executar a ingestão primeiro ou o diretório está vazio.")
-                pass
+            try:
+                logger.info(f"Carregando índice de vetores de: {VECTORSTORE_PATH}")
 
-            db = FAISS.load_local(
-                VECTORSTORE_PATH, EMBEDDING_MODEL, allow_dangerous_deserialization=True
-            )
-            retriever = db.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-            logger.info("Índice carregado com sucesso e retriever criado.")
+                if not VectorstoreService.check_vectorstore_exists():
+                    logger.warning(
+                        f"Vectorstore não encontrado ou vazio em {VECTORSTORE_PATH}. É necessário executar a ingestão primeiro ou o diretório está vazio.")
+                    pass
 
-            cls._db = db
-            cls._retriever = retriever
+                db = cls._load_and_publish().db
+                logger.info("Índice carregado com sucesso.")
 
-            return cls._db, cls._retriever
-        except Exception as e:
-            logger.error(f"Erro ao carregar índice de vetores: {e}")
-
-            cls._db = None # Garante que não usemos um estado parcialmente carregado
-            cls._retriever = None
-            raise e
+                return db
+            except Exception as e:
+                logger.error(f"Erro ao carregar índice de vetores: {e}")
+                raise e
 
     @classmethod
-    def get_retriever(cls) -> Any:
+    def get_snapshot(cls) -> IndexSnapshot:
         """
-        Retorna o retriever singleton. Carrega se ainda não estiver carregado.
+        Retorna o snapshot corrente (vectorstore + documentos removidos a excluir das buscas).
+        Carrega se ainda não estiver carregado.
         """
-        if cls._retriever is None:
+        if cls._snapshot is None:
             cls.load_vectorstore()
-        return cls._retriever
+        return cls._snapshot
 
     @classmethod
-    def get_vectorstore(cls) -> FAISS:
+    def get_vectorstore(cls) -> SegmentedVectorstore:
         """
-        Retorna o vectorstore (db) singleton. Carrega se ainda não estiver carregado.
+        Retorna o snapshot corrente do vectorstore (db). Carrega se ainda não estiver carregado.
+        O objeto retornado nunca é alterado depois de publicado.
         """
-        if cls._db is None:
-            cls.load_vectorstore()
-        return cls._db
+        snapshot = cls._snapshot
+        if snapshot is None:
+            return cls.load_vectorstore()
+        return snapshot.db
+
+    @classmethod
+    def get_index_version(cls) -> int:
+        """
+        Retorna a versão atual do índice. Ela muda sempre que a ingestão publica um novo
+        vectorstore, permitindo que caches derivados do índice (ex: cache de respostas) sejam invalidados.
+        """
+        return cls._version
+
+    @classmethod
+    def index_stats(cls) -> Dict[str, int]:
+        """
+        Tamanho do snapshot corrente, sem carregá-lo: version, vectors (total no índice) e
+        deleted (removidos logicamente, ainda no índice até a próxima reconstrução).
+        """
+        snapshot = cls._snapshot
+        if snapshot is None:
+            return {"version": cls._version, "vectors": 0, "deleted": 0}
+        return {
+            "version": snapshot.version,
+            "vectors": snapshot.db.ntotal,
+            "deleted": len(snapshot.deleted_positions),
+        }
+
+    @classmethod
+    def publish_base(cls, writer: BaseWriter) -> None:
+        """
+        Torna atual uma base construída em streaming pela ingestão completa e a publica,
+        aberta a partir do disco (mmap) em vez da cópia em memória usada na construção.
+
+        Args:
+            writer: Base com todos os chunks já adicionados
+        """
+        with cls._write_lock:
+            IndexPersistence.commit_base(writer)
+            cls._load_and_publish()
+
+    @classmethod
+    def add_segment(cls, segment_db: Optional[FAISS], deleted_ids: Optional[List[str]] = None,
+                    lexical_part: Optional[LexicalPart] = None,
+                    metadata_part: Optional[MetadataPart] = None) -> None:
+        """
+        Persiste os chunks de um upload como segmento e publica uma nova versão contendo-os.
+
+        O segmento entra como mais uma parte do vectorstore, depois das da versão corrente
+        (que são compartilhadas, não copiadas): o custo é proporcional ao upload, não ao corpus.
+        Se ainda não houver índice (ex: a inicialização falhou sem dados), o segmento vira a base.
+
+        Args:
+            segment_db: FAISS contendo somente os chunks novos (None se só houver remoções)
+            deleted_ids: Ids de documentos a remover (ex: chunks de um arquivo apagado ou substituído)
+            lexical_part: Índice BM25 dos chunks novos, na ordem de segment_db
+            metadata_part: Índice de metadados dos chunks novos, na ordem de segment_db
+        """
+        if segment_db is not None and segment_db.index.ntotal == 0:
+            segment_db = None
+
+        with cls._write_lock:
+            if cls._snapshot is None and not cls.check_vectorstore_exists():
+                if segment_db is None:
+                    # Sem índice não há documentos a remover
+                    return
+                if IndexPersistence.create_base(segment_db, VECTORSTORE_PATH):
+                    cls._load_and_publish()
+                    return
+
+            current = cls.get_snapshot()
+            previous_generation, manifest = IndexPersistence.append_segment(
+                segment_db, VECTORSTORE_PATH, on_compacted=cls.reload_vectorstore,
+                deleted_ids=deleted_ids, embeddings=EMBEDDING_MODEL,
+                lexical_part=lexical_part, metadata_part=metadata_part,
+            )
+            if cls._manifest is None or previous_generation != cls._manifest["generation"]:
+                # Outro worker alterou o índice depois deste snapshot: publica tudo a partir do disco
+                cls.refresh()
+                return
+
+            db = current.db
+            lexical = current.lexical
+            metadata = current.metadata
+            if segment_db is not None:
+                # Os documentos novos ocupam as posições a partir do fim do índice corrente
+                if lexical is not None and lexical_part is not None:
+                    lexical = lexical.with_part(lexical_part, db.ntotal)
+                if metadata is not None and metadata_part is not None:
+                    metadata = metadata.with_part(metadata_part, db.ntotal)
+                db = db.with_part(segment_db)
+
+            # Só as posições dos ids recém-removidos precisam ser resolvidas
+            new_ids = [doc_id for doc_id in deleted_ids or [] if doc_id not in current.deleted_ids]
+            positions = current.deleted_positions.union(db.positions_of(new_ids))
+            cls._publish(db, current.deleted_ids.union(new_ids), positions, lexical, metadata)
+            cls._manifest = manifest
+
+    @classmethod
+    def reload_vectorstore(cls) -> None:
+        """
+        Recarrega o índice do disco e o publica como nova versão (ex: após uma compactação,
+        para trocar base + segmentos pela nova base compactada).
+        """
+        with cls._write_lock:
+            try:
+                cls._load_and_publish()
+            except Exception as e:
+                logger.error(f"Erro ao recarregar índice de vetores: {e}")
 
     @staticmethod
     def check_vectorstore_exists() -> bool:
@@ -80,4 +376,7 @@ class VectorstoreService:
         Returns:
             True se o vectorstore existir, False caso contrário
         """
-        return os.path.exists(VECTORSTORE_PATH) and len(os.listdir(VECTORSTORE_PATH)) > 0
+        # O registro de ingestão (registry.sqlite) fica no mesmo diretório e não conta como índice
+        return any(
+            os.path.exists(os.path.join(VECTORSTORE_PATH, name)) for name in (MANIFEST_FILE, INDEX_FILE)
+        )
@@ -0,0 +1,98 @@
+import time
+from typing import Dict, Optional
+
+from app.core.config.embeddings import EMBEDDING_MODEL
+from app.core.config.llm import DEFAULT_PROVIDER, LLM_CONFIGS
+from app.core.utils.logger import get_logger
+from app.services.context_builder import get_token_counter
+from app.services.reranker import RERANKER
+from app.services.vector_index import search_with_score_by_vector
+from app.services.vectorstore_service import VectorstoreService
+
+logger = get_logger(__name__)
+
+# Consulta fictícia usada no aquecimento (não entra no cache de embeddings de consultas)
+WARMUP_QUERY = "Como solicitar o serviço e quais documentos são necessários?"
+# Carrega também o cross-encoder de re-ranking na inicialização (custo de memória mesmo sem uso)
+WARMUP_RERANKER = False
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+class WarmupService:
+    """
+    Aquecimento do processo antes de atender consultas.
+
+    Os módulos pesados (torch, modelo de embeddings, clientes dos provedores) são carregados
+    sob demanda para que a importação da aplicação seja rápida; o aquecimento faz esse primeiro
+    uso na inicialização, com um embedding e uma busca fictícios, para que a primeira consulta
+    real não pague a carga do modelo nem a inicialização preguiçosa do torch e do índice.
+    """
+    _timings: Optional[Dict[str, float]] = None
+
+    @classmethod
+    def run(cls) -> Dict[str, float]:
+        """
+        Executa o aquecimento. Falhas em uma etapa são registradas e não impedem as demais.
+
+        Returns:
+            Tempo (ms) de cada etapa: embed, search, lexical, tokenizer, rerank e total
+        """
+        logger.info("Iniciando aquecimento do processo...")
+        timings: Dict[str, float] = {}
+        total_start = time.perf_counter()
+
+        embedding = None
+        start = time.perf_counter()
+        try:
+            # Direto no modelo, sem passar pelo cache de consultas
+            embedding = EMBEDDING_MODEL.embeddings.embed_query(f"{EMBEDDING_MODEL.query_prefix}{WARMUP_QUERY}")
+            timings["embed"] = _elapsed_ms(start)
+        except Exception as e:
+            logger.error(f"Falha ao aquecer o modelo de embeddings: {e}", exc_info=True)
+
+        snapshot = VectorstoreService.get_snapshot()
+        if snapshot is not None and snapshot.db is not None and snapshot.db.ntotal > 0:
+            if embedding is not None:
+                start = time.perf_counter()
+                try:
+                    search_with_score_by_vector(snapshot.db, embedding, 1, selectors=snapshot.selectors)
+                    timings["search"] = _elapsed_ms(start)
+                except Exception as e:
+                    logger.error(f"Falha ao aquecer a busca vetorial: {e}", exc_info=True)
+            if snapshot.lexical is not None:
+                start = time.perf_counter()
+                snapshot.lexical.search(WARMUP_QUERY, 1)
+                timings["lexical"] = _elapsed_ms(start)
+        else:
+            logger.warning("Aquecimento sem busca: nenhum índice carregado.")
+
+        start = time.perf_counter()
+        try:
+            get_token_counter(DEFAULT_PROVIDER, LLM_CONFIGS[DEFAULT_PROVIDER]["default_model"])(WARMUP_QUERY)
+            timings["tokenizer"] = _elapsed_ms(start)
+        except Exception as e:
+            logger.warning(f"Falha ao aquecer o tokenizador: {e}")
+
+        if WARMUP_RERANKER:
+            start = time.perf_counter()
+            try:
+                RERANKER._get_model()
+                timings["rerank"] = _elapsed_ms(start)
+            except Exception as e:
+                logger.warning(f"Falha ao carregar o cross-encoder no aquecimento: {e}")
+
+        timings["total"] = _elapsed_ms(total_start)
+        cls._timings = timings
+        logger.info(f"Aquecimento concluído. Tempos (ms): {timings}")
+        return timings
+
+    @classmethod
+    def is_done(cls) -> bool:
+        return cls._timings is not None
+
+    @classmethod
+    def timings(cls) -> Optional[Dict[str, float]]:
+        return cls._timings
@@ -0,0 +1,96 @@
+"""
+Benchmark de recall@k vs. latência dos tipos de índice suportados (app/services/vector_index.py)
+sobre um corpus sintético de vetores normalizados agrupados em clusters.
+
+O ground truth vem de uma busca exata (IndexFlatL2). Para cada tipo de índice são
+varridos os parâmetros de busca por requisição (nprobe para IVF, efSearch para HNSW).
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.ann_index_benchmark --corpus 200000 --queries 500 --k 10
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from app.services.vector_index import build_index, make_search_params
+
+NPROBE_SWEEP = [1, 4, 16, 64]
+EF_SEARCH_SWEEP = [16, 32, 64, 128, 256]
+
+
+def synthetic_corpus(n: int, dim: int, n_clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((n_clusters, dim), dtype=np.float32)
+    assignment = rng.integers(0, n_clusters, size=n)
+    vectors = centers[assignment] + 0.35 * rng.standard_normal((n, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def evaluate(index, queries, truth, k, params=None):
+    start = time.perf_counter()
+    if params is not None:
+        _, found = index.search(queries, k, params=params)
+    else:
+        _, found = index.search(queries, k)
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    return recall_at_k(found, truth), latency_ms
+
+
+def main(corpus_size: int, n_queries: int, dim: int, k: int, index_types) -> None:
+    rng = np.random.default_rng(7)
+    corpus = synthetic_corpus(corpus_size + n_queries, dim, n_clusters=max(10, corpus_size // 1000), rng=rng)
+    vectors, queries = corpus[:corpus_size], corpus[corpus_size:]
+
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    # Busca uma consulta por vez, como no endpoint /query
+    faiss.omp_set_num_threads(1)
+
+    print(f"corpus={corpus_size} dim={dim} consultas={n_queries} k={k}")
+    print(f"{'índice':>10} | {'parâmetro':>12} | {'recall@k':>8} | {'ms/consulta':>11} | {'MB':>8} | {'build (s)':>9}")
+    for index_type in index_types:
+        start = time.perf_counter()
+        index, info = build_index(index_type, vectors)
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        if index_type.startswith("ivf"):
+            sweep = [("nprobe", n) for n in NPROBE_SWEEP if n <= info["nlist"]]
+        elif index_type.startswith("hnsw"):
+            sweep = [("efSearch", ef) for ef in EF_SEARCH_SWEEP]
+        else:
+            sweep = [("-", None)]
+
+        for name, value in sweep:
+            params = make_search_params(
+                index,
+                nprobe=value if name == "nprobe" else None,
+                ef_search=value if name == "efSearch" else None,
+            )
+            recall, latency = evaluate(index, queries, truth, k, params)
+            label = f"{name}={value}" if value is not None else "-"
+            print(f"{index_type:>10} | {label:>12} | {recall:>8.3f} | {latency:>11.3f} | {size_mb:>8.1f} | {build_s:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de recall@k vs. latência dos índices ANN")
+    parser.add_argument("--corpus", type=int, default=200_000, help="Número de vetores no corpus")
+    parser.add_argument("--queries", type=int, default=500, help="Número de consultas")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão dos embeddings")
+    parser.add_argument("--k", type=int, default=10, help="k do recall@k")
+    parser.add_argument(
+        "--index-types", default="flat,hnsw,ivf_flat,ivf_pq,sq8,hnsw_sq8,ivf_sq8",
+        help="Tipos de índice, separados por vírgula"
+    )
+    args = parser.parse_args()
+    main(args.corpus, args.queries, args.dim, args.k, args.index_types.split(","))
@@ -0,0 +1,109 @@
+"""
+Benchmark da vazão de embeddings na ingestão (chunks/s, CPU) com o multilingual-e5-base.
+
+Compara, sobre chunks sintéticos de tamanhos variados:
+  - EMBEDDING_MODEL.embed_documents (HuggingFaceEmbeddings, lotes na ordem original; comportamento anterior);
+  - EmbeddingEngine "torch" com lotes ordenados por tamanho, em 1 e em N processos;
+  - EmbeddingEngine "int8" (quantização dinâmica) e "onnx" (ONNX Runtime), se disponíveis.
+
+Para os backends aproximados (int8/onnx) também é mostrada a menor similaridade de cosseno
+em relação aos vetores fp32, para avaliar a perda de qualidade.
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.embedding_benchmark --chunks 2000 --workers 4 --batch-size 64
+"""
+import argparse
+import os
+import random
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config.embeddings import EMBEDDING_MODEL, EMBEDDING_MODEL_NAME
+from app.services.embedding_engine import EmbeddingEngine
+
+SENTENCES = [
+    "A prefeitura disponibiliza a emissão de segunda via de documentos mediante agendamento prévio.",
+    "O atendimento presencial ocorre de segunda a sexta-feira, das 8h às 17h, nas unidades regionais.",
+    "Para solicitar o benefício, o cidadão deve apresentar documento com foto e comprovante de residência.",
+    "O prazo para análise do pedido é de até trinta dias úteis a partir da data do protocolo.",
+    "Em caso de indeferimento, é possível interpor recurso no mesmo canal em que o pedido foi feito.",
+    "O serviço é gratuito e pode ser solicitado pelo portal, pelo aplicativo ou pela central telefônica.",
+]
+
+
+def build_chunks(count: int, max_chars: int, seed: int = 42) -> List[str]:
+    """
+    Gera chunks com tamanhos entre ~100 caracteres e max_chars (como os do splitter na ingestão).
+    """
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(count):
+        target = rng.randint(100, max_chars)
+        parts = []
+        while sum(len(p) + 1 for p in parts) < target:
+            parts.append(rng.choice(SENTENCES))
+        chunks.append(" ".join(parts)[:target])
+    return chunks
+
+
+def timed(label: str, count: int, fn) -> Optional[np.ndarray]:
+    start = time.perf_counter()
+    try:
+        vectors = fn()
+    except ImportError as e:
+        print(f"{label:<36} | ignorado: {e}")
+        return None
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} | {elapsed:>8.1f} s | {count / elapsed:>8.1f} chunks/s")
+    return vectors
+
+
+def min_cosine(reference: np.ndarray, vectors: Optional[np.ndarray]) -> None:
+    if vectors is not None:
+        # Os vetores são normalizados, então o produto interno é o cosseno
+        print(f"{'':<36} | cosseno mínimo vs. fp32: {float(np.min(np.sum(reference * vectors, axis=1))):.4f}")
+
+
+def main(chunks: int, max_chars: int, workers: int, batch_size: int) -> None:
+    texts = build_chunks(chunks, max_chars)
+    warmup = texts[:batch_size]
+    print(f"modelo: {EMBEDDING_MODEL_NAME} | {chunks} chunks | {os.cpu_count()} núcleos")
+    print(f"{'modo':<36} | {'tempo':>10} | {'vazão':>17}")
+
+    EMBEDDING_MODEL.embed_documents(warmup)
+    reference = timed(
+        "HuggingFaceEmbeddings (anterior)", chunks,
+        lambda: np.asarray(EMBEDDING_MODEL.embed_documents(texts), dtype=np.float32),
+    )
+
+    modes = [
+        ("torch, ordenado, 1 proc.", "torch", 1),
+        (f"torch, ordenado, {workers} proc.", "torch", workers),
+        (f"int8, ordenado, {workers} proc.", "int8", workers),
+        (f"onnx, ordenado, {workers} proc.", "onnx", workers),
+    ]
+    for label, backend, n_workers in modes:
+        engine = EmbeddingEngine(backend=backend, batch_size=batch_size, workers=n_workers)
+        try:
+            # Carrega o modelo (e sobe os processos) fora da medição
+            try:
+                engine.embed_documents(warmup * n_workers)
+            except ImportError:
+                pass
+            vectors = timed(label, chunks, lambda: engine.embed_documents(texts))
+            if backend != "torch":
+                min_cosine(reference, vectors)
+        finally:
+            engine.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da vazão de embeddings na ingestão")
+    parser.add_argument("--chunks", type=int, default=2000, help="Quantidade de chunks sintéticos")
+    parser.add_argument("--max-chars", type=int, default=2000, help="Tamanho máximo dos chunks (CHUNK_SIZE)")
+    parser.add_argument("--workers", type=int, default=4, help="Processos de embedding nos modos paralelos")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks por lote")
+    args = parser.parse_args()
+    main(args.chunks, args.max_chars, args.workers, args.batch_size)
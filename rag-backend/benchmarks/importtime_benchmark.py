@@ -0,0 +1,103 @@
+"""
+Perfil do tempo de importação da aplicação (python -X importtime), comparado a um orçamento.
+
+Cada execução roda `python -X importtime -c "import <módulo>"` em um subprocesso novo e
+soma os tempos reportados pelo interpretador. O resultado é a mediana das execuções (a
+primeira costuma pagar a leitura dos .pyc do disco). Também verifica que os módulos pesados
+carregados sob demanda (torch, modelo de embeddings, clientes dos provedores de LLM) não são
+importados junto com a aplicação.
+
+Sai com código 1 se o orçamento for excedido ou se algum módulo pesado for importado, para
+poder ser usado como verificação em CI.
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.importtime_benchmark --module main --budget-ms 2500 --runs 5
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Orçamento padrão (ms) para importar a aplicação
+IMPORT_BUDGET_MS = 2500
+# Módulos que só devem ser carregados no primeiro uso (ou no aquecimento)
+LAZY_MODULES = (
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "langchain_huggingface",
+    "langchain_openai",
+    "langchain_google_genai",
+    "langchain_ollama",
+    "tiktoken",
+)
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile(module: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Importa o módulo em um subprocesso com -X importtime.
+
+    Returns:
+        Lista de (pacote, tempo próprio em us, tempo acumulado em us, profundidade)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {module}:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, package = match.groups()
+            # O interpretador indenta os pacotes com 2 espaços por nível, após 1 espaço fixo
+            entries.append((package, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def main(module: str, budget_ms: float, runs: int, top: int) -> int:
+    totals = []
+    entries: List[Tuple[str, int, int, int]] = []
+    for _ in range(runs):
+        entries = profile(module)
+        totals.append(sum(self_us for _, self_us, _, _ in entries) / 1000)
+    total_ms = statistics.median(totals)
+
+    cumulative: Dict[str, int] = {}
+    for package, _, cumulative_us, depth in entries:
+        if depth == 0:
+            cumulative[package] = cumulative_us
+    print(f"import {module}: mediana {total_ms:.0f} ms em {runs} execução(ões) ({len(entries)} módulos)")
+    print("\nPacotes de primeiro nível mais lentos (acumulado, última execução):")
+    for package, cumulative_us in sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {package}")
+
+    imported = {package.split(".")[0] for package, _, _, _ in entries}
+    eager = [name for name in LAZY_MODULES if name in imported]
+
+    failed = False
+    if eager:
+        print(f"\nFALHA: módulos que deveriam ser carregados sob demanda foram importados: {', '.join(eager)}")
+        failed = True
+    if total_ms > budget_ms:
+        print(f"\nFALHA: {total_ms:.0f} ms excede o orçamento de {budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print(f"\nOK: dentro do orçamento de {budget_ms:.0f} ms e sem importações pesadas")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perfil do tempo de importação da aplicação")
+    parser.add_argument("--module", default="main", help="Módulo importado (padrão: main, a aplicação FastAPI)")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="Orçamento do tempo de importação (ms)")
+    parser.add_argument("--runs", type=int, default=5, help="Execuções medidas (vale a mediana)")
+    parser.add_argument("--top", type=int, default=15, help="Pacotes listados")
+    args = parser.parse_args()
+    sys.exit(main(args.module, args.budget_ms, args.runs, args.top))
@@ -0,0 +1,140 @@
+"""
+Benchmark da persistência do índice FAISS: regravação completa (save_local a cada upload,
+comportamento anterior) vs. segmentos incrementais.
+
+Para cada tamanho de corpus, mede o tempo de um "upload" de --upload-chunks chunks. O caminho
+incremental é o de produção, de ponta a ponta: VectorstoreService.add_segment (gravação do
+segmento, troca do manifest e publicação da nova versão sobre a base mapeada). Com segmentos,
+o tempo deve permanecer constante enquanto o índice cresce.
+
+A compactação automática fica desativada durante os uploads medidos (ou disparada apenas a
+partir de --compaction-segments segmentos); ao final, uma compactação é executada de forma
+síncrona e o seu tempo é reportado em uma coluna separada.
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.index_persistence_benchmark --sizes 1000,10000,100000,1000000
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+
+import app.services.index_persistence as index_persistence
+import app.services.vectorstore_service as vectorstore_service
+from app.core.config.embeddings import VECTORSTORE_PATH
+from app.services.index_persistence import IndexPersistence
+from app.services.vectorstore_service import VectorstoreService
+
+BUILD_BATCH_SIZE = 50_000
+
+
+def random_vectors(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def build_db(n: int, dim: int, embeddings: FakeEmbeddings, rng: np.random.Generator) -> FAISS:
+    db = FAISS(
+        embedding_function=embeddings,
+        index=faiss.IndexFlatL2(dim),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+    for start in range(0, n, BUILD_BATCH_SIZE):
+        size = min(BUILD_BATCH_SIZE, n - start)
+        texts = [f"chunk sintético {start + i} " + "x" * 500 for i in range(size)]
+        db.add_embeddings(list(zip(texts, random_vectors(size, dim, rng).tolist())))
+    return db
+
+
+def time_full_rewrite(db: FAISS, upload: FAISS, path: str) -> float:
+    start = time.perf_counter()
+    db.merge_from(upload)
+    db.save_local(path)
+    return (time.perf_counter() - start) * 1000
+
+
+def time_segment(upload: FAISS) -> float:
+    start = time.perf_counter()
+    VectorstoreService.add_segment(upload)
+    return (time.perf_counter() - start) * 1000
+
+
+def time_compaction(embeddings: FakeEmbeddings) -> float:
+    # Compactação síncrona (fusão em disco + recarga do índice publicado)
+    start = time.perf_counter()
+    IndexPersistence.compact(VECTORSTORE_PATH, embeddings, on_compacted=VectorstoreService.reload_vectorstore)
+    return (time.perf_counter() - start) * 1000
+
+
+def reset_service() -> None:
+    VectorstoreService._snapshot = None
+    VectorstoreService._manifest = None
+
+
+def main(sizes, dim: int, upload_chunks: int, uploads: int, compaction_segments: int) -> None:
+    rng = np.random.default_rng(42)
+    embeddings = FakeEmbeddings(size=dim)
+
+    # Compactação automática só a partir de compaction_segments segmentos (0: desativada), sem
+    # o limite por proporção; sem a thread que acompanha outros workers (não há outros)
+    index_persistence.INDEX_COMPACTION_MAX_SEGMENTS = compaction_segments or float("inf")
+    index_persistence.INDEX_COMPACTION_MAX_SEGMENT_RATIO = float("inf")
+    vectorstore_service.INDEX_REFRESH_INTERVAL_SECONDS = 0
+
+    cwd = os.getcwd()
+    print(
+        f"{'chunks':>10} | {'regravação completa (ms)':>26} | {'add_segment (ms)':>18} | "
+        f"{'compactação (ms)':>18}"
+    )
+    for size in sizes:
+        full_dir = tempfile.mkdtemp()
+        workspace = tempfile.mkdtemp()
+        try:
+            # VECTORSTORE_PATH é relativo ao diretório de trabalho
+            os.chdir(workspace)
+            reset_service()
+            db = build_db(size, dim, embeddings, rng)
+            db.save_local(full_dir)
+            IndexPersistence.save_snapshot(db, VECTORSTORE_PATH)
+            VectorstoreService.load_vectorstore()
+
+            full_times, segment_times = [], []
+            for _ in range(uploads):
+                full_times.append(time_full_rewrite(db, build_db(upload_chunks, dim, embeddings, rng), full_dir))
+                segment_times.append(time_segment(build_db(upload_chunks, dim, embeddings, rng)))
+            compaction_ms = time_compaction(embeddings)
+
+            print(
+                f"{size:>10} | {statistics.median(full_times):>26.1f} | {statistics.median(segment_times):>18.1f} | "
+                f"{compaction_ms:>18.1f}"
+            )
+        finally:
+            os.chdir(cwd)
+            reset_service()
+            shutil.rmtree(full_dir, ignore_errors=True)
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da persistência incremental do índice FAISS")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="Tamanhos do corpus (chunks), separados por vírgula")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão dos embeddings")
+    parser.add_argument("--upload-chunks", type=int, default=50, help="Chunks por upload")
+    parser.add_argument("--uploads", type=int, default=5, help="Uploads medidos por tamanho")
+    parser.add_argument(
+        "--compaction-segments", type=int, default=0,
+        help="Segmentos que disparam a compactação automática durante os uploads (0: desativada)",
+    )
+    args = parser.parse_args()
+    main([int(size) for size in args.sizes.split(",")], args.dim, args.upload_chunks, args.uploads,
+         args.compaction_segments)
@@ -0,0 +1,80 @@
+"""
+Benchmark da latência da busca BM25 (app/services/lexical_index.py) em um corpus sintético.
+
+As listas de ocorrências são geradas diretamente (termos com distribuição de Zipf, como em
+texto real), sem tokenizar textos, para que um corpus de 1 milhão de chunks seja montado em
+segundos. As consultas misturam termos raros (siglas, códigos) e frequentes.
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.lexical_benchmark --docs 1000000 --queries 500
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.lexical_index import LexicalIndex, LexicalPart
+
+BATCH_DOCS = 50_000
+
+
+def synthetic_part(n_docs: int, vocab_size: int, tokens_per_doc: int, rng: np.random.Generator) -> LexicalPart:
+    docs, terms, tfs = [], [], []
+    doc_lens = np.full(n_docs, tokens_per_doc, dtype=np.uint32)
+    for start in range(0, n_docs, BATCH_DOCS):
+        n = min(BATCH_DOCS, n_docs - start)
+        sampled = (rng.zipf(1.2, size=(n, tokens_per_doc)) - 1) % vocab_size
+        keys = (np.arange(start, start + n, dtype=np.int64)[:, None] * vocab_size + sampled).ravel()
+        unique, counts = np.unique(keys, return_counts=True)
+        docs.append((unique // vocab_size).astype(np.uint32))
+        terms.append((unique % vocab_size).astype(np.uint32))
+        tfs.append(np.minimum(counts, 65535).astype(np.uint16))
+
+    terms = np.concatenate(terms)
+    order = np.argsort(terms, kind="stable")
+    offsets = np.zeros(vocab_size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=vocab_size), out=offsets[1:])
+    vocab = {f"t{i}": i for i in range(vocab_size)}
+    return LexicalPart(vocab, offsets, np.concatenate(docs)[order], np.concatenate(tfs)[order], doc_lens)
+
+
+def main(n_docs: int, vocab_size: int, tokens_per_doc: int, n_queries: int, k: int, deleted: int) -> None:
+    rng = np.random.default_rng(42)
+    start = time.perf_counter()
+    part = synthetic_part(n_docs, vocab_size, tokens_per_doc, rng)
+    print(
+        f"corpus: {n_docs} docs, {len(part.doc_ids)} ocorrências "
+        f"({part.doc_ids.nbytes + part.tfs.nbytes + part.offsets.nbytes} bytes), "
+        f"montado em {time.perf_counter() - start:.1f} s"
+    )
+
+    index = LexicalIndex([(0, part)]).with_deleted(rng.choice(n_docs, size=deleted, replace=False))
+    queries = []
+    for _ in range(n_queries):
+        n_terms = int(rng.integers(2, 6))
+        # Metade dos termos vem da cauda do vocabulário (raros), metade da distribuição de Zipf
+        rare = rng.integers(vocab_size // 10, vocab_size, size=n_terms // 2)
+        common = (rng.zipf(1.2, size=n_terms - n_terms // 2) - 1) % vocab_size
+        queries.append(" ".join(f"t{t}" for t in np.concatenate([rare, common])))
+
+    index.search(queries[0], k)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{n_queries} consultas, k={k}: p50 {p50:.2f} ms | p95 {p95:.2f} ms | p99 {p99:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da latência da busca BM25")
+    parser.add_argument("--docs", type=int, default=1_000_000, help="Documentos (chunks) no corpus")
+    parser.add_argument("--vocab", type=int, default=200_000, help="Tamanho do vocabulário")
+    parser.add_argument("--tokens", type=int, default=120, help="Termos por documento")
+    parser.add_argument("--queries", type=int, default=500, help="Consultas medidas")
+    parser.add_argument("--k", type=int, default=20, help="Documentos retornados por consulta")
+    parser.add_argument("--deleted", type=int, default=1000, help="Documentos removidos aguardando compactação")
+    args = parser.parse_args()
+    main(args.docs, args.vocab, args.tokens, args.queries, args.k, args.deleted)
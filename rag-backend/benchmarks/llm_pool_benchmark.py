@@ -0,0 +1,121 @@
+"""
+Benchmark do pool de clientes LLM (LLM_POOL) contra um servidor HTTP local que imita
+o endpoint /v1/completions da OpenAI.
+
+Compara o custo por requisição de instanciar um cliente novo a cada consulta (como era feito
+antes) com o reaproveitamento do cliente/cadeia do pool e das conexões keep-alive.
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.llm_pool_benchmark --requests 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from app.core.config.llm import LLMPool, get_llm
+from app.services.query_service import QueryService
+
+STUB_MODEL = "stub-model"
+
+
+class StubCompletionsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        StubCompletionsHandler.connections.add(self.client_address)
+
+        body = json.dumps({
+            "id": "cmpl-stub",
+            "object": "text_completion",
+            "created": 0,
+            "model": STUB_MODEL,
+            "choices": [{"text": "ok", "index": 0, "logprobs": None, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCompletionsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_fresh(base_url: str, n_requests: int) -> list:
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        # Cliente e conexões novos a cada requisição (comportamento anterior ao pool)
+        llm = get_llm(
+            provider="openai", model=STUB_MODEL, base_url=base_url, api_key="stub",
+            http_client=httpx.Client(), http_async_client=httpx.AsyncClient(),
+        )
+        chain = QueryService.create_qa_chain(llm)
+        await chain.ainvoke("ping")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def run_pooled(base_url: str, n_requests: int) -> list:
+    pool = LLMPool()
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        _, chain = pool.get_chain(
+            provider="openai", model=STUB_MODEL, base_url=base_url, api_key="stub",
+            chain_factory=QueryService.create_qa_chain,
+        )
+        await chain.ainvoke("ping")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(name: str, latencies: list, connections: int) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(
+        f"{name:>8}: média={statistics.mean(latencies):.2f} ms  "
+        f"p50={statistics.median(latencies):.2f} ms  p95={p95:.2f} ms  conexões TCP={connections}"
+    )
+
+
+async def main(n_requests: int) -> None:
+    server = start_stub_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    StubCompletionsHandler.connections = set()
+    fresh = await run_fresh(base_url, n_requests)
+    summarize("fresh", fresh, len(StubCompletionsHandler.connections))
+
+    StubCompletionsHandler.connections = set()
+    pooled = await run_pooled(base_url, n_requests)
+    summarize("pooled", pooled, len(StubCompletionsHandler.connections))
+
+    saved = statistics.mean(fresh) - statistics.mean(pooled)
+    print(f"Overhead removido por requisição: {saved:.2f} ms")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do pool de clientes LLM")
+    parser.add_argument("--requests", type=int, default=200, help="Número de requisições por cenário")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,543 @@
+"""
+Teste de carga da aplicação FastAPI real com o provedor de LLM "stub" (app/services/stub_llm.py),
+sem custo de API: vazão, latência (p50/p95/p99) e memória da ingestão e das consultas.
+
+Etapas:
+  1. gera um corpus sintético (--docs arquivos .txt/.md de --doc-kb KB) no diretório de dados;
+  2. sobe a aplicação e mede o tempo até /health/ready (inclui a ingestão inicial do corpus);
+  3. envia --uploads arquivos sintéticos a /ingest/upload (--upload-concurrency por vez) e
+     acompanha cada job até o fim;
+  4. dispara --queries consultas a /query com provider "stub" (--concurrency por vez).
+
+Por padrão a aplicação roda no próprio processo (httpx + ASGITransport, sem rede) em um
+diretório de trabalho temporário (com os logs em logs/ dentro dele, via LOG_DIR), então o índice,
+os caches e os logs do projeto não são tocados e a memória medida é a do processo. Com --url, a carga vai para um servidor já em execução
+(que deve ter sido iniciado com STUB_LLM_LATENCY_MS/STUB_LLM_TOKENS_PER_SECOND no ambiente, se
+desejado); informe --pid para medir a memória dele.
+
+Os resultados são gravados em JSON (--output); com --compare, são comparados a uma execução
+anterior e o processo sai com código 1 se alguma métrica piorar mais que --max-regression.
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.load_benchmark --docs 200 --uploads 20 --queries 500 --concurrency 16 \\
+        --output results/load.json
+    python -m benchmarks.load_benchmark --queries 500 --compare results/load.json --max-regression 0.15
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STUB_PROVIDER = "stub"
+# Estados finais de um job de ingestão (GET /ingest/jobs/{job_id})
+JOB_FINAL_STATUSES = ("success", "warning", "error")
+JOB_POLL_SECONDS = 0.2
+READY_POLL_SECONDS = 0.5
+REQUEST_TIMEOUT_SECONDS = 300
+
+# Temas do corpus sintético: cada documento trata de um tema, e as consultas perguntam pelos
+# mesmos termos, para que a busca encontre chunks relevantes
+TOPICS = (
+    ("patente", "pedido de patente", "exame técnico", "anuidade", "depósito"),
+    ("marca", "registro de marca", "oposição", "classe de produtos", "renovação"),
+    ("aposentadoria", "tempo de contribuição", "benefício", "perícia", "requerimento"),
+    ("passaporte", "agendamento", "taxa de emissão", "documento de identidade", "prazo de entrega"),
+    ("licitação", "edital", "pregão eletrônico", "proposta", "recurso administrativo"),
+    ("imposto de renda", "declaração", "restituição", "dedução", "malha fina"),
+)
+FILLER = (
+    "conforme", "a", "norma", "vigente", "o", "cidadão", "deve", "apresentar", "no", "prazo",
+    "de", "dias", "úteis", "junto", "ao", "órgão", "responsável", "pelo", "serviço", "público",
+    "mediante", "formulário", "próprio", "e", "comprovante", "pagamento", "quando", "aplicável",
+)
+QUERY_TEMPLATES = (
+    "Qual o prazo para {term} no artigo {n}?",
+    "O que é necessário para {term}?",
+    "Como funciona {term} segundo o item {n}?",
+    "Quais documentos são exigidos para {term}?",
+)
+
+
+def synthetic_text(rng: random.Random, topic: Sequence[str], size_kb: float) -> str:
+    """
+    Texto sintético de um tema, com parágrafos de frases que citam os termos do tema.
+    """
+    target = int(size_kb * 1024)
+    paragraphs, size = [], 0
+    while size < target:
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            words = rng.choices(FILLER, k=rng.randint(8, 18))
+            words.insert(rng.randrange(len(words)), rng.choice(topic))
+            words.append(f"artigo {rng.randint(1, 300)}")
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 2
+    return "\n\n".join(paragraphs)
+
+
+def write_corpus(directory: str, docs: int, doc_kb: float, seed: int, prefix: str) -> List[str]:
+    """
+    Grava docs arquivos sintéticos (alternando .txt e .md) e retorna seus caminhos.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(docs):
+        topic = TOPICS[i % len(TOPICS)]
+        extension = "md" if i % 2 else "txt"
+        path = os.path.join(directory, f"{prefix}-{i:05d}-{topic[0].replace(' ', '_')}.{extension}")
+        text = synthetic_text(rng, topic, doc_kb)
+        if extension == "md":
+            text = f"# {topic[0].capitalize()}\n\n{text}"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(path)
+    return paths
+
+
+def make_queries(count: int, seed: int, repeat_ratio: float) -> List[str]:
+    """
+    Consultas sintéticas sobre os temas do corpus. Uma fração repeat_ratio repete consultas
+    anteriores (acertos no cache de respostas); as demais são inéditas.
+    """
+    rng = random.Random(seed)
+    queries: List[str] = []
+    for _ in range(count):
+        if queries and rng.random() < repeat_ratio:
+            queries.append(rng.choice(queries))
+            continue
+        term = rng.choice(rng.choice(TOPICS))
+        queries.append(rng.choice(QUERY_TEMPLATES).format(term=term, n=rng.randint(1, 300)))
+    return queries
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, Optional[float]]:
+    """
+    Resumo de uma amostra: count, mean, p50, p95, p99 e max (interpolação linear).
+    """
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        position = (len(ordered) - 1) * q
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": round(at(0.50), 2),
+        "p95": round(at(0.95), 2),
+        "p99": round(at(0.99), 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler:
+    """
+    Amostra em background o RSS de um processo durante uma etapa (início, pico e fim, em MB).
+    Sem /proc (ex: macOS) ou sem processo a medir, o resultado é None.
+    """
+
+    def __init__(self, pid: Optional[int], interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def _sample(self) -> None:
+        rss = read_rss_mb(self.pid) if self.pid else None
+        if rss is not None:
+            self.samples.append(rss)
+
+    async def _run(self) -> None:
+        while True:
+            self._sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._sample()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Optional[Dict[str, float]]:
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._sample()
+        if not self.samples:
+            return None
+        return {
+            "start_mb": round(self.samples[0], 1),
+            "peak_mb": round(max(self.samples), 1),
+            "end_mb": round(self.samples[-1], 1),
+        }
+
+
+@contextlib.asynccontextmanager
+async def open_client(url: Optional[str], workspace: str):
+    """
+    Cliente HTTP para a aplicação: um servidor em `url` ou, se None, a aplicação importada
+    neste processo com o diretório de trabalho em `workspace` (startup e shutdown executados aqui).
+    """
+    timeout = httpx.Timeout(REQUEST_TIMEOUT_SECONDS)
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+
+    # Os caminhos da aplicação (índice, caches, data/) são relativos ao diretório de trabalho; o
+    # diretório de logs é absoluto e é redirecionado antes do primeiro import da aplicação (os
+    # processos dos pools herdam a variável de ambiente)
+    sys.path.insert(0, ROOT)
+    os.chdir(workspace)
+    os.environ["LOG_DIR"] = os.path.join(workspace, "logs")
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=timeout) as client:
+            yield client
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float) -> Dict[str, Any]:
+    """
+    Aguarda /health/ready responder 200 e retorna o tempo até lá e o andamento da ingestão inicial.
+    """
+    start = time.perf_counter()
+    state: Dict[str, Any] = {}
+    while time.perf_counter() - start < timeout:
+        response = await client.get("/health/ready")
+        state = response.json()
+        if response.status_code == 200:
+            return {"seconds": round(time.perf_counter() - start, 2), "progress": state.get("progress"), "warmup": state.get("warmup")}
+        if state.get("phase") == "failed":
+            raise RuntimeError(f"A inicialização falhou: {state.get('error')}")
+        await asyncio.sleep(READY_POLL_SECONDS)
+    raise TimeoutError(f"A aplicação não ficou pronta em {timeout:.0f} s (fase: {state.get('phase')})")
+
+
+async def upload_one(client: httpx.AsyncClient, path: str, counters: Dict[str, int]) -> Tuple[float, Optional[float], str]:
+    """
+    Envia um arquivo e acompanha o job até o fim, reenviando após Retry-After se a fila estiver cheia.
+
+    Returns:
+        (latência do POST em ms, latência do envio até o fim do job em ms, status final do job)
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    filename = os.path.basename(path)
+    while True:
+        start = time.perf_counter()
+        response = await client.post("/ingest/upload", files={"file": (filename, content)})
+        upload_ms = (time.perf_counter() - start) * 1000
+        if response.status_code != 429:
+            break
+        counters["rejected"] += 1
+        await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+    if response.status_code != 202:
+        return upload_ms, None, f"http_{response.status_code}"
+
+    job_id = response.json()["job_id"]
+    while True:
+        job = (await client.get(f"/ingest/jobs/{job_id}")).json()
+        if job["status"] in JOB_FINAL_STATUSES:
+            counters["chunks"] += job.get("chunks") or 0
+            return upload_ms, (time.perf_counter() - start) * 1000, job["status"]
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+
+async def run_uploads(client: httpx.AsyncClient, paths: List[str], concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    counters = {"rejected": 0, "chunks": 0}
+
+    async def bounded(path: str):
+        async with semaphore:
+            return await upload_one(client, path, counters)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(bounded(path) for path in paths))
+    elapsed = time.perf_counter() - start
+
+    statuses: Dict[str, int] = {}
+    for _, _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        "files": len(paths),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "files_per_second": round(len(paths) / elapsed, 2) if elapsed else None,
+        "chunks_per_second": round(counters["chunks"] / elapsed, 2) if elapsed else None,
+        "statuses": statuses,
+        "rejected_429": counters["rejected"],
+        "upload_latency_ms": percentiles([upload_ms for upload_ms, _, _ in results]),
+        "job_latency_ms": percentiles([job_ms for _, job_ms, _ in results if job_ms is not None]),
+    }
+
+
+async def run_queries(
+        client: httpx.AsyncClient,
+        queries: List[str],
+        concurrency: int,
+        body: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Dispara as consultas em malha fechada: `concurrency` clientes, cada um enviando a próxima
+    consulta assim que recebe a resposta da anterior.
+    """
+    pending = iter(queries)
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    cache_hits = 0
+    stages: Dict[str, List[float]] = {}
+
+    async def worker() -> None:
+        nonlocal cache_hits
+        for query in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/query", json={**body, "query": query})
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+                continue
+            latency = (time.perf_counter() - start) * 1000
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            if response.status_code != 200:
+                continue
+            latencies.append(latency)
+            data = response.json()
+            if data.get("cache"):
+                cache_hits += 1
+            for stage, elapsed_ms in (data.get("timings") or {}).items():
+                stages.setdefault(stage, []).append(elapsed_ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "queries": len(queries),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "statuses": statuses,
+        "errors": len(queries) - len(latencies),
+        "cache_hits": cache_hits,
+        "latency_ms": percentiles(latencies),
+        # Tempos por etapa informados pelo servidor (ms)
+        "server_timings_ms": {stage: percentiles(values) for stage, values in stages.items()},
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Métricas comparadas com --compare: (caminho no JSON, True se maior é melhor)
+COMPARED_METRICS = (
+    ("query.throughput_rps", True),
+    ("query.latency_ms.p50", False),
+    ("query.latency_ms.p95", False),
+    ("query.latency_ms.p99", False),
+    ("upload.files_per_second", True),
+    ("upload.job_latency_ms.p95", False),
+    ("startup.seconds", False),
+    ("query.memory.peak_mb", False),
+    ("upload.memory.peak_mb", False),
+)
+
+
+def lookup(data: Dict[str, Any], path: str) -> Optional[float]:
+    for key in path.split("."):
+        if not isinstance(data, dict) or data.get(key) is None:
+            return None
+        data = data[key]
+    return data
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> int:
+    """
+    Compara as métricas principais com uma execução anterior.
+
+    Returns:
+        Número de métricas que pioraram mais que max_regression (fração, ex: 0.15 = 15%)
+    """
+    print(f"\nComparação com {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')}):")
+    regressions = 0
+    for path, higher_is_better in COMPARED_METRICS:
+        new, old = lookup(current, path), lookup(baseline, path)
+        if new is None or old is None or old == 0:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > max_regression:
+            regressions += 1
+            flag = "  <-- REGRESSÃO"
+        print(f"  {path:<28} {old:>10.2f} -> {new:>10.2f}  ({change:+.1%}){flag}")
+    return regressions
+
+
+def print_summary(results: Dict[str, Any]) -> None:
+    startup = results.get("startup")
+    if startup:
+        print(f"Pronto em {startup['seconds']} s (ingestão inicial: {startup.get('progress')})")
+    upload = results.get("upload")
+    if upload:
+        latency = upload["job_latency_ms"]
+        print(
+            f"Uploads: {upload['files']} arquivos em {upload['seconds']} s ({upload['files_per_second']} arquivos/s, "
+            f"{upload['chunks_per_second']} chunks/s) | job p50/p95/p99 {latency['p50']}/{latency['p95']}/{latency['p99']} ms "
+            f"| status {upload['statuses']} | memória {upload.get('memory')}"
+        )
+    query = results.get("query")
+    if query:
+        latency = query["latency_ms"]
+        print(
+            f"Consultas: {query['queries']} em {query['seconds']} s ({query['throughput_rps']} req/s, "
+            f"concorrência {query['concurrency']}) | p50/p95/p99 {latency['p50']}/{latency['p95']}/{latency['p99']} ms "
+            f"| erros {query['errors']} | cache {query['cache_hits']} | memória {query.get('memory')}"
+        )
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # Configura o provedor stub antes de importar a aplicação (no modo em processo)
+    os.environ["STUB_LLM_LATENCY_MS"] = str(args.stub_latency_ms)
+    os.environ["STUB_LLM_TOKENS_PER_SECOND"] = str(args.stub_tokens_per_second)
+    os.environ["STUB_LLM_ANSWER_TOKENS"] = str(args.stub_answer_tokens)
+
+    cwd = os.getcwd()
+    workspace = tempfile.mkdtemp(prefix="rag-load-")
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "mode": "url" if args.url else "in_process",
+            "args": vars(args),
+        }
+    }
+    pid = args.pid if args.url else os.getpid()
+    try:
+        if not args.url:
+            print(f"Gerando corpus inicial: {args.docs} documentos de {args.doc_kb} KB em {workspace}/data")
+            write_corpus(os.path.join(workspace, "data"), args.docs, args.doc_kb, args.seed, "doc")
+        upload_paths = write_corpus(
+            os.path.join(workspace, "uploads"), args.uploads, args.doc_kb, args.seed + 1, "upload"
+        )
+
+        async with open_client(args.url, workspace) as client:
+            sampler = RssSampler(pid)
+            sampler.start()
+            results["startup"] = await wait_ready(client, args.ready_timeout)
+            results["startup"]["memory"] = await sampler.stop()
+
+            if upload_paths:
+                sampler = RssSampler(pid)
+                sampler.start()
+                results["upload"] = await run_uploads(client, upload_paths, args.upload_concurrency)
+                results["upload"]["memory"] = await sampler.stop()
+
+            if args.queries:
+                body = {
+                    "provider": STUB_PROVIDER,
+                    "model": args.model,
+                    "search_type": args.search_type,
+                    "search_k": args.search_k,
+                    "rerank": args.rerank,
+                }
+                queries = make_queries(args.queries, args.seed, args.repeat_ratio)
+                # Algumas consultas de aquecimento (fora da medição), com textos que não se repetem depois
+                await run_queries(client, [f"aquecimento {i}" for i in range(args.concurrency)], args.concurrency, body)
+                sampler = RssSampler(pid)
+                sampler.start()
+                results["query"] = await run_queries(client, queries, args.concurrency, body)
+                results["query"]["memory"] = await sampler.stop()
+    finally:
+        os.chdir(cwd)
+        if args.keep_workspace:
+            print(f"Diretório de trabalho mantido em {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return results
+
+
+def main(args: argparse.Namespace) -> int:
+    results = asyncio.run(run(args))
+    print_summary(results)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\nFALHA: {regressions} métrica(s) pioraram mais de {args.max_regression:.0%}")
+            return 1
+        print(f"\nOK: nenhuma métrica piorou mais de {args.max_regression:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga com o provedor de LLM stub")
+    parser.add_argument("--url", help="Servidor já em execução (padrão: aplicação importada neste processo)")
+    parser.add_argument("--pid", type=int, help="PID do servidor em --url, para medir a memória")
+    parser.add_argument("--docs", type=int, default=200, help="Documentos do corpus inicial (modo em processo)")
+    parser.add_argument("--doc-kb", type=float, default=8, help="Tamanho de cada documento sintético (KB)")
+    parser.add_argument("--uploads", type=int, default=20, help="Arquivos enviados a /ingest/upload")
+    parser.add_argument("--upload-concurrency", type=int, default=4, help="Uploads simultâneos")
+    parser.add_argument("--queries", type=int, default=500, help="Consultas enviadas a /query")
+    parser.add_argument("--concurrency", type=int, default=16, help="Consultas simultâneas")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="Fração de consultas repetidas (acertos no cache)")
+    parser.add_argument("--search-type", default="similarity", help="search_type das consultas")
+    parser.add_argument("--search-k", type=int, default=5, help="search_k das consultas")
+    parser.add_argument("--rerank", action="store_true", help="Consultas com re-ranking")
+    parser.add_argument("--model", default="stub-echo", help="Modelo do provedor stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=200, help="Latência do stub até o primeiro token")
+    parser.add_argument("--stub-tokens-per-second", type=float, default=50, help="Tokens por segundo do stub")
+    parser.add_argument("--stub-answer-tokens", type=int, default=64, help="Tokens por resposta do stub")
+    parser.add_argument("--ready-timeout", type=float, default=1800, help="Espera máxima por /health/ready (s)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do corpus e das consultas")
+    parser.add_argument("--output", help="Arquivo JSON com os resultados")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--max-regression", type=float, default=0.15, help="Piora máxima tolerada na comparação (fração)")
+    parser.add_argument("--keep-workspace", action="store_true", help="Mantém o diretório de trabalho temporário")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,149 @@
+"""
+Benchmark do custo dos logs na latência das requisições: escrita síncrona no event loop
+(FileHandler + StreamHandler em cada logger, como era feito antes) vs. o pipeline atual
+(QueueHandler + thread de escrita, app/core/utils/logger.py).
+
+Cada requisição simulada emite --records registros INFO de --payload-chars caracteres (como
+consultas, trechos de documentos e respostas) e aguarda um I/O de 1 ms; --concurrency
+requisições rodam ao mesmo tempo no event loop. Com escrita síncrona, a latência cresce com o
+volume de logs (e com a lentidão do destino, ver --stream-delay-ms, que simula um stdout lento,
+ex: coletor de logs do container); com a fila, ela fica praticamente constante. O tempo de
+esvaziamento da fila e os registros descartados (fila cheia) também são informados.
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.logging_benchmark --requests 300 --records 5 50 200 --stream-delay-ms 0.2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from app.core.config.logs import LOG_QUEUE_MAX_SIZE
+from app.core.utils.logger import CustomFormatter, LogPipeline
+
+REQUEST_IO_SECONDS = 0.001
+
+
+class SlowStream:
+    """
+    Stream de texto que espera delay segundos a cada escrita (destino lento).
+    """
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def sync_logger(name: str, log_file: str, stream) -> logging.Logger:
+    # Configuração anterior: handlers síncronos ligados diretamente ao logger
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    file_handler = logging.FileHandler(log_file, encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    console_handler = logging.StreamHandler(stream)
+    console_handler.setFormatter(CustomFormatter("%(levelname)s - %(message)s"))
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    return logger
+
+
+def queue_logger(name: str, pipeline: LogPipeline) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    pipeline.start()
+    logger.addHandler(pipeline.handler)
+    return logger
+
+
+async def run_load(logger: logging.Logger, requests: int, concurrency: int, records: int, payload: str) -> List[float]:
+    latencies: List[float] = []
+    pending = iter(range(requests))
+
+    async def worker() -> None:
+        for request_id in pending:
+            start = time.perf_counter()
+            for record in range(records):
+                logger.info("Requisição %d, registro %d: %s", request_id, record, payload)
+            await asyncio.sleep(REQUEST_IO_SECONDS)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "p50": statistics.median(ordered),
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
+
+
+def main(requests: int, concurrency: int, volumes: List[int], payload_chars: int, stream_delay_ms: float) -> None:
+    workdir = tempfile.mkdtemp()
+    payload = ("trecho de documento " * (payload_chars // 20 + 1))[:payload_chars]
+    print(
+        f"{requests} requisições, concorrência {concurrency}, registros de {payload_chars} caracteres, "
+        f"stdout com {stream_delay_ms} ms por escrita\n"
+    )
+    print(f"{'registros/req':>13} | {'síncrono p50/p99 (ms)':>22} | {'fila p50/p99 (ms)':>18} | {'esvaziamento':>12} | descartados")
+    try:
+        for records in volumes:
+            results = {}
+            for mode in ("sync", "queue"):
+                log_file = os.path.join(workdir, f"{mode}_{records}.log")
+                console = open(os.path.join(workdir, f"{mode}_{records}.out"), "w", encoding="utf-8")
+                stream = SlowStream(console, stream_delay_ms / 1000)
+                pipeline = None
+                if mode == "sync":
+                    logger = sync_logger(f"bench.sync.{records}", log_file, stream)
+                else:
+                    pipeline = LogPipeline(log_file, stream=stream, queue_size=LOG_QUEUE_MAX_SIZE, sample_rates={})
+                    logger = queue_logger(f"bench.queue.{records}", pipeline)
+
+                latencies = asyncio.run(run_load(logger, requests, concurrency, records, payload))
+                results[mode] = summarize(latencies)
+
+                start = time.perf_counter()
+                if pipeline is not None:
+                    pipeline.stop()
+                    results[mode]["drain_s"] = time.perf_counter() - start
+                    results[mode]["dropped"] = pipeline.handler.dropped
+                for handler in list(logger.handlers):
+                    logger.removeHandler(handler)
+                    handler.close()
+                console.close()
+
+            sync, queued = results["sync"], results["queue"]
+            print(
+                f"{records:>13} | {sync['p50']:>10.2f} / {sync['p99']:>9.2f} | {queued['p50']:>7.2f} / {queued['p99']:>8.2f} "
+                f"| {queued['drain_s']:>10.2f} s | {queued['dropped']}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de logs síncronos vs. pipeline com fila")
+    parser.add_argument("--requests", type=int, default=300, help="Requisições simuladas por cenário")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requisições simultâneas no event loop")
+    parser.add_argument("--records", type=int, nargs="+", default=[5, 50, 200], help="Registros por requisição (um cenário por valor)")
+    parser.add_argument("--payload-chars", type=int, default=2000, help="Tamanho de cada registro")
+    parser.add_argument("--stream-delay-ms", type=float, default=0.0, help="Atraso por escrita no stdout (destino lento)")
+    args = parser.parse_args()
+    main(args.requests, args.concurrency, args.records, args.payload_chars, args.stream_delay_ms)
@@ -0,0 +1,113 @@
+"""
+Benchmark do OCR de PDFs digitalizados: UnstructuredPDFLoader(hi_res) no arquivo inteiro em um
+único processo (comportamento anterior) vs. OCREngine (páginas em paralelo + cache em disco).
+
+Mede, sobre um PDF só de imagens (gerado sinteticamente ou informado em --pdf):
+  - OCREngine com cache vazio;
+  - OCREngine com cache quente (reingestão do mesmo arquivo);
+  - OCREngine após alterar uma única página (apenas ela deve ser reconhecida);
+  - opcionalmente (--baseline), o UnstructuredPDFLoader no arquivo inteiro.
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.ocr_benchmark --pages 300 --workers 8 --baseline
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional
+
+from langchain_community.document_loaders import UnstructuredPDFLoader
+from PIL import Image, ImageDraw, ImageFont
+
+from app.services.ocr import OCREngine
+
+# A4 a 100 dpi em tons de cinza: ~1 MB por página mantido em memória até gravar o PDF
+PAGE_SIZE = (827, 1169)
+PAGE_DPI = 100
+LOREM = (
+    "A prefeitura disponibiliza o serviço de emissão de segunda via de documentos mediante "
+    "agendamento prévio, apresentação de documento com foto e comprovante de residência."
+)
+
+
+def _font(size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def render_page(number: int, variant: str = "") -> Image.Image:
+    image = Image.new("L", PAGE_SIZE, color=255)
+    draw = ImageDraw.Draw(image)
+    font = _font(16)
+    draw.text((60, 60), f"Página {number + 1} {variant}".strip(), fill=0, font=font)
+    for line in range(36):
+        draw.text((60, 110 + line * 28), f"{line + 1}. {LOREM[:80]}", fill=0, font=font)
+    return image
+
+
+def build_scanned_pdf(path: str, pages: int, changed_page: Optional[int] = None) -> None:
+    images = [render_page(i, "(revisada)" if i == changed_page else "") for i in range(pages)]
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=PAGE_DPI)
+
+
+def timed(label: str, pages: int, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<38} | {elapsed:>9.1f} s | {pages / elapsed:>8.2f} páginas/s")
+    return result
+
+
+def main(pdf: Optional[str], pages: int, workers: int, strategy: str, baseline: bool) -> None:
+    work_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(work_dir, "cache")
+    try:
+        changed_pdf = None
+        if pdf is None:
+            pdf = os.path.join(work_dir, "scanned.pdf")
+            changed_pdf = os.path.join(work_dir, "scanned-changed.pdf")
+            build_scanned_pdf(pdf, pages)
+            build_scanned_pdf(changed_pdf, pages, changed_page=pages // 2)
+
+        engine = OCREngine(strategy=strategy, workers=workers, cache_dir=cache_dir)
+        # Aquece o pool (sobe os processos e carrega os modelos) fora da medição
+        engine.ocr_pdf(pdf, pages=[0])
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+        progress = {}
+
+        def track(done: int, total: int, cached: int) -> None:
+            progress.update(done=done, total=total, cached=cached)
+
+        print(f"{'cenário':<38} | {'tempo':>11} | {'vazão':>17}")
+        texts = timed(f"OCREngine, cache vazio ({workers} proc.)", pages, lambda: engine.ocr_pdf(pdf, progress=track))
+        pages = len(texts)
+        timed("OCREngine, cache quente", pages, lambda: engine.ocr_pdf(pdf, progress=track))
+        print(f"  páginas do cache: {progress['cached']}/{progress['total']}")
+        if changed_pdf is not None:
+            timed("OCREngine, 1 página alterada", pages, lambda: engine.ocr_pdf(changed_pdf, progress=track))
+            print(f"  páginas do cache: {progress['cached']}/{progress['total']}")
+        engine.close()
+
+        if baseline:
+            timed(
+                f"UnstructuredPDFLoader({strategy}), 1 proc.", pages,
+                lambda: UnstructuredPDFLoader(pdf, mode="single", strategy=strategy).load(),
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do OCR paralelo de PDFs digitalizados")
+    parser.add_argument("--pdf", default=None, help="PDF digitalizado a usar (padrão: gera um sintético)")
+    parser.add_argument("--pages", type=int, default=300, help="Páginas do PDF sintético")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Processos de OCR")
+    parser.add_argument("--strategy", default="hi_res", help="Estratégia do unstructured (hi_res ou ocr_only)")
+    parser.add_argument("--baseline", action="store_true", help="Mede também o UnstructuredPDFLoader no arquivo inteiro")
+    args = parser.parse_args()
+    main(args.pdf, args.pages, args.workers, args.strategy, args.baseline)
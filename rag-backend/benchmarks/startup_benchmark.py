@@ -0,0 +1,176 @@
+"""
+Benchmark de inicialização dos workers: tempo de carga do índice e memória por processo
+no formato antigo (FAISS.load_local: índice flat em RAM + docstore pickle) vs. o formato atual
+(índice mapeado com IO_FLAG_MMAP_IFC + docstore SQLite lido sob demanda), para cada tipo de
+índice em --index-types.
+
+Cada cenário é medido em --workers subprocessos independentes, como workers do uvicorn. A
+memória é separada em privada (RssAnon: paga por cada worker) e mapeada (RssFile: páginas do
+arquivo do índice no page cache, compartilhadas entre os workers). Após a busca, um índice flat
+mapeado aparece inteiro em RssFile (a busca exata lê todos os vetores), mas essas páginas
+existem uma única vez na máquina.
+Rode mais de uma vez: a partir da segunda, o índice mapeado já está no page cache.
+
+Uso (a partir de rag-backend/):
+    python -m benchmarks.startup_benchmark --chunks 200000 --workers 4 --index-types flat hnsw ivf_flat
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+LEGACY_DIR = "legacy"
+BATCH_SIZE = 50_000
+
+
+def memory_mb() -> Dict[str, float]:
+    """
+    Memória residente do processo (MB): privada (RssAnon) e de arquivos mapeados (RssFile).
+    """
+    fields = {"RssAnon:": "private", "RssFile:": "mapped"}
+    memory = {"private": 0.0, "mapped": 0.0}
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            name = line.split(":", 1)[0] + ":"
+            if name in fields:
+                memory[fields[name]] = int(line.split()[1]) / 1024
+    return memory
+
+
+def synthetic_batches(chunks: int, dim: int) -> Iterator[Tuple[np.ndarray, List[str], List[Dict[str, str]]]]:
+    """
+    Lotes determinísticos de vetores normalizados, textos e metadados sintéticos.
+    """
+    import faiss
+
+    rng = np.random.default_rng(1)
+    for start in range(0, chunks, BATCH_SIZE):
+        size = min(BATCH_SIZE, chunks - start)
+        vectors = rng.standard_normal((size, dim), dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        texts = [f"chunk sintético {start + i} " + "x" * 1500 for i in range(size)]
+        metadatas = [{"source_doc": f"doc-{(start + i) // 100}.pdf"} for i in range(size)]
+        yield vectors, texts, metadatas
+
+
+def child(fmt: str, path: str, dim: int) -> None:
+    from langchain_community.embeddings import FakeEmbeddings
+    from langchain_community.vectorstores import FAISS
+    from app.services.index_persistence import IndexPersistence
+
+    embeddings = FakeEmbeddings(size=dim)
+    before = memory_mb()
+    start = time.perf_counter()
+    if fmt == LEGACY_DIR:
+        db = FAISS.load_local(os.path.join(path, LEGACY_DIR), embeddings, allow_dangerous_deserialization=True)
+    else:
+        # Sem segmentos: a base é a única parte do vectorstore
+        db = IndexPersistence.load(os.path.join(path, fmt), embeddings).base
+    load_s = time.perf_counter() - start
+    loaded = memory_mb()
+
+    # Uma busca top-5 para incluir o custo de buscar os chunks no docstore
+    query = np.random.default_rng(0).standard_normal((1, dim)).astype(np.float32)
+    _, ids = db.index.search(query, 5)
+    for i in ids[0]:
+        db.docstore.search(db.index_to_docstore_id[int(i)])
+    searched = memory_mb()
+
+    print(json.dumps({
+        "load_s": load_s,
+        "private_mb": loaded["private"] - before["private"],
+        "mapped_mb": loaded["mapped"] - before["mapped"],
+        "private_after_search_mb": searched["private"] - before["private"],
+        "mapped_after_search_mb": searched["mapped"] - before["mapped"],
+        "vectors": db.index.ntotal,
+    }))
+
+
+def build(path: str, chunks: int, dim: int, index_types: List[str]) -> None:
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.embeddings import FakeEmbeddings
+    from langchain_community.vectorstores import FAISS
+    from app.services.index_persistence import IndexPersistence
+    from app.services.vector_index import build_index
+
+    def new_db(index: faiss.Index) -> FAISS:
+        return FAISS(
+            embedding_function=FakeEmbeddings(size=dim),
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+
+    legacy = new_db(faiss.IndexFlatL2(dim))
+    for vectors, texts, metadatas in synthetic_batches(chunks, dim):
+        legacy.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+    legacy.save_local(os.path.join(path, LEGACY_DIR))
+    del legacy
+
+    for index_type in index_types:
+        batches = synthetic_batches(chunks, dim)
+        db = None
+        index_info = None
+        for vectors, texts, metadatas in batches:
+            if db is None:
+                # O primeiro lote serve de amostra de treino para os índices IVF/PQ/SQ
+                index, index_info = build_index(index_type, vectors)
+                db = new_db(index)
+            db.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+        IndexPersistence.save_snapshot(db, os.path.join(path, index_type), index_info)
+
+
+def main(chunks: int, dim: int, workers: int, index_types: List[str]) -> None:
+    path = tempfile.mkdtemp()
+    try:
+        print(f"Gerando índices sintéticos com {chunks} chunks (dim={dim}): {LEGACY_DIR} (flat), {', '.join(index_types)}...")
+        build(path, chunks, dim, index_types)
+
+        for fmt in (LEGACY_DIR, *index_types):
+            results = []
+            for _ in range(workers):
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.startup_benchmark", "--child", fmt, "--path", path, "--dim", str(dim)],
+                    capture_output=True, text=True, check=True,
+                ).stdout.strip().splitlines()[-1]
+                results.append(json.loads(output))
+
+            def mean(key: str) -> float:
+                return sum(r[key] for r in results) / len(results)
+
+            private = mean("private_after_search_mb")
+            print(
+                f"{fmt:>10}: carga média {mean('load_s'):.2f} s | por worker após a carga: privada "
+                f"{mean('private_mb'):.0f} MB, mapeada {mean('mapped_mb'):.0f} MB | após a busca: privada "
+                f"{private:.0f} MB, mapeada {mean('mapped_after_search_mb'):.0f} MB | privada total "
+                f"{private * workers:.0f} MB em {workers} workers"
+            )
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de inicialização (mmap + docstore SQLite)")
+    parser.add_argument("--chunks", type=int, default=200_000, help="Número de chunks do índice sintético")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensão dos embeddings")
+    parser.add_argument("--workers", type=int, default=4, help="Número de workers simulados")
+    parser.add_argument(
+        "--index-types", nargs="+", default=["flat", "hnsw", "ivf_flat"],
+        help="Tipos de índice do formato atual (ver INDEX_FACTORY_STRINGS em app/services/vector_index.py)",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.path, args.dim)
+    else:
+        main(args.chunks, args.dim, args.workers, args.index_types)